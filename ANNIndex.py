@@ -0,0 +1,160 @@
+import numpy as np
+import Indexes
+import Embeddings
+
+"""
+This file contains an approximate nearest neighbor (ANN) index for the embedding matrices used by the "WordSim" and
+"DocSim" methods. The index is an inverted file (IVF): the normalized embeddings are clustered with spherical k-means
+and a query is only compared with the embeddings in the few clusters whose centroids are closest to it. The index does
+not copy the embeddings. It reads the rows of the indexed matrix (an "Embeddings.EmbeddingMatrix") when it searches.
+"""
+
+class IVFIndex:
+    """An inverted file index for cosine similarity search.
+    Initialize this class with:
+        nlist - The number of clusters. (Defaults to the square root of the number of rows.)
+        nprobe - The number of clusters searched for each query. Searching more clusters is slower but finds more
+            of the true nearest neighbors (see "Recall").
+        iterations - The number of k-means iterations.
+        seed - The seed used to pick the initial centroids.
+    """
+    def __init__(self,nlist=None,nprobe=8,iterations=20,seed=1):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+
+    def _Assign(self,matrix,start=0,chunk=4096):
+        #The closest centroid of each row of the matrix from row start onwards (computed in chunks to bound the memory
+            #used).
+        out = np.empty(len(matrix)-start,dtype=np.int64)
+        for first in range(start,len(matrix),chunk):
+            rows = matrix.Rows(first,first+chunk)
+            out[first-start:first-start+len(rows)] = np.argmax(rows.dot(self.centroids.T),axis=1)
+        return out
+
+    def _Lists(self,assign):
+        #The inverted lists are stored as one array sorted by cluster. The rows of cluster c are
+            #lists[offsets[c]:offsets[c+1]]
+        self.lists = np.argsort(assign,kind='stable')
+        self.offsets = np.zeros(len(self.centroids)+1,dtype=np.int64)
+        np.cumsum(np.bincount(assign,minlength=len(self.centroids)),out=self.offsets[1:])
+
+    def Build(self,matrix,chunk=4096):
+        """Clusters the rows of an embedding matrix and builds the inverted lists.
+        Input:
+            matrix - An "Embeddings.EmbeddingMatrix" (or an (N x dim) array, which is normalized into one). Row i of
+                the index is row i of the matrix. The index keeps a reference to the matrix rather than a copy.
+        Output:
+            The index (so that calls can be chained).
+        """
+        self.matrix = matrix if isinstance(matrix,Embeddings.EmbeddingMatrix) else Embeddings.EmbeddingMatrix(matrix)
+        size = len(self.matrix)
+        nlist = self.nlist if self.nlist is not None else max(1,int(np.sqrt(size)))
+        nlist = max(1,min(nlist,size))
+        gen = np.random.RandomState(self.seed)
+        if size == 0:
+            self.centroids = np.zeros((0,0),dtype=np.float32)
+            self._Lists(np.zeros(0,dtype=np.int64))
+            return self
+        self.centroids = self.matrix.Select(gen.choice(size,nlist,replace=False)).Rows().astype(np.float32)
+        #Spherical k-means: assign each vector to the centroid with the highest cosine similarity and move each
+            #centroid to the normalized mean of its vectors.
+        for _ in range(self.iterations):
+            sums = np.zeros_like(self.centroids)
+            counts = np.zeros(nlist,dtype=np.int64)
+            for first in range(0,size,chunk):
+                rows = self.matrix.Rows(first,first+chunk)
+                assign = np.argmax(rows.dot(self.centroids.T),axis=1)
+                np.add.at(sums,assign,rows)
+                counts += np.bincount(assign,minlength=nlist)
+            #Clusters that lost all of their vectors are moved to a random vector.
+            empty = np.flatnonzero(counts == 0)
+            if len(empty) > 0:
+                sums[empty] = self.matrix.Select(gen.choice(size,len(empty))).Rows()
+            centroids = Embeddings.Normalize(sums)
+            if np.allclose(centroids,self.centroids,atol=1e-6):
+                break
+            self.centroids = centroids
+        self._Lists(self._Assign(self.matrix))
+        return self
+
+    def Update(self,matrix,keep):
+        """Updates the index after rows were removed from or added to the indexed matrix, without clustering again.
+        New rows are assigned to their closest centroid. (If most of the rows changed, "Build" gives better clusters.)
+        Inputs:
+            matrix - The new "Embeddings.EmbeddingMatrix". Its first rows are the kept rows of the old matrix (in the
+                same order) and the remaining rows are new.
+            keep - A boolean array over the rows of the old matrix, True for each row that was kept.
+        Output:
+            The index.
+        """
+        if len(self.centroids) == 0:
+            return self.Build(matrix)
+        #The cluster of every old row, read back from the inverted lists.
+        assign = np.empty(len(keep),dtype=np.int64)
+        assign[self.lists] = np.repeat(np.arange(len(self.centroids)),np.diff(self.offsets))
+        self.matrix = matrix
+        self._Lists(np.concatenate([assign[keep],self._Assign(matrix,int(np.sum(keep)))]))
+        return self
+
+    def Search(self,vector,k,nprobe=None):
+        """Finds the rows with the highest cosine similarity to a vector among the nprobe closest clusters.
+        Inputs:
+            vector - The query embedding.
+            k - The number of rows to return.
+            nprobe - The number of clusters to search (defaults to "self.nprobe").
+        Outputs:
+            rows, scores - Arrays of rows and cosine similarities sorted from most to least similar.
+        """
+        nprobe = min(nprobe if nprobe is not None else self.nprobe,len(self.centroids))
+        query = Embeddings.Normalize(vector)
+        if nprobe == 0:
+            return np.zeros(0,dtype=np.int64),np.zeros(0)
+        probe = np.argpartition(-self.centroids.dot(query),nprobe-1)[:nprobe]
+        rows = np.concatenate([self.lists[self.offsets[c]:self.offsets[c+1]] for c in probe])
+        return Indexes.TopRows(rows,self.matrix.Select(rows).Scores(query[None])[0],k)
+
+    def SearchBatch(self,vectors,k,nprobe=None):
+        """Runs "Search" for every row of a matrix of query embeddings. Returns a list of (rows, scores) tuples."""
+        return [self.Search(vector,k,nprobe) for vector in vectors]
+
+    def Exact(self,vector,k):
+        """The exact (brute force) cosine similarity search. Returns the arrays rows, scores."""
+        scores = self.matrix.Scores(Embeddings.Normalize(vector)[None])[0]
+        return Indexes.TopRows(np.arange(len(scores)),scores,k)
+
+    def Recall(self,queries,k=10,nprobe=None):
+        """Measures the fraction of the exact top k rows that the index finds.
+        Inputs:
+            queries - A matrix of query embeddings (for example a sample of the indexed matrix).
+            k - The number of neighbors compared.
+            nprobe - The number of clusters to search.
+        Output:
+            The average recall over all queries (between 0 and 1).
+        """
+        recall = []
+        for vector in queries:
+            exact = set(self.Exact(vector,k)[0].tolist())
+            if len(exact) == 0:
+                continue
+            found = set(self.Search(vector,k,nprobe)[0].tolist())
+            recall.append(len(exact&found)/len(exact))
+        return float(np.mean(recall)) if len(recall) > 0 else 1.0
+
+    def Save(self,path):
+        """Saves the index to a .npz file. (The indexed matrix is not saved with it.)"""
+        np.savez(path,centroids=self.centroids,lists=self.lists,offsets=self.offsets,
+                 settings=np.array([self.nprobe,self.iterations,self.seed]))
+
+    @classmethod
+    def Load(cls,path,matrix):
+        """Loads an index saved with "Save" over the matrix it was built from (an "Embeddings.EmbeddingMatrix")."""
+        data = np.load(path)
+        nprobe, iterations, seed = (int(x) for x in data['settings'])
+        index = cls(len(data['centroids']),nprobe,iterations,seed)
+        index.matrix = matrix
+        index.centroids = data['centroids']
+        index.lists = data['lists']
+        index.offsets = data['offsets']
+        return index
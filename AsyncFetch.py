@@ -0,0 +1,252 @@
+import asyncio
+import functools
+import random as rand
+import time
+import threading
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+import Setup
+import Profiler
+
+"""
+This file contains the concurrent page fetcher used by the USC crawler and the UCLA scraper. Pages are requested with
+asyncio on top of one shared requests session (a pool of keep-alive connections). Each host has a token bucket that
+limits the rate of requests, failed requests are retried with exponential backoff, and each page is parsed as soon as
+it arrives while the other requests are still in flight.
+For incremental re-crawls, "PageCache" remembers the ETag, Last-Modified date, content hash and parsed records of every
+page, so unchanged pages are answered by the server with "304 Not Modified" (or recognized by their hash) and are not
+parsed again.
+It also contains a small local HTTP server which serves saved catalog pages, so the crawlers can be run offline.
+"""
+#Responses with these status codes are retried.
+RetryStatus = {429,500,502,503,504}
+
+class TokenBucket:
+    """Limits the rate of requests to one host.
+    Initialize this class with:
+        rate - The number of requests allowed per second (on average).
+        burst - The number of requests which may be sent back to back after the bucket has been idle.
+    """
+    def __init__(self,rate,burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def Acquire(self):
+        """Waits until a request may be sent."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,self.tokens+(now-self.updated)*self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1-self.tokens)/self.rate)
+
+class Fetcher:
+    """Fetches pages concurrently within a per-host rate limit. Use inside a running event loop (see "Run").
+    Initialize this class with:
+        rate - The number of requests per second allowed for each host.
+        burst - The size of each host's token bucket.
+        concurrency - The largest number of requests in flight at once (also the size of the connection pool).
+        retries - The number of times a failed request is retried.
+        backoff - The base delay (in seconds) before a retry. The delay doubles with each retry.
+        timeout - The timeout (in seconds) of each request.
+    """
+    def __init__(self,rate=None,burst=None,concurrency=None,retries=3,backoff=1.0,timeout=30):
+        self.rate = rate if rate is not None else Setup.crawlRate
+        self.burst = burst if burst is not None else Setup.crawlBurst
+        self.concurrency = concurrency if concurrency is not None else Setup.crawlConcurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.concurrency,pool_maxsize=self.concurrency)
+        self.session.mount('http://',adapter)
+        self.session.mount('https://',adapter)
+        #requests is blocking, so each request runs on one of these threads while the event loop waits for it.
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        self.buckets = {}
+        self.slots = None
+
+    def _Bucket(self,url):
+        host = urlparse(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate,self.burst)
+        return self.buckets[host]
+
+    async def Fetch(self,url,headers=None):
+        """Requests one page, retrying failed requests with exponential backoff.
+        Inputs:
+            url - A string representing the desired url to visit
+            headers - Optional request headers
+        Output:
+            The requests Response object.
+        """
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries+1):
+            await self._Bucket(url).Acquire()
+            try:
+                async with self.slots:
+                    start = time.perf_counter()
+                    response = await loop.run_in_executor(self.executor,functools.partial(
+                        self.session.get,url,headers=headers,timeout=self.timeout))
+                    #Requests overlap, so each one is recorded as a timing rather than as a nested span.
+                    Profiler.Add("fetch.request",time.perf_counter()-start)
+                    Profiler.Count("fetch.requests")
+                if response.status_code not in RetryStatus:
+                    response.raise_for_status()
+                    print(url)
+                    Profiler.Count("fetch.bytes",len(response.content))
+                    return response
+                error = requests.HTTPError("%d response"%response.status_code,response=response)
+                delay = response.headers.get('Retry-After')
+            except requests.RequestException as e:
+                if isinstance(e,requests.HTTPError) and e.response is not None and e.response.status_code not in RetryStatus:
+                    raise
+                error = e
+                delay = None
+            if attempt == self.retries:
+                raise error
+            #Wait before retrying. (Honor the server's Retry-After header if it gives a number of seconds.)
+            if delay is not None and delay.isdigit():
+                delay = float(delay)
+            else:
+                delay = self.backoff*(2**attempt)*rand.uniform(.5,1.5)
+            print("Retrying",url,"in %.1f s (%s)"%(delay,error))
+            Profiler.Count("fetch.retries")
+            await asyncio.sleep(delay)
+
+    async def FetchAll(self,urls,parse=None):
+        """Fetches many pages concurrently. Each page is passed to parse as soon as it arrives.
+        Inputs:
+            urls - A list of urls
+            parse - A function called as parse(url,content) for each page. If None, the page content is returned.
+        Output:
+            A list of the results of parse (in the order of urls).
+        """
+        async def one(url):
+            response = await self.Fetch(url)
+            return parse(url,response.content) if parse is not None else response.content
+        return await asyncio.gather(*(one(url) for url in urls))
+
+    async def FetchCached(self,url,parse,cache,incremental=True):
+        """Fetches a page with a conditional request and only parses it if it changed since the last crawl.
+        Inputs:
+            url - The url of the page
+            parse - A function called as parse(url,content). Its result must be json serializable (it is kept in the cache).
+            cache - A PageCache
+            incremental - If False, the page is always fetched and parsed (the cache is only updated).
+        Outputs:
+            records - The result of parse (from the cache if the page did not change)
+            changed - True if the page is new or its content changed.
+        """
+        entry = cache.Get(url) if incremental else None
+        response = await self.Fetch(url,headers=cache.Headers(url) if incremental else None)
+        if response.status_code == 304 and entry is not None:
+            Profiler.Count("fetch.notModified")
+            return entry['records'],False
+        digest = hashlib.sha1(response.content).hexdigest()
+        if entry is not None and entry['hash'] == digest:
+            #The server sent the page again but nothing changed.
+            Profiler.Count("fetch.unchanged")
+            cache.Put(url,response,digest,entry['records'])
+            return entry['records'],False
+        with Profiler.Span("parse"):
+            records = parse(url,response.content)
+        cache.Put(url,response,digest,records)
+        return records,True
+
+    async def FetchAllCached(self,urls,parse,cache,incremental=True):
+        """Runs "FetchCached" for many pages concurrently. Returns a list of (records, changed) tuples in the order of urls."""
+        return await asyncio.gather(*(self.FetchCached(url,parse,cache,incremental) for url in urls))
+
+    def Close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+class PageCache:
+    """Remembers the validators (ETag and Last-Modified), the content hash and the parsed records of each crawled page.
+    Initialize this class with:
+        path - The json file the cache is kept in. Defaults to "Setup.crawlCache"
+    """
+    def __init__(self,path=None):
+        self.path = path if path is not None else Setup.crawlCache
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path,'r') as f:
+                self.entries = json.load(f)
+
+    def Get(self,url):
+        """Returns the cache entry of a url (or None)."""
+        return self.entries.get(url)
+
+    def Headers(self,url):
+        """Returns the headers of a conditional request for a url."""
+        entry = self.entries.get(url)
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('lastModified'):
+                headers['If-Modified-Since'] = entry['lastModified']
+        return headers
+
+    def Put(self,url,response,digest,records):
+        """Stores the validators of a response with the hash and parsed records of its page."""
+        self.entries[url] = {'etag':response.headers.get('ETag'),'lastModified':response.headers.get('Last-Modified'),
+                             'hash':digest,'records':records}
+
+    def Save(self):
+        """Writes the cache to its json file."""
+        with open(self.path+".tmp",'w') as f:
+            json.dump(self.entries,f)
+        os.replace(self.path+".tmp",self.path)
+
+def Run(main):
+    """Runs a coroutine function that takes a Fetcher (for example "lambda f: f.FetchAll(urls)") and closes the fetcher
+    afterwards. Returns the result of the coroutine."""
+    async def runner():
+        fetcher = Fetcher()
+        try:
+            return await main(fetcher)
+        finally:
+            fetcher.Close()
+    return asyncio.run(runner())
+
+class LocalCatalogServer:
+    """Serves saved catalog pages from a folder over HTTP on localhost, standing in for the real catalog sites so the
+    crawlers can be run and tested offline. Use as a context manager:
+        with LocalCatalogServer(folder) as server:
+            USCCrawler2.USCCrawl(server.url+"/usc/index.html")
+    Initialize this class with:
+        folder - The folder containing the saved pages (paths in the urls are relative to this folder).
+        port - The port to listen on (0 picks a free port).
+    """
+    def __init__(self,folder,port=0):
+        from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+        class Handler(SimpleHTTPRequestHandler):
+            def log_message(self,*args):
+                pass
+        handler = functools.partial(Handler,directory=os.path.abspath(folder))
+        self.server = ThreadingHTTPServer(('127.0.0.1',port),handler)
+        self.url = "http://127.0.0.1:%d"%self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever,daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self,*args):
+        self.server.shutdown()
+        self.server.server_close()
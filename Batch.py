@@ -0,0 +1,230 @@
+import os
+import json
+import csv
+import numpy as np
+import Profiler
+import Embeddings
+
+"""
+This file contains the batch mode used to match a whole catalog of courses (for example every USC course) against the
+training set of a "Similarities" instance (for example the UCLA catalog). All query courses are embedded in one batch,
+and the similarities are calculated one block of queries at a time as a matrix product with the reference matrix, so
+the memory used is bounded by the block size. The top k matches of each course are streamed to a CSV or json lines file.
+"AllPairs" compares every course of the training set with every other course in tiles bounded by a memory ceiling and
+writes the sparse result (the top k of each course, or every pair above a threshold) to disk.
+"""
+#The embedding used by each method that is matched with matrix products.
+EmbeddingKeys = {"WordSim":"Word","DocSim":"Doc","GloveSim":"Glove"}
+
+def TopKRows(scores,k):
+    """Finds the k highest scores of every row of a block of scores.
+    Inputs:
+        scores - A (queries x references) matrix of scores.
+        k - The number of matches kept for each query.
+    Outputs:
+        rows, values - (queries x k) arrays of reference rows and scores, sorted from most to least similar. Ties are
+            broken by reference row.
+    """
+    k = min(k,scores.shape[1])
+    if k == 0:
+        return np.zeros((len(scores),0),dtype=np.int64),np.zeros((len(scores),0))
+    if k < scores.shape[1]:
+        top = np.argpartition(-scores,k-1,axis=1)[:,:k]
+    else:
+        top = np.broadcast_to(np.arange(k),scores.shape).copy()
+    values = np.take_along_axis(scores,top,axis=1)
+    #Sort each row by score and then by reference row.
+    order = np.lexsort((top,-values),axis=1)
+    return np.take_along_axis(top,order,axis=1),np.take_along_axis(values,order,axis=1)
+
+def _Prewarm(S,methodName):
+    #Builds a method before the first block is scored. GloveSim can not be scored if the GloVe vectors failed to load.
+    S.Prewarm([methodName])
+    if methodName == "GloveSim" and S.GloveFail:
+        raise ValueError("GloveSim is not available: the GloVe vectors could not be loaded")
+
+def Match(S,queryDF,methodName="WordSim",k=10,blockSize=1024):
+    """Finds the top k training courses of every course in a dataframe.
+    Inputs:
+        S - A "Similarities" instance. Its training set is searched.
+        queryDF - A dataframe of the courses to match (with the columns 'name' and 'description')
+        methodName - "WordSim","DocSim" or "GloveSim" (matched in blocks), or "Jacard" or "Lev" (matched one course at
+            a time with their search indexes).
+        k - The number of matches of each course.
+        blockSize - The number of query courses scored at once. A block uses blockSize x (training set size) floats.
+    Output:
+        A generator of (course, matchIds, scores) tuples in the order of queryDF. (A ValueError is raised if the method
+        is GloveSim and the GloVe vectors could not be loaded.)
+    """
+    _Prewarm(S,methodName)
+    ids = np.array(S.ids,dtype=object)
+    if methodName not in EmbeddingKeys:
+        for course in queryDF.index:
+            rows, scores = S.Search[methodName](queryDF,course,k)
+            yield course,ids[rows].tolist(),scores.tolist()
+        return
+    key = EmbeddingKeys[methodName]
+    #Embed every query course in one batch and scale the embeddings to unit length like the reference matrix.
+    with Profiler.Span("Batch.embed",key):
+        Q = Embeddings.Normalize(S.Embed(key,queryDF))
+    courses = list(queryDF.index)
+    for start in range(0,len(courses),blockSize):
+        block = S.VM[key].Scores(Q[start:start+blockSize])
+        Profiler.Count("pairs scored",block.size)
+        rows, scores = TopKRows(block,k)
+        for i, course in enumerate(courses[start:start+blockSize]):
+            yield course,ids[rows[i]].tolist(),scores[i].tolist()
+
+def MatchAll(S,queryDF,methodName="WordSim",k=10,outPath=None,blockSize=1024):
+    """Matches every course in a dataframe (see "Match") and streams the results to a file.
+    Inputs:
+        S, queryDF, methodName, k, blockSize - See "Match"
+        outPath - The output file. A ".jsonl" file gets one line per course: {"course":...,"matches":[...],
+            "scores":[...]}. Any other file is written as CSV with one line per match: course,rank,match,score
+    Output:
+        The number of courses matched.
+    """
+    #(Checked before the output file is opened, so a method that can not be scored leaves no file behind.)
+    _Prewarm(S,methodName)
+    count = 0
+    with open(outPath+".tmp",'w',newline='') as outfile:
+        if outPath.endswith(".jsonl"):
+            for course, matches, scores in Match(S,queryDF,methodName,k,blockSize):
+                outfile.write(json.dumps({"course":course,"matches":matches,"scores":scores})+"\n")
+                count +=1
+        else:
+            writer = csv.writer(outfile)
+            writer.writerow(["course","rank","match","score"])
+            for course, matches, scores in Match(S,queryDF,methodName,k,blockSize):
+                writer.writerows([course,rank+1,match,score] for rank, (match, score) in enumerate(zip(matches,scores)))
+                count +=1
+    os.replace(outPath+".tmp",outPath)
+    print("Matched",count,"courses with",methodName,"to",outPath)
+    return count
+
+#The methods "AllPairs" can compare. (Jacard is scored with the inverted index, the others with matrix products.)
+AllPairsMethods = ["WordSim","DocSim","GloveSim","Jacard"]
+
+def _TileShape(n,width,memoryLimit):
+    #The number of rows and columns of each tile. A tile of scores (plus the temporaries of the top k selection, about
+        #4 copies of 8 bytes per score) must fit in the memory limit.
+    cols = min(n,width)
+    rows = max(1,min(n,memoryLimit//(4*8*max(cols,1))))
+    return rows,cols
+
+def _MergeTopK(cols,scores,k):
+    #Keeps the k highest scores of each row of (rows x candidates) arrays, breaking ties by column.
+    order = np.lexsort((cols,-scores),axis=1)[:,:k]
+    return np.take_along_axis(cols,order,axis=1),np.take_along_axis(scores,order,axis=1)
+
+class _PairWriter:
+    #Appends (row, column, score) entries to the files of an "AllPairs" result.
+    def __init__(self,path):
+        self.path = path
+        self.files = {name:open(os.path.join(path,name+".tmp"),'wb') for name in ("row","col","score")}
+        self.count = 0
+
+    def Add(self,rows,cols,scores):
+        self.files["row"].write(np.asarray(rows,dtype=np.int32).tobytes())
+        self.files["col"].write(np.asarray(cols,dtype=np.int32).tobytes())
+        self.files["score"].write(np.asarray(scores,dtype=np.float32).tobytes())
+        self.count += len(rows)
+
+    def Close(self,complete):
+        #The files are only moved into place if every pair was written. Otherwise they are deleted.
+        for name, f in self.files.items():
+            f.close()
+            if complete:
+                os.replace(os.path.join(self.path,name+".tmp"),os.path.join(self.path,name+".bin"))
+            else:
+                os.remove(os.path.join(self.path,name+".tmp"))
+
+@Profiler.Timed("AllPairs")
+def AllPairs(S,methodName,outPath,k=None,threshold=None,memoryLimit=256*2**20,tileWidth=4096):
+    """Compares every course of the training set with every other course and writes the sparse result to disk.
+    The score matrix is calculated in tiles and never held in memory as a whole.
+    Inputs:
+        S - A "Similarities" instance.
+        methodName - "WordSim","DocSim","GloveSim" or "Jacard"
+        outPath - The folder the result is written to (read it with "LoadPairs").
+        k - Keep the k most similar courses of each course.
+        threshold - Keep every pair with a score of at least threshold. (Give k, threshold or both. With both, the top k
+            of each course are kept if they reach the threshold.)
+        memoryLimit - The largest number of bytes used for the scores of one tile.
+        tileWidth - The largest number of columns in a tile. (Jacard tiles always span every column.)
+    Output:
+        The number of pairs written. A course is never paired with itself.
+    """
+    if k is None and threshold is None:
+        raise ValueError("Give k, threshold or both")
+    if methodName not in AllPairsMethods:
+        raise ValueError("AllPairs supports %s"%", ".join(AllPairsMethods))
+    _Prewarm(S,methodName)
+    n = len(S.ids)
+    key = EmbeddingKeys.get(methodName)
+    if key is not None:
+        M = S.VM[key]
+    rowBlock, colBlock = _TileShape(n,n if key is None else tileWidth,memoryLimit)
+    os.makedirs(outPath,exist_ok=True)
+    #The metadata of an earlier result in the same folder is removed first, so that it is never read together with
+        #the files of this one (it is written again once every pair has been written).
+    metaPath = os.path.join(outPath,"meta.json")
+    if os.path.exists(metaPath):
+        os.remove(metaPath)
+    writer = _PairWriter(outPath)
+    complete = False
+    try:
+        for rowStart in range(0,n,rowBlock):
+            rowEnd = min(n,rowStart+rowBlock)
+            rows = np.arange(rowStart,rowEnd)
+            #The best k columns found so far for each row of the block.
+            bestCols = np.zeros((len(rows),0),dtype=np.int64)
+            bestScores = np.zeros((len(rows),0))
+            for colStart in range(0,n,colBlock):
+                colEnd = min(n,colStart+colBlock)
+                if key is None:
+                    tile = np.array([S.jacardIndex.Scores(S.catalog.descriptions[row]) for row in rows])
+                else:
+                    tile = M.Scores(M.Rows(rowStart,rowEnd),colStart,colEnd)
+                Profiler.Count("pairs scored",tile.size)
+                #Do not pair a course with itself.
+                diagonal = rows[(rows >= colStart) & (rows < colEnd)]
+                tile[diagonal-rowStart,diagonal-colStart] = -np.inf
+                if k is None:
+                    r, c = np.nonzero(tile >= threshold)
+                    writer.Add(rows[r],c+colStart,tile[r,c])
+                    continue
+                cols, scores = TopKRows(tile,k)
+                bestCols, bestScores = _MergeTopK(np.concatenate([bestCols,cols+colStart],axis=1),
+                                                  np.concatenate([bestScores,scores],axis=1),k)
+            if k is not None:
+                keep = np.isfinite(bestScores)
+                if threshold is not None:
+                    keep &= bestScores >= threshold
+                writer.Add(np.repeat(rows,keep.sum(axis=1)),bestCols[keep],bestScores[keep])
+        complete = True
+    finally:
+        writer.Close(complete)
+    with open(metaPath+".tmp",'w') as f:
+        #The threshold may be a NumPy scalar (such as a float32 score).
+        threshold = None if threshold is None else float(threshold)
+        json.dump({"method":methodName,"k":k,"threshold":threshold,"pairs":writer.count,"ids":list(S.ids)},f)
+    os.replace(metaPath+".tmp",metaPath)
+    print("Wrote",writer.count,methodName,"pairs to",outPath)
+    return writer.count
+
+def LoadPairs(path):
+    """Reads a result written by "AllPairs".
+    Outputs:
+        ids - The course numbers. Rows and columns are positions in this list.
+        rows, cols, scores - Memory mapped arrays of the pairs. The top k pairs of each row are written together,
+            from most to least similar.
+    """
+    with open(os.path.join(path,"meta.json"),'r') as f:
+        meta = json.load(f)
+    def read(name,dtype):
+        fileName = os.path.join(path,name+".bin")
+        if os.path.getsize(fileName) == 0:
+            return np.zeros(0,dtype=dtype)
+        return np.memmap(fileName,dtype=dtype,mode='r')
+    return meta["ids"],read("row",np.int32),read("col",np.int32),read("score",np.float32)
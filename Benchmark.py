@@ -0,0 +1,307 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import platform
+import subprocess
+import tempfile
+import contextlib
+import numpy as np
+import pandas as pd
+import Setup
+
+"""
+This file contains the benchmark harness. It runs offline against synthetic catalogs of any size and times the stages
+of the pipeline: building the "Similarities" class in each mode, the latency of one top k query and of one pairwise
+call for each of the 5 methods, one-vs-all scoring in each embedding precision, "Score.SimScore" and
+"Score.ScoreMethod" end to end, the two cleaners, and loading the checkpoint formats. Every file is written to a temporary folder (the paths in Setup are redirected while it runs).
+The results are saved as json so that two runs can be compared:
+    python Benchmark.py --sizes 1000 5000 --out bench.json
+    python Benchmark.py --sizes 1000 5000 --compare bench.json
+A comparison lists the change of every timing and exits with status 1 if any of them is slower by more than the
+tolerance.
+It also guards the start up time: every module in "LightModules" is imported in a fresh interpreter, and the run fails
+if an import takes longer than the budget or loads one of the "HeavyModules" (these are only imported by the functions
+which use them).
+    python Benchmark.py --import-budget 0.5
+"""
+MethodNames = ["Jacard","Lev","WordSim","DocSim","GloveSim"]
+#Modules that importing the files in "LightModules" must not load.
+HeavyModules = ["gensim","sklearn","pandas","Levenshtein"]
+LightModules = ["Similarities","Score","CrossValidation","Batch","Indexes","ANNIndex","Catalog","ModelStore","Glove",
+                "DocInference","Profiler"]
+
+def SyntheticCatalog(n,seed=0,vocabSize=2000,schools=("engineering","medicine")):
+    """Builds a cleaned catalog of n courses in the format read by the "Similarities" class. Each school draws its
+    descriptions mostly from its own part of the vocabulary, so the methods have something to find.
+    Output:
+        A dataframe with the columns 'name','description','preqName' and 'school' indexed by course number.
+    """
+    gen = random.Random(seed)
+    vocab = ["w%d"%i for i in range(vocabSize)]
+    share = vocabSize//(len(schools)+1)
+    numbers = ["c %d"%i for i in range(n)]
+    rows = {}
+    for i in range(n):
+        s = gen.randrange(len(schools))
+        words = vocab[s*share:(s+2)*share]
+        rows[numbers[i]] = {'name':' '.join(gen.choice(vocab[:200]) for _ in range(gen.randint(1,6))),
+                            'description':' '.join(gen.choice(words) for _ in range(gen.randint(10,80))),
+                            'preqName':gen.sample(numbers[:max(1,i)],min(i,gen.randint(0,3))),
+                            'school':schools[s]}
+    return pd.DataFrame.from_dict(rows,orient='index')
+
+def SyntheticRaw(n,seed=0):
+    """Builds n raw course dictionaries in the format produced by the USC crawler (for timing "Cleaner")."""
+    catalog = SyntheticCatalog(n,seed)
+    gen = random.Random(seed)
+    for number, row in catalog.iterrows():
+        words = row['description'].split()
+        #Add the capital letters, punctuation and stop words the cleaner removes.
+        for _ in range(len(words)//4):
+            words.insert(gen.randrange(len(words)+1),gen.choice(["A","of","the","or","to","will.",";","/"]))
+        yield {'name':' '+row['name'].title()+' ','number':number.upper().replace(' ',':'),
+               'description':' '.join(words).capitalize()+'.','preqName':[p.upper() for p in row['preqName']],
+               'school':row['school']}
+
+def SyntheticUCLA(n,seed=0):
+    """Builds n raw (name, description) tuples in the format produced by the UCLA scraper (for timing "UCLACleaner")."""
+    catalog = SyntheticCatalog(n,seed)
+    for number, row in catalog.iterrows():
+        yield ("%s. %s"%(number.upper(),row['name'].title()),
+               "Lecture, three hours. %s. Letter grading."%row['description'].capitalize())
+
+def SyntheticGlove(words,dim=50,seed=0):
+    """Saves random word vectors for a list of words in the GloVe format read by "Glove.Load" (at the Setup paths)."""
+    import Glove
+    gen = np.random.RandomState(seed)
+    Glove.Save(gen.standard_normal((len(words),dim)).astype(np.float32),list(words))
+
+@contextlib.contextmanager
+def Sandbox():
+    """Redirects every file path in Setup to a temporary folder while the benchmark runs."""
+    names = ["pickleJar","jsonFile","jsonLines","gloveJar","gloveVectors","gloveVocab","UCLA","UCLARawLines","UCLAClean",
+             "UCLALines","crawlCache","modelStore","uscCatalog","uclaCatalog"]
+    saved = {name:getattr(Setup,name) for name in names if hasattr(Setup,name)}
+    with tempfile.TemporaryDirectory() as folder:
+        for name, path in saved.items():
+            setattr(Setup,name,os.path.join(folder,os.path.relpath(path,Setup.rootFolder)))
+        os.makedirs(os.path.join(folder,"catalogs"),exist_ok=True)
+        try:
+            yield folder
+        finally:
+            for name, path in saved.items():
+                setattr(Setup,name,path)
+
+def _Quiet():
+    #Hides the progress messages printed by the code being timed.
+    return contextlib.redirect_stdout(io.StringIO())
+
+def _Seconds(function,repeat=1):
+    #The shortest of repeat runs (the least disturbed by other work on the machine).
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best,time.perf_counter()-start)
+    return best
+
+def _Latency(times):
+    #Summarizes a list of durations (in seconds) in milliseconds.
+    ms = np.array(times)*1000
+    return {"medianMs":float(np.median(ms)),"p95Ms":float(np.percentile(ms,95)),"meanMs":float(ms.mean()),
+            "count":len(ms)}
+
+def ImportTime(module,repeat=3):
+    """Times the import of a module in a fresh Python interpreter (started in the project folder).
+    Inputs:
+        module - The name of the module.
+        repeat - The number of interpreters started. The fastest import is kept.
+    Outputs:
+        seconds - The time taken by the import statement.
+        heavy - The modules of "HeavyModules" which were loaded by the import.
+    """
+    code = ("import sys,time\nstart = time.perf_counter()\nimport %s\nprint(time.perf_counter()-start)\n"
+            "print(','.join(name for name in %r if name in sys.modules))"%(module,HeavyModules))
+    best = float('inf')
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable,"-c",code],cwd=Setup.rootFolder,stdout=subprocess.PIPE,
+                             universal_newlines=True,check=True).stdout.splitlines()
+        best = min(best,float(out[0]))
+    heavy = out[1].split(",") if len(out) > 1 and out[1] else []
+    return best,heavy
+
+def CheckImports(budget=0.5,modules=None):
+    """Imports each module in a fresh interpreter and checks the start up budget.
+    Inputs:
+        budget - The largest number of seconds an import may take.
+        modules - The modules checked (defaults to "LightModules").
+    Outputs:
+        results - A dictionary connecting "import/<module>" to {"seconds":..,"heavy":[..]}
+        failures - A list of messages, one for each module that is over budget or loads a heavy module.
+    """
+    results = {}
+    failures = []
+    for module in (modules if modules is not None else LightModules):
+        seconds, heavy = ImportTime(module)
+        results["import/%s"%module] = {"seconds":seconds,"heavy":heavy}
+        if seconds > budget:
+            failures.append("import %s took %.3f s (budget %.3f s)"%(module,seconds,budget))
+        if heavy:
+            failures.append("import %s loaded %s"%(module,", ".join(heavy)))
+    return results,failures
+
+def Run(sizes=(1000,),queries=100,seed=0,methods=None):
+    """Runs the benchmarks for catalogs of each size.
+    Inputs:
+        sizes - The catalog sizes (number of courses).
+        queries - The number of test courses timed for each method.
+        seed - The seed of the synthetic catalogs.
+        methods - The methods timed (defaults to all 5). Only these methods are built. (The whole pipeline timing,
+            "Score.ScoreMethod", runs all 5 methods and is only timed when all 5 are asked for.)
+    Output:
+        A dictionary {"meta":{...},"results":{name:{metric:value}}}. Timings of whole stages are in "seconds" and
+        per query latencies in "medianMs" (with "p95Ms" and "meanMs").
+    """
+    import Similarities as Sims
+    import Score
+    import Cleaner
+    import UCLACleaner
+    import CatalogStore
+    import Embeddings
+    methods = list(methods) if methods is not None else MethodNames
+    #The methods built in each "Similarities" instance. The construction timings are named after them, so runs which
+        #built other methods are not compared with each other.
+    built = "All" if set(methods) == set(MethodNames) else "+".join(methods)
+    build = "All" if built == "All" else methods
+    #The cold import time of each module (compared between runs like the other timings).
+    results, _ = CheckImports(float('inf'))
+    with Sandbox():
+        for n in sizes:
+            catalog = SyntheticCatalog(n,seed)
+            trainDF = catalog.iloc[:int(.9*n)]
+            testDF = catalog.iloc[int(.9*n):]
+            if "GloveSim" in methods:
+                SyntheticGlove(sorted({word for description in catalog['description'] for word in description.split()}))
+            #Building the class. "cold" trains everything, "warm" loads the artifacts saved by a previous build and
+                #"lazy" builds nothing.
+            modes = ([("Word","Word")] if "WordSim" in methods and built != "WordSim" else [])+[(built,build)]
+            for name, mode in modes:
+                with _Quiet():
+                    results["construct/%s/cold/%d"%(name,n)] = {"seconds":_Seconds(lambda: Sims.Similarities(trainDF,mode,store=False))}
+            with _Quiet():
+                Sims.Similarities(trainDF,build)
+                results["construct/%s/warm/%d"%(built,n)] = {"seconds":_Seconds(lambda: Sims.Similarities(trainDF,build))}
+                #Nothing is built until a method is used.
+                results["construct/lazy/%d"%n] = {"seconds":_Seconds(lambda: Sims.Similarities(trainDF,store=False))}
+                S = Sims.Similarities(trainDF,build,store=False)
+            courses = list(testDF.index[:queries])
+            for methodName in methods:
+                if methodName == "GloveSim" and S.GloveFail:
+                    continue
+                method = getattr(S,methodName)
+                #The query cache is cleared so that every query embeds its course again.
+                S.queryCache.Clear()
+                results["topk/%s/%d"%(methodName,n)] = _Latency(
+                    [_Seconds(lambda: S.TopK(methodName,testDF,course,10)) for course in courses])
+                S.queryCache.Clear()
+                results["pair/%s/%d"%(methodName,n)] = _Latency(
+                    [_Seconds(lambda: method(testDF,trainDF.index[i],course)) for i, course in enumerate(courses)])
+                S.queryCache.Clear()
+                results["simscore/%s/%d"%(methodName,n)] = _Latency(
+                    [_Seconds(lambda: Score.SimScore(trainDF,testDF,course,method,k=10)) for course in courses])
+            #Scoring one course against every reference embedding in each storage precision (see Embeddings.py).
+            if "WordSim" in methods:
+                for precision in Embeddings.Precisions:
+                    with _Quiet():
+                        P = Sims.Similarities(trainDF,["WordSim"],precision=precision)
+                    results["embeddings/%s/%d"%(precision,n)] = dict(_Latency(
+                        [_Seconds(lambda: P.WordSimAll(testDF,course)) for course in courses]),bytes=P.VM["Word"].nbytes)
+            if built == "All":
+                ScoreDict = {methodName:{"School":0,"Preq":0} for methodName in MethodNames}
+                with _Quiet():
+                    S.queryCache.Clear()
+                    results["scoremethod/%d"%n] = {"seconds":_Seconds(
+                        lambda: Score.ScoreMethod(trainDF,testDF,S,ScoreDict,1,len(courses)))}
+            #The cleaners (the synthetic records are built before the timer starts).
+            raw = list(SyntheticRaw(n,seed))
+            ucla = list(SyntheticUCLA(n,seed))
+            with _Quiet():
+                results["clean/usc/%d"%n] = {"seconds":_Seconds(lambda: Cleaner.CleanToLines(raw),5)}
+                results["clean/ucla/%d"%n] = {"seconds":_Seconds(lambda: UCLACleaner.UCLACleanToLines(ucla),5)}
+            #Loading the checkpoint formats.
+            catalog.to_json(Setup.jsonFile,orient='index')
+            with _Quiet():
+                CatalogStore.Write(Setup.uscCatalog,catalog)
+            results["checkpoint/json/%d"%n] = {"seconds":_Seconds(lambda: pd.read_json(Setup.jsonFile,orient='index'),5)}
+            results["checkpoint/catalog/%d"%n] = {"seconds":_Seconds(lambda: CatalogStore.Load(Setup.uscCatalog),5)}
+            results["checkpoint/catalog-2col/%d"%n] = {"seconds":_Seconds(
+                lambda: CatalogStore.Load(Setup.uscCatalog,['name','description']),5)}
+    meta = {"time":time.strftime("%Y-%m-%d %H:%M:%S"),"python":platform.python_version(),"numpy":np.__version__,
+            "platform":platform.platform(),"cpus":os.cpu_count(),"sizes":list(sizes),"queries":queries,"seed":seed}
+    return {"meta":meta,"results":results}
+
+def _Primary(result):
+    #The metric compared between runs.
+    return "medianMs" if "medianMs" in result else "seconds"
+
+def Compare(current,previous,tolerance=0.2):
+    """Compares the results of two runs.
+    Inputs:
+        current, previous - Dictionaries returned by "Run" (or read from their json files).
+        tolerance - The fraction by which a timing may grow before it counts as a regression.
+    Output:
+        A list of (name, metric, previous value, current value, ratio, regressed) tuples for every benchmark in both runs.
+    """
+    rows = []
+    for name, result in current["results"].items():
+        old = previous["results"].get(name)
+        if old is None:
+            continue
+        metric = _Primary(result)
+        ratio = result[metric]/old[metric] if old[metric] > 0 else float('inf')
+        rows.append((name,metric,old[metric],result[metric],ratio,ratio > 1+tolerance))
+    return rows
+
+def Report(report):
+    """Prints the results of a run as a table."""
+    for name, result in report["results"].items():
+        metric = _Primary(result)
+        print("%-32s %10.3f %s"%(name,result[metric],metric))
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Times the similarity methods and the pipeline stages.")
+    parser.add_argument("--sizes",type=int,nargs="+",default=[1000],help="The catalog sizes to benchmark.")
+    parser.add_argument("--queries",type=int,default=100,help="The number of test courses timed for each method.")
+    parser.add_argument("--seed",type=int,default=0)
+    parser.add_argument("--methods",nargs="+",choices=MethodNames)
+    parser.add_argument("--out",help="Save the results to this json file.")
+    parser.add_argument("--compare",help="Compare the results with a previous json file.")
+    parser.add_argument("--tolerance",type=float,default=0.2,help="The allowed slowdown (0.2 = 20%%) before a "
+                        "timing counts as a regression.")
+    parser.add_argument("--import-budget",type=float,help="Only check that each light module imports within this "
+                        "many seconds without loading a heavy module.")
+    args = parser.parse_args()
+    if args.import_budget is not None:
+        results, failures = CheckImports(args.import_budget)
+        for name, result in results.items():
+            print("%-32s %10.3f seconds %s"%(name,result["seconds"],", ".join(result["heavy"])))
+        for failure in failures:
+            print("FAILED:",failure)
+        sys.exit(1 if failures else 0)
+    report = Run(args.sizes,args.queries,args.seed,args.methods)
+    Report(report)
+    if args.out:
+        with open(args.out,'w') as f:
+            json.dump(report,f,indent=1)
+    if args.compare:
+        with open(args.compare,'r') as f:
+            previous = json.load(f)
+        regressions = 0
+        for name, metric, old, new, ratio, regressed in Compare(report,previous,args.tolerance):
+            print("%-32s %10.3f -> %10.3f %s (x%.2f)%s"%(name,old,new,metric,ratio," REGRESSION" if regressed else ""))
+            regressions += regressed
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,90 @@
+import numpy as np
+
+"""
+This file contains the columnar form of a course dataframe used inside the "Similarities" class. The dataframe is read
+once into plain arrays (course numbers, names, descriptions and the words of every description as word ids) so that
+building the embeddings and scoring courses does not go through pandas row by row.
+"""
+
+class Catalog:
+    """A column oriented, read only copy of a course dataframe.
+    Initialize this class with:
+        ids - The course numbers (the index of the dataframe)
+        names - The course names
+        descriptions - The course descriptions
+    Attributes:
+        ids - An object array of course numbers. Row i of every column belongs to course ids[i].
+        names, descriptions - Lists of strings.
+        words - A list connecting each word id to its word.
+        vocab - A dictionary connecting each word to its word id.
+        tokenIds - The word ids of all descriptions, one description after another.
+        offsets - The words of description i are tokenIds[offsets[i]:offsets[i+1]]
+    """
+    def __init__(self,ids,names,descriptions):
+        self.ids = np.array(list(ids),dtype=object)
+        self.names = list(names)
+        self.descriptions = list(descriptions)
+        self.rows = {index:row for row, index in enumerate(self.ids)}
+        self.vocab = {}
+        self.tokenIds, lengths = self._Tokenize(self.descriptions)
+        self.words = list(self.vocab)
+        self.offsets = np.zeros(len(lengths)+1,dtype=np.int64)
+        np.cumsum(lengths,out=self.offsets[1:])
+
+    def _Tokenize(self,descriptions):
+        #Splits descriptions into words and converts them to word ids (adding new words to the vocabulary). Returns the
+            #word ids of all descriptions and the number of words in each.
+        tokenIds = []
+        lengths = []
+        for description in descriptions:
+            words = description.split()
+            lengths.append(len(words))
+            tokenIds.extend(self.vocab.setdefault(word,len(self.vocab)) for word in words)
+        return np.array(tokenIds,dtype=np.int32),np.array(lengths,dtype=np.int64)
+
+    def Update(self,keep,ids,names,descriptions):
+        """Returns a new catalog holding the kept rows of this one (in the same order) followed by new courses. Only the
+        new descriptions are split into words. (Words that are no longer used stay in the vocabulary.)
+        Inputs:
+            keep - A boolean array over the rows of this catalog, True for each row that is kept.
+            ids, names, descriptions - The columns of the courses added after the kept rows.
+        Output:
+            The new Catalog (this one is not changed).
+        """
+        keep = np.asarray(keep,dtype=bool)
+        rows = np.flatnonzero(keep)
+        catalog = Catalog.__new__(Catalog)
+        catalog.ids = np.concatenate([self.ids[rows],np.array(list(ids),dtype=object)])
+        catalog.names = [self.names[row] for row in rows.tolist()]+list(names)
+        catalog.descriptions = [self.descriptions[row] for row in rows.tolist()]+list(descriptions)
+        catalog.rows = {index:row for row, index in enumerate(catalog.ids)}
+        catalog.vocab = dict(self.vocab)
+        tokenIds, lengths = catalog._Tokenize(catalog.descriptions[len(rows):])
+        catalog.words = list(catalog.vocab)
+        #The word ids of the kept rows are copied as they are.
+        counts = np.diff(self.offsets)
+        catalog.tokenIds = np.concatenate([self.tokenIds[np.repeat(keep,counts)],tokenIds])
+        catalog.offsets = np.zeros(len(catalog.ids)+1,dtype=np.int64)
+        np.cumsum(np.concatenate([counts[rows],lengths]),out=catalog.offsets[1:])
+        return catalog
+
+    def __len__(self):
+        return len(self.ids)
+
+    def Row(self,index):
+        """Returns the row of a course number."""
+        return self.rows[index]
+
+    def TokenIds(self,row):
+        """Returns the word ids of the description in a row."""
+        return self.tokenIds[self.offsets[row]:self.offsets[row+1]]
+
+    def Texts(self,start=0):
+        """Returns every description (from row start onwards) as a list of words (the input format of the gensim
+        models)."""
+        words = self.words
+        return [[words[i] for i in self.TokenIds(row).tolist()] for row in range(start,len(self))]
+
+def FromFrame(df):
+    """Builds a Catalog from a dataframe with the columns 'name' and 'description' indexed by course number."""
+    return Catalog(df.index,df['name'].tolist(),df['description'].tolist())
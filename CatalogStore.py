@@ -0,0 +1,218 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+"""
+This file contains the columnar on-disk format of the cleaned course catalogs. A catalog is a folder with one set of
+files per column and a "schema.json" file describing the columns. Columns are opened with memory maps, so loading a
+catalog only reads the columns (and rows) that are asked for:
+    str - The UTF-8 bytes of every value one after another ("<column>.bin") and the offset of each value ("<column>.npy")
+    json - Like "str", but every value is a json string (used for lists such as the prerequisites).
+    category - One integer code per row ("<column>.npy") and the list of distinct values in the schema. Rows can be
+        filtered by these values (for example by school) without reading any other column.
+The course numbers are kept in the "str" column "number".
+"""
+#Bump this number whenever the layout of the files changes. Catalogs written with another version are not loaded.
+SCHEMA_VERSION = 1
+
+#Columns stored as categories when a catalog is written.
+Categories = ("school",)
+
+def _Records(records):
+    #Accepts a dataframe (indexed by course number) or an iterable of (number, entry) tuples.
+    if isinstance(records,pd.DataFrame):
+        return zip(records.index,records.to_dict('records'))
+    return iter(records)
+
+def _Missing(value):
+    #True for None and for the NaN pandas uses for missing values.
+    return value is None or (isinstance(value,float) and value != value)
+
+def _Str(value):
+    #Missing values are stored as empty strings (str would turn NaN into the word "nan").
+    return "" if _Missing(value) else str(value)
+
+def _Chain(first,records):
+    yield first
+    yield from records
+
+class _StrWriter:
+    #Writes a "str" or "json" column one value at a time.
+    def __init__(self,folder,column,encode):
+        self.folder = folder
+        self.column = column
+        self.encode = encode
+        self.data = open(os.path.join(folder,column+".bin"),'wb')
+        self.offsets = [0]
+
+    def Add(self,value):
+        raw = self.encode(value).encode('utf-8')
+        self.data.write(raw)
+        self.offsets.append(self.offsets[-1]+len(raw))
+
+    def Close(self):
+        self.data.close()
+        np.save(os.path.join(self.folder,self.column+".npy"),np.array(self.offsets,dtype=np.int64))
+        return {}
+
+class _CategoryWriter:
+    #Writes a "category" column one value at a time.
+    def __init__(self,folder,column):
+        self.folder = folder
+        self.column = column
+        self.categories = {}
+        self.codes = []
+
+    def Add(self,value):
+        #Every missing value is one category (each NaN would otherwise be a category of its own).
+        value = None if _Missing(value) else value
+        self.codes.append(self.categories.setdefault(value,len(self.categories)))
+
+    def Close(self):
+        np.save(os.path.join(self.folder,self.column+".npy"),np.array(self.codes,dtype=np.int32))
+        return {"categories":list(self.categories)}
+
+def Write(path,records,types=None):
+    """Writes a catalog. The catalog is written to a temporary folder first and then moved into place.
+    Inputs:
+        path - The folder of the catalog.
+        records - A dataframe indexed by course number, or an iterable of (number, entry) tuples where each entry is a
+            dictionary of column values (such as the output of "Cleaner.CleanStream" or "Cleaner.ReadLines").
+            The records are written one at a time.
+        types - A dictionary connecting each column to its type ("str","json" or "category"). By default the columns
+            and types are taken from the first record: the columns in "Categories" are categories, strings are "str"
+            and everything else is "json".
+    Output:
+        The number of courses written.
+    """
+    records = _Records(records)
+    first = next(records,None)
+    if types is None:
+        entry = first[1] if first is not None else {}
+        types = {column:"category" if column in Categories else "str" if isinstance(value,str) else "json"
+                 for column, value in entry.items()}
+    tmp = path+".tmp-%d"%os.getpid()
+    shutil.rmtree(tmp,ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        writers = {"number":_StrWriter(tmp,"number",str)}
+        for column, kind in types.items():
+            if kind == "category":
+                writers[column] = _CategoryWriter(tmp,column)
+            else:
+                writers[column] = _StrWriter(tmp,column,_Str if kind == "str" else json.dumps)
+        count = 0
+        #Put the first record (read above to find the columns) back in front of the others.
+        records = _Chain(first,records) if first is not None else records
+        for number, entry in records:
+            writers["number"].Add(number)
+            for column in types:
+                writers[column].Add(entry.get(column))
+            count +=1
+        schema = {"version":SCHEMA_VERSION,"rows":count,"columns":{}}
+        for column, writer in writers.items():
+            schema["columns"][column] = dict(writer.Close(),type=types.get(column,"str"))
+        #The schema is written last. Its presence marks the catalog as complete.
+        with open(os.path.join(tmp,"schema.json"),'w') as f:
+            json.dump(schema,f)
+        #Swap the new folder into place.
+        old = path+".old-%d"%os.getpid()
+        if os.path.exists(path):
+            os.replace(path,old)
+        os.replace(tmp,path)
+        shutil.rmtree(old,ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp,ignore_errors=True)
+    print("Saved catalog with",count,"courses to",path)
+    return count
+
+def Exists(path):
+    """Returns True if a complete catalog with the current schema version exists in path."""
+    schema = os.path.join(path,"schema.json")
+    if not os.path.exists(schema):
+        return False
+    with open(schema,'r') as f:
+        return json.load(f).get("version") == SCHEMA_VERSION
+
+class CatalogStore:
+    """Reads a catalog written with "Write". Nothing but the schema is read until a column is asked for.
+    Initialize this class with:
+        path - The folder of the catalog.
+    Attributes:
+        columns - A dictionary connecting each column (other than "number") to its type.
+    """
+    def __init__(self,path):
+        self.path = path
+        with open(os.path.join(path,"schema.json"),'r') as f:
+            self.schema = json.load(f)
+        if self.schema.get("version") != SCHEMA_VERSION:
+            raise ValueError("Catalog %s has schema version %s (expected %d)"%(path,self.schema.get("version"),SCHEMA_VERSION))
+        self.columns = {column:info["type"] for column, info in self.schema["columns"].items() if column != "number"}
+
+    def __len__(self):
+        return self.schema["rows"]
+
+    def Categories(self,column):
+        """Returns the distinct values of a category column (for example every school)."""
+        return self.schema["columns"][column]["categories"]
+
+    def Rows(self,column,values):
+        """Returns the rows whose value of a category column is one of values. Only the codes of that column are read."""
+        values = set(values)
+        wanted = [code for code, value in enumerate(self.Categories(column)) if value in values]
+        codes = np.load(os.path.join(self.path,column+".npy"),mmap_mode='r')
+        return np.flatnonzero(np.isin(codes,wanted))
+
+    def _Strings(self,column,rows):
+        #Decodes the values of a "str" column (only the bytes of the selected rows are read).
+        offsets = np.load(os.path.join(self.path,column+".npy"),mmap_mode='r')
+        dataPath = os.path.join(self.path,column+".bin")
+        data = np.memmap(dataPath,dtype=np.uint8,mode='r') if os.path.getsize(dataPath) > 0 else np.zeros(0,np.uint8)
+        if rows is None:
+            raw = data.tobytes()
+            bounds = np.asarray(offsets).tolist()
+            return [raw[start:end].decode('utf-8') for start, end in zip(bounds[:-1],bounds[1:])]
+        starts = offsets[rows].tolist()
+        ends = offsets[np.asarray(rows)+1].tolist()
+        return [data[start:end].tobytes().decode('utf-8') for start, end in zip(starts,ends)]
+
+    def Column(self,column,rows=None):
+        """Reads one column.
+        Inputs:
+            column - The name of the column ("number" for the course numbers)
+            rows - An array of the rows to read (None for every row)
+        Output:
+            A list of values.
+        """
+        kind = self.schema["columns"][column]["type"]
+        if kind == "category":
+            codes = np.load(os.path.join(self.path,column+".npy"),mmap_mode='r')
+            codes = codes if rows is None else codes[rows]
+            categories = self.Categories(column)
+            return [categories[code] for code in np.asarray(codes).tolist()]
+        values = self._Strings(column,rows)
+        if kind == "json":
+            #One call to the json parser for the whole column is much faster than one call per value.
+            return json.loads("["+",".join(values)+"]")
+        return values
+
+    def Load(self,columns=None,schools=None,schoolColumn="school"):
+        """Reads the catalog into a dataframe indexed by course number.
+        Inputs:
+            columns - The columns to read (defaults to every column).
+            schools - If given, only the courses of these schools are read.
+            schoolColumn - The category column filtered by schools.
+        Output:
+            A dataframe in the same format as the one built from the cleaned json file.
+        """
+        columns = list(self.columns) if columns is None else list(columns)
+        rows = self.Rows(schoolColumn,schools) if schools is not None else None
+        data = {column:self.Column(column,rows) for column in columns}
+        index = self.Column("number",rows)
+        return pd.DataFrame(data,index=pd.Index(index,dtype=object),columns=columns)
+
+def Load(path,columns=None,schools=None):
+    """Reads a catalog into a dataframe (see "CatalogStore.Load")."""
+    return CatalogStore(path).Load(columns,schools)
@@ -1,85 +1,238 @@
-import Setup
-import pickle
-import re
-
-"""
-This file contains the functions used to clean the data from the webcrawler. Such cleaning
-includes moving all strings into lower case and stop word removal.
-"""
-#The regular expressions to remove from the course descriptions
-#Two re's are contained here. The first is a repeated phrase "open only to _ majors"
-#The second is when the prerequisite courses are copied in the description.
-StopPhrases = ["Open Only To .+ Majors",r'\w{2,3,4}\s{1}\d{3}.']
-
-#Words and symbols to remove from the text
-StopWords = [".",";",":","/",' a ',' of ',' the '," prerequisite "," or "," at "," to "," will "," are "," be "]
-
-def CleanDesc(text):
-    """Cleans the description text
-    """
-    #Convert all text to lowercase
-    text = text.lower()
-    #Remove regular expression phrases
-    for StopPhrase in StopPhrases:
-        text = re.sub(StopPhrase,'',text)
-    #Remove stopwords
-    for StopWord in StopWords:
-        text = text.replace(StopWord," ")
-    #Remove long spaces caused by the first two steps.
-    text = text.replace("  "," ")
-    #Return the cleaned text
-    return text
-def CleanName(text):
-    """Cleans the string representing the course name.
-    """
-    #Convert all text to lowercase.
-    text = text.lower()
-    #If a space is the first or last character, remove the space.
-    if text[0] == ' ':
-        text =  text[1:]
-    if text[-1] == ' ':
-        text = text[:-1]
-    #Return cleaned text
-    return text
-def CleanNumber(text):
-    """Cleans the string representing the course number
-    """
-    #Convert all text to lowercase
-    text = text.lower()
-    #Remove the ":"
-    text = text.replace(':','')
-    return text
-
-def Clean(List):
-    """Takes in the list of dictionaries from the webcrawler and applies cleaning functions
-    to each part.  Converts list into a Dictionary which is indexed by the course number.
-    Saves a copy of the dictionary to a json file
-    Inputs: A list of dictionaries containing 'name','number','description','preqName','school'
-    Outputs: A dictionary that can be accessed by Dictionary[number][label]
-    """
-    Dictionary = {}
-    for item in List:
-        description = CleanDesc(item['description'])
-        name = CleanName(item['name'])
-        number = CleanNumber(item['number'])
-        school = item['school']
-        preqName = []
-        for pn in item['preqName']:
-            preqName.append(CleanNumber(pn))
-            
-        #Many of the thesis courses do not contain enough information to predict the prerequisites or school
-            #by description or course title.
-        if "credit on acceptance dissertation" not in description:
-            Dictionary[number] = {'name':name,'description':description,'preqName':preqName,'school':school}
-        
-    #Save dictionary to json file.
-    import json
-    jsonFile = Setup.jsonFile
-    with open(jsonFile, 'w') as outfile:
-        json.dump(Dictionary, outfile)
-    print("Save dictionary as Json")
-    return Dictionary
-
-
-
-
+import Setup
+import pickle
+import re
+import os
+import Profiler
+
+"""
+This file contains the functions used to clean the data from the webcrawler. Such cleaning
+includes moving all strings into lower case and stop word removal.
+"CleanStream" cleans courses one at a time as they are read, and "WriteLines" streams the cleaned courses to a
+line delimited json file, so large catalogs can be cleaned without holding them in memory. The pipeline cleans the
+crawled courses into "Setup.jsonLines" ("CleanToLines", or "CleanChanges" after an incremental re-crawl) and streams
+that file into the columnar catalog ("SaveCatalog").
+"""
+#The regular expressions to remove from the course descriptions
+#Two re's are contained here. The first is a repeated phrase "open only to _ majors"
+#The second is when the prerequisite courses are copied in the description.
+StopPhrases = ["Open Only To .+ Majors",r'\w{2,3,4}\s{1}\d{3}.']
+
+#Words and symbols to remove from the text
+StopWords = [".",";",":","/",' a ',' of ',' the '," prerequisite "," or "," at "," to "," will "," are "," be "]
+
+#The stop phrases are compiled once (rather than looked up in the cache of the re module for every description).
+_StopPhrases = [re.compile(StopPhrase) for StopPhrase in StopPhrases]
+
+def CleanDesc(text):
+    """Cleans the description text
+    """
+    #Convert all text to lowercase
+    text = text.lower()
+    #Remove regular expression phrases
+    for StopPhrase in _StopPhrases:
+        text = StopPhrase.sub('',text)
+    #Remove stopwords. (A chain of str.replace calls runs in C and is faster than one combined expression.)
+    for StopWord in StopWords:
+        text = text.replace(StopWord," ")
+    #Remove long spaces caused by the first two steps.
+    text = text.replace("  "," ")
+    #Return the cleaned text
+    return text
+def CleanName(text):
+    """Cleans the string representing the course name.
+    """
+    #Convert all text to lowercase.
+    text = text.lower()
+    #If a space is the first or last character, remove the space.
+    if text[0] == ' ':
+        text =  text[1:]
+    if text[-1] == ' ':
+        text = text[:-1]
+    #Return cleaned text
+    return text
+def CleanNumber(text):
+    """Cleans the string representing the course number
+    """
+    #Convert all text to lowercase
+    text = text.lower()
+    #Remove the ":"
+    text = text.replace(':','')
+    return text
+
+def CleanRecord(item):
+    """Applies the cleaning functions to one course dictionary from the webcrawler.
+    Inputs: A dictionary containing 'name','number','description','preqName','school'
+    Outputs:
+        number - The cleaned course number
+        entry - A dictionary with the cleaned 'name','description','preqName' and 'school' (or None if the course
+            should be left out of the data set)
+    """
+    description = CleanDesc(item['description'])
+    name = CleanName(item['name'])
+    number = CleanNumber(item['number'])
+    school = item['school']
+    preqName = []
+    for pn in item['preqName']:
+        preqName.append(CleanNumber(pn))
+        
+    #Many of the thesis courses do not contain enough information to predict the prerequisites or school
+        #by description or course title.
+    if "credit on acceptance dissertation" in description:
+        return number,None
+    return number,{'name':name,'description':description,'preqName':preqName,'school':school}
+
+def CleanStream(records):
+    """Cleans the courses of an iterable (for example a list or a generator yielding courses as they are crawled or
+    read) one at a time.
+    Inputs: An iterable of dictionaries containing 'name','number','description','preqName','school'
+    Outputs: A generator of (number, entry) tuples (see "CleanRecord"). Courses which are left out are skipped.
+    """
+    for item in records:
+        number, entry = CleanRecord(item)
+        if entry is not None:
+            Profiler.Count("clean.courses")
+            yield number,entry
+        else:
+            Profiler.Count("clean.skipped")
+
+def WriteLines(pairs,path):
+    """Streams cleaned courses to a line delimited json file (one course per line) written atomically.
+    Inputs:
+        pairs - An iterable of (number, entry) tuples such as the output of "CleanStream"
+        path - The file to write.
+    Outputs: The number of courses written.
+    """
+    import json
+    count = 0
+    with open(path+".tmp",'w') as outfile:
+        for number, entry in pairs:
+            outfile.write(json.dumps(dict(entry,number=number))+"\n")
+            count +=1
+    os.replace(path+".tmp",path)
+    return count
+
+def ReadLines(path):
+    """Reads a line delimited json file written by "WriteLines" one course at a time.
+    Outputs: A generator of (number, entry) tuples. A course number which appears more than once is read once, with the
+        entry of its last line in the position of its first line (the same courses, in the same order, as when the
+        lines are loaded into a dictionary).
+    """
+    import json
+    #The first pass only keeps the offset of the last line of each course number.
+    offsets = {}
+    lines = 0
+    with open(path,'rb') as inFile:
+        offset = 0
+        for line in inFile:
+            if line.strip():
+                offsets[json.loads(line)['number']] = offset
+                lines +=1
+            offset += len(line)
+        if len(offsets) == lines:
+            #No course appears twice, so the file is read again from the start.
+            inFile.seek(0)
+            for line in inFile:
+                if line.strip():
+                    entry = json.loads(line)
+                    yield entry.pop('number'),entry
+            return
+        for offset in offsets.values():
+            inFile.seek(offset)
+            entry = json.loads(inFile.readline())
+            yield entry.pop('number'),entry
+
+@Profiler.Timed("CleanToLines")
+def CleanToLines(records,path=None):
+    """Cleans the courses of an iterable and streams them to a line delimited json file without building the whole
+    dictionary in memory.
+    Inputs:
+        records - An iterable of dictionaries containing 'name','number','description','preqName','school'
+        path - The file to write. Defaults to "Setup.jsonLines"
+    Outputs: The number of courses written.
+    """
+    path = path if path is not None else Setup.jsonLines
+    count = WriteLines(CleanStream(records),path)
+    print("Streamed",count,"cleaned courses to",path)
+    return count
+
+def _Save(Dictionary):
+    #Save dictionary to json file.
+    import json
+    jsonFile = Setup.jsonFile
+    with open(jsonFile, 'w') as outfile:
+        json.dump(Dictionary, outfile)
+    print("Save dictionary as Json")
+
+@Profiler.Timed("Clean")
+def Clean(List):
+    """Takes in the list of dictionaries from the webcrawler and applies cleaning functions
+    to each part.  Converts list into a Dictionary which is indexed by the course number.
+    Saves a copy of the dictionary to a json file
+    Inputs: A list of dictionaries containing 'name','number','description','preqName','school'
+    Outputs: A dictionary that can be accessed by Dictionary[number][label]
+    """
+    Dictionary = dict(CleanStream(List))
+        
+    _Save(Dictionary)
+    return Dictionary
+
+def _CleanedCourses(path):
+    #The cleaned courses of the last run, one at a time. Older runs only saved the cleaned data in "Setup.jsonFile".
+    if os.path.exists(path) or not os.path.exists(Setup.jsonFile):
+        return ReadLines(path)
+    import json
+    with open(Setup.jsonFile,'r') as inFile:
+        return iter(json.load(inFile).items())
+
+@Profiler.Timed("CleanChanges")
+def CleanChanges(changes,path=None):
+    """Applies the changes found by an incremental re-crawl ("USCCrawler2.USCRefresh") to the line delimited json file
+    of cleaned courses. Only the changed courses are cleaned, and the other courses are copied one at a time.
+    Inputs:
+        changes - A dictionary with 'changed' (raw course dictionaries) and 'removed' (raw course numbers)
+        path - The file to update. Defaults to "Setup.jsonLines" (if it does not exist yet, the courses are read from
+            the json file "Setup.jsonFile" saved by older runs).
+    Outputs:
+        cleanChanges - A dictionary with 'changed' (cleaned course numbers which are new or different) and 'removed'
+            (cleaned course numbers which were taken out of the data set)
+    """
+    path = path if path is not None else Setup.jsonLines
+    #The cleaned entry of every changed course (None for a course to take out).
+    updates = {}
+    for item in changes['changed']:
+        number, entry = CleanRecord(item)
+        updates[number] = entry
+    for rawNumber in changes['removed']:
+        updates[CleanNumber(rawNumber)] = None
+    cleanChanges = {'changed':[],'removed':[]}
+
+    def merge(old):
+        #Changed courses keep their place. New courses are added at the end.
+        for number, entry in old:
+            if number in updates:
+                entry = updates.pop(number)
+                if entry is None:
+                    cleanChanges['removed'].append(number)
+                    continue
+                cleanChanges['changed'].append(number)
+            yield number,entry
+        for number, entry in updates.items():
+            if entry is not None:
+                cleanChanges['changed'].append(number)
+                yield number,entry
+
+    count = WriteLines(merge(_CleanedCourses(path)),path)
+    print("Streamed",count,"cleaned courses to",path)
+    return cleanChanges
+
+def SaveCatalog(path=None,linesPath=None):
+    """Streams the cleaned courses into the columnar catalog loaded at startup (see CatalogStore.py).
+    Inputs:
+        path - The catalog folder. Defaults to "Setup.uscCatalog"
+        linesPath - The line delimited json file of cleaned courses. Defaults to "Setup.jsonLines" (or to the json file
+            "Setup.jsonFile" saved by older runs if it does not exist).
+    Outputs: The number of courses written.
+    """
+    import CatalogStore
+    path = path if path is not None else Setup.uscCatalog
+    return CatalogStore.Write(path,_CleanedCourses(linesPath if linesPath is not None else Setup.jsonLines))
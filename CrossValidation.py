@@ -0,0 +1,143 @@
+import os
+import multiprocessing
+import Similarities as Sims
+import Score
+import Glove
+import Profiler
+
+"""
+This file contains the cross validation driver used by Main.py. The folds are trained in parallel and every
+(fold, method, course) scoring unit is then run on a process pool. Each worker process holds one read only copy of
+every fold's models and embeddings (inherited when the pool is forked, or loaded once from the model store
+otherwise), so nothing large is sent to the workers with each task. While profiling, each task also returns the
+profile of the worker (see "Profiler.Collect"), so the report of the main process covers the training and scoring done
+by the workers.
+"""
+#The methods scored in the order they appear in ScoreDict.
+MethodNames = ["Jacard","Lev","WordSim","DocSim","GloveSim"]
+
+#The state of the folds shared by the worker processes. Each entry is (trainSet, testSet).
+_splits = []
+#Each entry is the "Similarities" instance of the fold with the same position in _splits.
+_folds = []
+
+def SplitData(df,trainRatio=.9,seed=None):
+    """Takes a dataframe, shuffles its rows, and splits it randomly into a training dataframe and a testing dataframe.
+    Inputs:
+        df: A pandas dataframe that is to be split.
+        trainRatio: The fraction of data to delegate to the training set
+        seed: The random state used to shuffle the rows (None for a different split every time)
+    Outputs:
+        trainSet: A shuffled dataframe consisting of trainRatio of the rows of the original dataframe.
+        testSet:  A shuffled dataframe consisting of 1-trainRatio of the rows of the original dataframe.
+    """
+    #A shuffled version of the original dataframe.
+    ddf = df.sample(frac=1,random_state=seed)
+    #Define the length of the original frame, the training frame, and the testing frame.
+    length = len(ddf)
+    trainLength = int(trainRatio*length)
+    testLength = length-trainLength
+    #Take the top and bottom portions of the shuffled frame to create two new frames.
+    trainSet = ddf.head(trainLength)
+    testSet = ddf.tail(testLength)
+
+    return trainSet,testSet
+
+def _InitWorker(splits,load,profile):
+    """Runs once in each worker process. Stores the splits and (if load is True) the "Similarities" instance of every
+    fold. Forked workers inherit these from the parent and skip the work. If profile is True, the worker is profiled
+    (the timings a forked worker inherits from the parent are dropped so that they are not counted twice)."""
+    global _splits, _folds
+    if profile:
+        Profiler.Enable()
+        Profiler.Reset()
+    if len(_splits) == 0:
+        _splits = splits
+    if load and len(_folds) == 0:
+        #The models were saved to the model store when the folds were trained, so this only loads from disk.
+        _folds = [Sims.Similarities(trainSet,"All") for trainSet, _ in _splits]
+
+def _Profile():
+    #The profile of the task that just finished in a worker (None if profiling is off).
+    return Profiler.Collect() if Profiler.enabled else None
+
+def _TrainFold(fold):
+    #Trains the models of one fold. The "Similarities" class saves them to the model store. Returns (fold, profile).
+    Sims.Similarities(_splits[fold][0],"All")
+    return fold,_Profile()
+
+def _ScoreUnit(unit):
+    #Scores one test course with one method in one fold. Returns (fold, methodName, course, school score, preq score,
+        #profile).
+    fold, methodName, course = unit
+    trainSet, testSet = _splits[fold]
+    S = _folds[fold]
+    #The same span as in "Score.ScoreMethod", so the reports of the two drivers can be compared.
+    with Profiler.Span("SimScore",methodName):
+        Vec = Score.SimScore(trainSet,testSet,course,getattr(S,methodName),k=10)
+    metS = Score.SchoolMetric(trainSet,testSet,course,Vec)
+    metP = Score.PreqMetric(trainSet,testSet,course,Vec)
+    return fold,methodName,course,metS,metP,_Profile()
+
+def _Pool(workers,splits,load):
+    #Forked workers inherit the parent's memory (no copies are sent). Other platforms load the folds once per worker.
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    return context.Pool(workers,initializer=_InitWorker,initargs=(splits,load,Profiler.enabled))
+
+def CrossValidate(df,iterations=10,numberTest=50,workers=None,trainRatio=.9,seed=None,keep=False):
+    """Runs the cross validation of all 5 methods in parallel.
+    Inputs:
+        df - The dataframe of all courses.
+        iterations - The number of folds (random train/test splits).
+        numberTest - The number of test courses scored in each fold.
+        workers - The number of worker processes. Defaults to the number of cores.
+        trainRatio - The fraction of courses used for training in each fold.
+        seed - The random state of the first fold (fold i uses seed+i), so a run can be repeated exactly. If None,
+            every run draws new random splits.
+        keep - If False, the models of the folds are deleted from the model store at the end of the run. (Each split
+            has its own fingerprints, so they would pile up with every run. Keep them to repeat a seeded run quickly.)
+    Output:
+        ScoreDict - A nested dictionary in the same form as "Score.ScoreMethod" builds: ScoreDict[method]["School"]
+            and ScoreDict[method]["Preq"] hold the average of each metric over all folds and test courses.
+    """
+    global _splits, _folds
+    workers = workers if workers is not None else os.cpu_count()
+    _splits = [SplitData(df,trainRatio,seed+i if seed is not None else None) for i in range(iterations)]
+    _folds = []
+    #Convert (or download) the GloVe vectors once here, so the workers training the folds only open the file. (If this
+        #fails, each fold reports that the GloVe model could not be loaded and GloveSim is skipped.)
+    try:
+        Glove.Load()
+    except Exception:
+        pass
+    #Train every fold. (The models are saved to the model store, which is how the parent and the workers share them.)
+    with _Pool(min(workers,iterations),_splits,False) as pool:
+        for fold, profile in pool.imap_unordered(_TrainFold,range(iterations)):
+            Profiler.Merge(profile)
+            print("Trained fold",fold+1)
+    #Load the trained folds (from the model store) before the scoring pool is forked.
+    _folds = [Sims.Similarities(trainSet,"All") for trainSet, _ in _splits]
+    units = []
+    for fold, (trainSet, testSet) in enumerate(_splits):
+        for methodName in MethodNames:
+            if methodName == "GloveSim" and _folds[fold].GloveFail:
+                continue
+            for course in testSet.head(numberTest).index:
+                units.append((fold,methodName,course))
+    with _Pool(workers,_splits,True) as pool:
+        results = pool.map(_ScoreUnit,units,chunksize=max(1,len(units)//(4*workers)))
+    #Merge the results in the order of "units" so that the sums do not depend on which worker finished first.
+    ScoreDict = {methodName:{"School":0,"Preq":0} for methodName in MethodNames}
+    for fold, methodName, course, metS, metP, profile in results:
+        Profiler.Merge(profile)
+        ScoreDict[methodName]["School"] += (metS/(iterations*numberTest))
+        ScoreDict[methodName]["Preq"] += (metP/(iterations*numberTest))
+    if not keep:
+        for S in _folds:
+            if S.store is not None:
+                #(Every artifact saved or loaded by the fold has had its fingerprint calculated.)
+                for fingerprint in list(S.fingerprints.values()):
+                    S.store.Remove(fingerprint)
+    print("Finished Cross Validation")
+    return ScoreDict
@@ -0,0 +1,115 @@
+import os
+import zlib
+import threading
+import multiprocessing
+import numpy as np
+import Profiler
+
+"""
+This file contains the batch doc2vec inference used to embed many descriptions at once. Descriptions are split into
+chunks which are inferred on a pool of forked worker processes (each inherits the trained model rather than receiving
+a copy). Every description is inferred with its own fixed seed, so the result does not depend on the number of
+workers or on which worker handled it.
+"""
+
+#The model shared with the forked workers.
+_model = None
+_settings = None
+
+def StableHash(text):
+    """A hash of a string which is the same in every process (python's own hash of a string is not)."""
+    return zlib.crc32(text.encode('utf-8'))
+
+class _SeededModel:
+    #A view of a trained model with its own random state. The gensim training routines read the random state from the
+        #model they are given, so inferring through a view leaves the shared model untouched and several threads (such
+        #as the server's request threads) can infer at once.
+    def __init__(self,model,random):
+        self._model = model
+        self.random = random
+
+    def __getattr__(self,name):
+        return getattr(self._model,name)
+
+def StartVector(text,size,seed=1):
+    """The starting vector of the inference of a description. It is drawn the way gensim draws it ("seeded_vector"),
+    but seeded with "StableHash" rather than python's hash so it is the same in every process."""
+    once = np.random.RandomState((StableHash(text)+seed) & 0xffffffff)
+    return ((once.rand(size)-0.5)/size).astype(np.float32)
+
+def InferVector(model,words,alpha=0.1,min_alpha=0.0001,steps=300,seed=1):
+    """Infers the doc2vec vector of one description with a fixed seed. This runs the same steps as gensim's
+    "infer_vector", but the starting vector and the random state are seeded from the words, so the same description
+    gives the same vector in every process (gensim seeds the starting vector with python's hash, which changes with
+    PYTHONHASHSEED).
+    Inputs:
+        model - A trained gensim Doc2Vec model.
+        words - The description as a list of words.
+        alpha, min_alpha, steps - The learning rate at the first and last step and the number of steps.
+        seed - Combined with the words to seed the starting vector and the random state of the inference.
+    Output:
+        The document vector.
+    """
+    from gensim.models import doc2vec
+    text = ' '.join(words)
+    view = _SeededModel(model,np.random.RandomState((StableHash(text)+seed+1) & 0xffffffff))
+    vectors = StartVector(text,model.vector_size,seed).reshape(1,-1)
+    locks = np.ones(1,dtype=np.float32)
+    work = np.zeros(model.trainables.layer1_size,dtype=np.float32)
+    neu1 = np.zeros(model.trainables.layer1_size,dtype=np.float32)
+    delta = (alpha-min_alpha)/max(steps-1,1)
+    for _ in range(steps):
+        if model.sg:
+            doc2vec.train_document_dbow(view,words,[0],alpha,work,learn_words=False,learn_hidden=False,
+                                        doctag_vectors=vectors,doctag_locks=locks)
+        elif model.dm_concat:
+            doc2vec.train_document_dm_concat(view,words,[0],alpha,work,neu1,learn_words=False,learn_hidden=False,
+                                             doctag_vectors=vectors,doctag_locks=locks)
+        else:
+            doc2vec.train_document_dm(view,words,[0],alpha,work,neu1,learn_words=False,learn_hidden=False,
+                                      doctag_vectors=vectors,doctag_locks=locks)
+        alpha -= delta
+    return vectors[0]
+
+def _CanFork():
+    #A pool can only be forked from the main thread of a process that is not itself a pool worker. (Daemonic worker
+        #processes, such as the cross validation workers, may not have children, and forking from one of the
+        #server's request threads would copy the locks held by the other threads.)
+    return ("fork" in multiprocessing.get_all_start_methods() and not multiprocessing.current_process().daemon
+            and threading.current_thread() is threading.main_thread())
+
+def _InferChunk(part):
+    start, texts = part
+    return start,np.array([InferVector(_model,words,**_settings) for words in texts])
+
+@Profiler.Timed("Doc2Vec.infer")
+def InferVectors(model,texts,workers=None,chunk=64,**settings):
+    """Infers the doc2vec vectors of many descriptions.
+    Inputs:
+        model - A trained gensim Doc2Vec model.
+        texts - A list of descriptions, each a list of words.
+        workers - The number of worker processes (defaults to the number of cores). Small batches, platforms that
+            can not fork, and calls from a worker process or from a thread other than the main thread are inferred in
+            this process.
+        chunk - The number of descriptions sent to a worker at a time.
+        settings - The inference settings (alpha, min_alpha, steps, seed) passed to "InferVector"
+    Output:
+        An (N x vector_size) matrix of document vectors in the order of texts.
+    """
+    global _model, _settings
+    Profiler.Count("embed.Doc.documents",len(texts))
+    workers = workers if workers is not None else os.cpu_count()
+    out = np.zeros((len(texts),model.vector_size))
+    if workers <= 1 or len(texts) <= chunk or not _CanFork():
+        for row, words in enumerate(texts):
+            out[row] = InferVector(model,words,**settings)
+        return out
+    _model, _settings = model, settings
+    try:
+        chunks = [(start,texts[start:start+chunk]) for start in range(0,len(texts),chunk)]
+        with multiprocessing.get_context("fork").Pool(workers) as pool:
+            for start, vectors in pool.imap_unordered(_InferChunk,chunks):
+                out[start:start+len(vectors)] = vectors
+    finally:
+        _model, _settings = None, None
+    return out
@@ -0,0 +1,125 @@
+import numpy as np
+
+"""
+This file contains the compact storage of the reference embeddings used by the "WordSim", "DocSim" and "GloveSim"
+methods. Every row is scaled to unit length once when it is stored, so the cosine similarity of a (normalized) query is
+a plain dot product. The rows are kept in one contiguous matrix (row i belongs to row i of the training set catalog) in
+one of three precisions:
+    float32 - 4 bytes per value. Scores match float64 to about 1e-6.
+    float16 - 2 bytes per value. Each score is within 2**-11 (about 5e-4) of the float32 score.
+    int8 - 1 byte per value plus one float32 scale per row. Each score is within "ErrorBound()" of the float32 score
+        (a worst case of about 0.02, while the typical error is about 0.002).
+"""
+Precisions = ("float32","float16","int8")
+
+def Normalize(vectors):
+    """Scales a vector (or every row of a matrix, along the last axis) to unit length as float32. Rows of length 0
+    (or containing NaN, such as a description with no words in the vocabulary) become zero rows, which score 0."""
+    vectors = np.asarray(vectors,dtype=np.float32)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        out = vectors/np.linalg.norm(vectors,axis=-1,keepdims=True)
+    #(np.where rather than the nan/posinf/neginf keywords of np.nan_to_num, which need NumPy 1.17.)
+    return np.ascontiguousarray(np.where(np.isfinite(out),out,np.float32(0)))
+
+class EmbeddingMatrix:
+    """The normalized reference embeddings of one method.
+    Initialize this class with:
+        vectors - An (N x dim) matrix, or (N x parts x dim) for the GloVe encoding (each of its 4 parts is normalized
+            and compared separately).
+        precision - "float32", "float16" or "int8"
+    """
+    def __init__(self,vectors,precision="float32"):
+        if precision not in Precisions:
+            raise ValueError("precision must be one of %s"%", ".join(Precisions))
+        unit = Normalize(vectors)
+        self.precision = precision
+        self.scale = None
+        if precision == "int8":
+            #Each row (each part of a row) is stored as integers between -127 and 127 times one scale.
+            #(Zero rows keep a scale of 0.)
+            scale = np.abs(unit).max(axis=-1)/127
+            steps = np.divide(unit,scale[...,None],out=np.zeros_like(unit),where=scale[...,None] > 0)
+            self.data = np.rint(steps).astype(np.int8)
+            self.scale = scale.astype(np.float32)
+        elif precision == "float16":
+            self.data = unit.astype(np.float16)
+        else:
+            self.data = unit
+
+    @classmethod
+    def _Wrap(cls,data,scale,precision):
+        #Builds an instance around stored rows without converting them again.
+        matrix = cls.__new__(cls)
+        matrix.data = np.ascontiguousarray(data)
+        matrix.scale = scale
+        matrix.precision = precision
+        return matrix
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def nbytes(self):
+        """The memory used by the stored rows."""
+        return self.data.nbytes+(self.scale.nbytes if self.scale is not None else 0)
+
+    def Rows(self,start=0,end=None):
+        """Returns rows start to end as float32 unit vectors (a view of the stored rows for float32)."""
+        data = self.data[start:end]
+        if self.precision == "float32":
+            return data
+        if self.precision == "float16":
+            return data.astype(np.float32)
+        return data.astype(np.float32)*self.scale[start:end][...,None]
+
+    def Row(self,row):
+        """Returns one row as a float32 unit vector (or a (parts x dim) matrix)."""
+        return self.Rows(row,row+1)[0]
+
+    def Scores(self,queries,start=0,end=None,blockRows=8192):
+        """Calculates the cosine similarity of a batch of normalized queries (see "Normalize") with rows start to end.
+        For the GloVe encoding the similarities of the parts are averaged (as in "GloveSim").
+        Inputs:
+            queries - A (queries x dim) or (queries x parts x dim) float32 matrix.
+            start, end - The rows compared.
+            blockRows - The number of stored rows converted to float32 at a time (for float16 and int8).
+        Output:
+            A (queries x rows) float32 matrix of similarities.
+        """
+        end = len(self) if end is None else min(end,len(self))
+        out = np.empty((len(queries),max(end-start,0)),dtype=np.float32)
+        step = blockRows if self.precision != "float32" else max(end-start,1)
+        for first in range(start,end,step):
+            last = min(end,first+step)
+            R = self.Rows(first,last)
+            if R.ndim == 2:
+                out[:,first-start:last-start] = queries.dot(R.T)
+            else:
+                out[:,first-start:last-start] = np.einsum('qpd,npd->qn',queries,R)/R.shape[1]
+        return out
+
+    def Select(self,rows):
+        """Returns a new matrix holding only the given rows (an index array or a boolean mask)."""
+        return self._Wrap(self.data[rows],self.scale[rows] if self.scale is not None else None,self.precision)
+
+    def Append(self,other):
+        """Returns a new matrix with the rows of another matrix (of the same precision) added at the end."""
+        scale = np.concatenate([self.scale,other.scale]) if self.scale is not None else None
+        return self._Wrap(np.concatenate([self.data,other.data]),scale,self.precision)
+
+    def ErrorBound(self):
+        """Returns the largest difference between a score calculated from the stored rows and the exact score of the
+        same normalized vectors (rounding in the float32 arithmetic aside)."""
+        if self.precision == "float32" or len(self) == 0:
+            return 0.0
+        dim = self.data.shape[-1]
+        if self.precision == "float16":
+            #Each value is rounded to 11 significant bits and the vectors have unit length.
+            return 2.0**-11
+        #Each value is off by at most half a step. For a unit query, the score is off by at most the length of the
+            #error vector.
+        return float(self.scale.max())/2*np.sqrt(dim)
@@ -0,0 +1,122 @@
+import os
+import numpy as np
+import Setup
+import Profiler
+
+"""
+This file contains the storage for the pretrained GloVe word vectors used by the "GloveSim" method. The vectors are
+kept as a raw float32 .npy matrix (opened with a memory map, so several processes share one copy of the file in the
+page cache) and a text file listing the word of each row.
+"""
+
+class GloveVectors:
+    """A read only set of word vectors backed by a memory mapped .npy file. Supports the parts of gensim's
+    KeyedVectors interface used in this project ("vocab", "get_vector" and "in").
+    Initialize this class with:
+        vectorsPath - The .npy file containing one word vector per row.
+        vocabPath - A text file containing the word for each row (one word per line).
+    """
+    def __init__(self,vectorsPath,vocabPath):
+        #Opening the matrix with a memory map does not read it. Rows are paged in as they are used.
+        self.vectors = np.load(vectorsPath,mmap_mode='r')
+        with open(vocabPath,'r',encoding='utf-8') as f:
+            words = f.read().split('\n')
+        #A dictionary connecting each word to its row in the matrix.
+        self.vocab = {word:i for i, word in enumerate(words[:len(self.vectors)])}
+        self.vector_size = self.vectors.shape[1]
+
+    def __contains__(self,word):
+        return word in self.vocab
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def get_vector(self,word):
+        """Returns the word vector for word (raises a KeyError if the word is not in the vocabulary)."""
+        return self.vectors[self.vocab[word]]
+
+def Save(vectors,words,vectorsPath=None,vocabPath=None):
+    """Saves word vectors in the format read by "GloveVectors".
+    Inputs:
+        vectors - A matrix containing one word vector per row.
+        words - A list of the word for each row.
+        vectorsPath, vocabPath - The files to write. Default to the paths in "Setup"
+    """
+    vectorsPath = vectorsPath if vectorsPath is not None else Setup.gloveVectors
+    vocabPath = vocabPath if vocabPath is not None else Setup.gloveVocab
+    #Write to temporary files first so that a partly written file is never opened. The temporary names include the
+        #process id so that processes converting the vectors at the same time do not write to the same files.
+    tmp = ".tmp-%d"%os.getpid()
+    np.save(vectorsPath+tmp+".npy",np.ascontiguousarray(vectors,dtype=np.float32))
+    with open(vocabPath+tmp,'w',encoding='utf-8') as f:
+        f.write('\n'.join(words))
+    os.replace(vocabPath+tmp,vocabPath)
+    os.replace(vectorsPath+tmp+".npy",vectorsPath)
+
+def _SaveKeyedVectors(keyedVectors):
+    #Works for gensim 3 (index2word) and gensim 4 (index_to_key).
+    words = getattr(keyedVectors,'index2word',None)
+    if words is None:
+        words = keyedVectors.index_to_key
+    Save(keyedVectors.vectors,words)
+
+@Profiler.Timed("GloVe.load")
+def Load():
+    """Opens the GloVe vectors. If only the old pickle file ("Setup.gloveJar") exists, it is converted once. If neither
+    exists, the vectors are downloaded with gensim's downloader api.
+    Output:
+        A GloveVectors instance.
+    """
+    if not os.path.exists(Setup.gloveVectors):
+        if os.path.exists(Setup.gloveJar):
+            import pickle
+            print("Converting GloVe pickle file to .npy")
+            with open(Setup.gloveJar,'rb') as f:
+                _SaveKeyedVectors(pickle.load(f))
+        else:
+            print("Downloading GloVe word embeddings with gensim...")
+            import gensim.downloader as api
+            _SaveKeyedVectors(api.load("glove-wiki-gigaword-100"))
+            print("word vectors saved to .npy file")
+    return GloveVectors(Setup.gloveVectors,Setup.gloveVocab)
+
+def DocumentMatrices(glove,descriptions):
+    """Builds the "GloveSim" matrix encoding for a batch of course descriptions. Each description is split into words,
+    the words are mapped to rows of the GloVe matrix in one pass and the four statistics are calculated for every
+    description at once with segmented NumPy reductions.
+    Inputs:
+        glove - A GloveVectors instance (or any object with "vocab" and "vectors")
+        descriptions - A list of description strings.
+    Output:
+        A contiguous (N x 4 x dim) array. For each description the 4 rows are the mean, the mean + 1 standard deviation,
+        the maximum and the minimum of the word vectors. Descriptions with no words in the GloVe vocabulary are all NaN.
+    """
+    vocab = glove.vocab
+    #Map every word of every description to its row in the GloVe matrix (words which are not in the vocabulary are dropped).
+    rows = [[vocab[word] for word in description.split() if word in vocab] for description in descriptions]
+    counts = np.array([len(r) for r in rows],dtype=np.int64)
+    if Profiler.enabled:
+        tokens = sum(len(description.split()) for description in descriptions)
+        Profiler.Count("embed.Glove.documents",len(descriptions))
+        Profiler.Count("embed.Glove.tokens",tokens)
+        Profiler.Count("embed.Glove.oov",tokens-int(counts.sum()))
+    flat = np.fromiter((row for r in rows for row in r),dtype=np.int64,count=int(counts.sum()))
+    dim = glove.vectors.shape[1]
+    out = np.full((len(rows),4,dim),np.nan)
+    nonEmpty = counts > 0
+    if not nonEmpty.any():
+        return out
+    #Gather the word vectors for all descriptions into one array. Consecutive segments belong to one description.
+    vectors = np.asarray(glove.vectors[flat],dtype=np.float64)
+    #Start of each (non empty) description's segment.
+    starts = (np.cumsum(counts)-counts)[nonEmpty]
+    n = counts[nonEmpty][:,None]
+    mean = np.add.reduceat(vectors,starts,axis=0)/n
+    #Population standard deviation (as np.std) from the mean of the squares.
+    var = np.add.reduceat(vectors*vectors,starts,axis=0)/n-mean*mean
+    sd = np.sqrt(np.maximum(var,0))
+    out[nonEmpty,0] = mean
+    out[nonEmpty,1] = mean+sd
+    out[nonEmpty,2] = np.maximum.reduceat(vectors,starts,axis=0)
+    out[nonEmpty,3] = np.minimum.reduceat(vectors,starts,axis=0)
+    return out
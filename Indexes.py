@@ -0,0 +1,375 @@
+import numpy as np
+import zlib
+import heapq
+from collections import Counter
+
+"""
+This file contains search indexes over the training set which let the "Similarities" class find the most similar
+courses for a test course without comparing the test course to every course in the training set.
+    JacardIndex - An inverted index over the words of the course descriptions (exact Jacard similarity)
+    MinHashLSH - MinHash signatures with LSH banding (approximate Jacard similarity for large catalogs)
+    LevIndex - Length and q-gram bounds over the course names (exact top k for the Lev method)
+"""
+
+def TopRows(rows,scores,k):
+    """Sorts candidate rows from the highest score to the lowest (ties are broken by the lower row number, as a stable
+    sort of the full score array would) and keeps the first k.
+    Inputs:
+        rows - An array of row numbers
+        scores - An array of the score of each row
+        k - The number of rows to keep (None keeps every row)
+    Outputs:
+        rows, scores - The sorted (and truncated) arrays.
+    """
+    order = np.lexsort((rows,-scores))
+    if k is not None:
+        order = order[:k]
+    return rows[order],scores[order]
+
+class JacardIndex:
+    """An inverted index from each word to the descriptions that contain it. The Jacard similarity of a query is
+    calculated by counting the intersection over the postings of the query's own words. The size of each union is
+    found from the precomputed number of unique words in each description.
+    Initialize this class with:
+        descriptions - A list of the description strings of the training set (row i of the index is description i).
+    """
+    def __init__(self,descriptions):
+        #A dictionary connecting each word to a word id.
+        self.vocab = {}
+        docRows = []
+        wordIds = []
+        sizes = []
+        for row, description in enumerate(descriptions):
+            words = set(description.split())
+            sizes.append(len(words))
+            for word in words:
+                wordIds.append(self.vocab.setdefault(word,len(self.vocab)))
+                docRows.append(row)
+        wordIds = np.array(wordIds,dtype=np.int64)
+        docRows = np.array(docRows,dtype=np.int64)
+        #The number of unique words in each description.
+        self.sizes = np.array(sizes,dtype=np.int64)
+        self.size = len(self.sizes)
+        #The postings are stored as one array sorted by word id. The postings of word w are
+            #postings[offsets[w]:offsets[w+1]]
+        order = np.argsort(wordIds,kind='stable')
+        self.postings = docRows[order]
+        self.offsets = np.zeros(len(self.vocab)+1,dtype=np.int64)
+        np.cumsum(np.bincount(wordIds,minlength=len(self.vocab)),out=self.offsets[1:])
+
+    def Update(self,keep,descriptions):
+        """Removes rows from the index and appends new descriptions without reading the kept descriptions again.
+        Inputs:
+            keep - A boolean array over the current rows, True for each row that is kept. Kept rows stay in order.
+            descriptions - The descriptions appended after the kept rows.
+        """
+        keep = np.asarray(keep,dtype=bool)
+        #The new row of each kept row.
+        moved = np.cumsum(keep)-1
+        wordIds = np.repeat(np.arange(len(self.offsets)-1),np.diff(self.offsets))
+        kept = keep[self.postings]
+        wordIds = [wordIds[kept]]
+        docRows = [moved[self.postings[kept]]]
+        sizes = [self.sizes[keep]]
+        start = int(np.sum(keep))
+        for row, description in enumerate(descriptions,start):
+            words = set(description.split())
+            sizes.append([len(words)])
+            wordIds.append(np.array([self.vocab.setdefault(word,len(self.vocab)) for word in words],dtype=np.int64))
+            docRows.append(np.full(len(words),row,dtype=np.int64))
+        wordIds = np.concatenate(wordIds)
+        docRows = np.concatenate(docRows)
+        self.sizes = np.concatenate(sizes).astype(np.int64)
+        self.size = len(self.sizes)
+        #(A stable sort keeps the postings of each word in row order, since the new rows come last.)
+        order = np.argsort(wordIds,kind='stable')
+        self.postings = docRows[order]
+        self.offsets = np.zeros(len(self.vocab)+1,dtype=np.int64)
+        np.cumsum(np.bincount(wordIds,minlength=len(self.vocab)),out=self.offsets[1:])
+
+    def Query(self,description):
+        """Calculates the Jacard similarity between a description and every description in the index that shares
+        at least one word with it.
+        Input:
+            description - A description string
+        Outputs:
+            rows - The rows of the descriptions sharing at least one word (sorted by row)
+            scores - The Jacard similarity of each of these rows.
+        """
+        words = set(description.split())
+        ids = [self.vocab[word] for word in words if word in self.vocab]
+        if len(ids) == 0:
+            return np.zeros(0,dtype=np.int64),np.zeros(0)
+        #Concatenate the postings of the query's words. A row appears once for every word it shares with the query.
+        touched = np.concatenate([self.postings[self.offsets[i]:self.offsets[i+1]] for i in ids])
+        rows, intersection = np.unique(touched,return_counts=True)
+        union = self.sizes[rows]+len(words)-intersection
+        return rows,intersection/union
+
+    def Scores(self,description):
+        """Returns an array containing the Jacard similarity between a description and every row of the index."""
+        scores = np.zeros(self.size)
+        rows, sims = self.Query(description)
+        scores[rows] = sims
+        return scores
+
+    def TopK(self,description,k):
+        """Returns the k rows with the highest Jacard similarity to a description (as the arrays rows, scores).
+        Only descriptions sharing a word with the query are returned, so fewer than k rows may be found."""
+        rows, scores = self.Query(description)
+        return TopRows(rows,scores,k)
+
+    def TopKBatch(self,descriptions,k):
+        """Runs "TopK" for a list of descriptions. Returns a list of (rows, scores) tuples."""
+        return [self.TopK(description,k) for description in descriptions]
+
+class MinHashLSH:
+    """MinHash signatures of the description word sets, split into bands for locality sensitive hashing (LSH).
+    Two descriptions land in the same bucket of a band if their signatures agree on every value of that band, which
+    happens with a probability that rises steeply with their Jacard similarity. A query only looks at the descriptions
+    sharing a bucket with it and then re-ranks these candidates with the exact Jacard similarity.
+    Initialize this class with:
+        descriptions - A list of the description strings of the training set (row i of the index is description i).
+        numPerm - The number of hash functions in each signature.
+        bands - The number of bands the signature is split into. More bands (with fewer values each) find more
+            candidates (higher recall, slower queries). Fewer bands find fewer candidates. See "Threshold".
+        seed - The seed used to draw the hash functions.
+    """
+    #A Mersenne prime larger than any 32 bit word hash. Hash function i is (a[i]*h+b[i]) mod prime.
+    prime = np.uint64((1<<61)-1)
+    maxHash = np.uint64((1<<32)-1)
+
+    def __init__(self,descriptions,numPerm=128,bands=32,seed=1):
+        if numPerm % bands != 0:
+            raise ValueError("numPerm must be a multiple of bands")
+        self.numPerm = numPerm
+        self.bands = bands
+        self.rows = numPerm//bands
+        gen = np.random.RandomState(seed)
+        self.a = gen.randint(1,(1<<61)-1,size=numPerm,dtype=np.uint64)
+        self.b = gen.randint(0,(1<<61)-1,size=numPerm,dtype=np.uint64)
+        #The exact word sets are kept to re-rank candidates.
+        self.wordSets = [frozenset(description.split()) for description in descriptions]
+        self.signatures = self.Signatures(self.wordSets)
+        self._BuildBuckets()
+
+    def _BuildBuckets(self):
+        #One dictionary per band connecting the band's values to the rows in that bucket.
+        self.buckets = [{} for _ in range(self.bands)]
+        for row, signature in enumerate(self.signatures):
+            for band, key in enumerate(self._BandKeys(signature)):
+                self.buckets[band].setdefault(key,[]).append(row)
+
+    def Update(self,keep,descriptions):
+        """Removes rows from the index and appends new descriptions without hashing the kept rows again.
+        Inputs:
+            keep - A boolean array over the current rows, True for each row that is kept. Kept rows stay in order.
+            descriptions - The descriptions appended after the kept rows.
+        """
+        wordSets = [frozenset(description.split()) for description in descriptions]
+        self.wordSets = [words for words, kept in zip(self.wordSets,keep) if kept]+wordSets
+        self.signatures = np.concatenate([self.signatures[keep],self.Signatures(wordSets)])
+        self._BuildBuckets()
+
+    @staticmethod
+    def _Hash(word):
+        #crc32 is used (rather than python's hash) so that signatures are the same in every process.
+        return zlib.crc32(word.encode('utf-8'))
+
+    def Signatures(self,wordSets,chunk=2048):
+        """Calculates the MinHash signature of each word set.
+        Inputs:
+            wordSets - A list of sets of words.
+            chunk - The number of sets hashed at once (bounds the memory used).
+        Output:
+            An (N x numPerm) uint64 array. Empty sets have a signature of all "maxHash".
+        """
+        out = np.full((len(wordSets),self.numPerm),self.maxHash,dtype=np.uint64)
+        for start in range(0,len(wordSets),chunk):
+            part = wordSets[start:start+chunk]
+            counts = np.array([len(words) for words in part],dtype=np.int64)
+            nonEmpty = counts > 0
+            if not nonEmpty.any():
+                continue
+            hashes = np.fromiter((self._Hash(word) for words in part for word in words),dtype=np.uint64,
+                                 count=int(counts.sum()))
+            #Every hash function applied to every word. (The multiplication wraps around in uint64, which keeps
+                #the functions random enough for MinHash.)
+            values = ((hashes[:,None]*self.a+self.b) % self.prime) & self.maxHash
+            starts = (np.cumsum(counts)-counts)[nonEmpty]
+            out[start+np.flatnonzero(nonEmpty)] = np.minimum.reduceat(values,starts,axis=0)
+        return out
+
+    def _BandKeys(self,signature):
+        return [signature[band*self.rows:(band+1)*self.rows].tobytes() for band in range(self.bands)]
+
+    def Threshold(self):
+        """The approximate Jacard similarity at which a pair has a 50% chance of becoming a candidate."""
+        return (1/self.bands)**(1/self.rows)
+
+    def Candidates(self,description):
+        """Returns an array of the rows sharing at least one bucket with a description."""
+        signature = self.Signatures([frozenset(description.split())])[0]
+        found = set()
+        for band, key in enumerate(self._BandKeys(signature)):
+            found.update(self.buckets[band].get(key,()))
+        return np.array(sorted(found),dtype=np.int64)
+
+    def _Exact(self,words,rows):
+        scores = np.zeros(len(rows))
+        for i, row in enumerate(rows):
+            union = len(words|self.wordSets[row])
+            if union > 0:
+                scores[i] = len(words&self.wordSets[row])/union
+        return scores
+
+    def TopK(self,description,k):
+        """Returns the k candidate rows with the highest (exact) Jacard similarity to a description as the arrays
+        rows, scores. Only candidates found through the LSH buckets are returned, so fewer than k rows may be found."""
+        rows = self.Candidates(description)
+        scores = self._Exact(frozenset(description.split()),rows)
+        return TopRows(rows,scores,k)
+
+    def TopKBatch(self,descriptions,k):
+        """Runs "TopK" for a list of descriptions. Returns a list of (rows, scores) tuples."""
+        return [self.TopK(description,k) for description in descriptions]
+
+    def Pairs(self,minScore=0.8):
+        """Finds near-duplicate descriptions (such as cross-listed courses) in the index.
+        Input:
+            minScore - The minimum exact Jacard similarity of a returned pair.
+        Output:
+            A list of (rowA, rowB, score) tuples with rowA < rowB, sorted from most to least similar.
+        """
+        seen = set()
+        pairs = []
+        for band in self.buckets:
+            for rows in band.values():
+                for i in range(len(rows)):
+                    for j in range(i+1,len(rows)):
+                        pair = (rows[i],rows[j])
+                        if pair in seen:
+                            continue
+                        seen.add(pair)
+                        score = self._Exact(self.wordSets[pair[0]],[pair[1]])[0]
+                        if score >= minScore:
+                            pairs.append((pair[0],pair[1],score))
+        pairs.sort(key=lambda p: (-p[2],p[0],p[1]))
+        return pairs
+
+def _BoundedDistance(a,b,maxDistance):
+    """The Levenshtein distance between a and b. Newer versions of the Levenshtein package stop early once the distance
+    is known to be larger than maxDistance (and return maxDistance+1). Older versions always calculate the full distance."""
+    import Levenshtein as LV
+    try:
+        return LV.distance(a,b,score_cutoff=maxDistance)
+    except TypeError:
+        return LV.distance(a,b)
+
+class LevIndex:
+    """Finds the course names with the highest Lev score (1 - distance/length of the longer name) without calculating
+    the distance to every name. An upper bound on the score of every name is found from two lower bounds on the
+    distance: the difference in length, and the number of q-grams (substrings of length q) of the longer q-gram bag
+    that are not shared (each edit changes at most q q-grams). Names are visited from the highest bound to the lowest,
+    and the search stops once no remaining name can beat the current top k.
+    Initialize this class with:
+        names - A list of the course names of the training set (row i of the index is name i).
+        q - The length of the q-grams used by the q-gram bound.
+    """
+    def __init__(self,names,q=2):
+        self.names = list(names)
+        self.q = q
+        self.lengths = np.array([len(name) for name in self.names],dtype=np.int64)
+        self.gramCounts = np.maximum(self.lengths-q+1,0)
+        #Postings from each q-gram to the rows containing it and the number of times it appears in each row.
+        postings = {}
+        for row, name in enumerate(self.names):
+            for gram, count in self._Grams(name).items():
+                postings.setdefault(gram,([],[]))
+                postings[gram][0].append(row)
+                postings[gram][1].append(count)
+        self.postings = {gram:(np.array(rows,dtype=np.int64),np.array(counts,dtype=np.int64))
+                         for gram, (rows,counts) in postings.items()}
+
+    def Update(self,keep,names):
+        """Removes rows from the index and appends new names without splitting the kept names into q-grams again.
+        Inputs:
+            keep - A boolean array over the current rows, True for each row that is kept. Kept rows stay in order.
+            names - The names appended after the kept rows.
+        """
+        keep = np.asarray(keep,dtype=bool)
+        moved = np.cumsum(keep)-1
+        start = int(np.sum(keep))
+        self.names = [name for name, kept in zip(self.names,keep) if kept]+list(names)
+        self.lengths = np.array([len(name) for name in self.names],dtype=np.int64)
+        self.gramCounts = np.maximum(self.lengths-self.q+1,0)
+        postings = {}
+        for gram, (rows, counts) in self.postings.items():
+            kept = keep[rows]
+            if kept.any():
+                postings[gram] = ([moved[rows[kept]]],[counts[kept]])
+        for row, name in enumerate(names,start):
+            for gram, count in self._Grams(name).items():
+                postings.setdefault(gram,([],[]))
+                postings[gram][0].append([row])
+                postings[gram][1].append([count])
+        self.postings = {gram:(np.concatenate(rows).astype(np.int64),np.concatenate(counts).astype(np.int64))
+                         for gram, (rows,counts) in postings.items()}
+
+    def _Grams(self,name):
+        return Counter(name[i:i+self.q] for i in range(len(name)-self.q+1))
+
+    def _Score(self,distance,maxLen):
+        return 1-distance/maxLen if maxLen > 0 else 0.0
+
+    def Scores(self,name):
+        """Returns an array containing the Lev score between a name and every name in the index."""
+        import Levenshtein as LV
+        scores = np.zeros(len(self.names))
+        for i, other in enumerate(self.names):
+            scores[i] = self._Score(LV.distance(name,other),max(len(name),len(other)))
+        return scores
+
+    def Bounds(self,name):
+        """Returns an array with an upper bound on the Lev score between a name and every name in the index."""
+        length = len(name)
+        grams = self._Grams(name)
+        #The number of q-grams shared by the name and each row (counting repeated q-grams).
+        common = np.zeros(len(self.names),dtype=np.int64)
+        for gram, count in grams.items():
+            if gram in self.postings:
+                rows, counts = self.postings[gram]
+                common[rows] += np.minimum(counts,count)
+        missing = np.maximum(self.gramCounts,max(length-self.q+1,0))-common
+        lowest = np.maximum(np.abs(self.lengths-length),-(-missing//self.q))
+        maxLens = np.maximum(self.lengths,length)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            return np.where(maxLens > 0,1-lowest/maxLens,0.0)
+
+    def TopK(self,name,k):
+        """Returns the k rows with the highest Lev score to a name as the arrays rows, scores (sorted from the most to the
+        least similar, ties broken by the lower row). The result is the same as sorting "Scores"."""
+        if k <= 0 or len(self.names) == 0:
+            return np.zeros(0,dtype=np.int64),np.zeros(0)
+        import Levenshtein as LV
+        bounds = self.Bounds(name)
+        order = np.lexsort((np.arange(len(bounds)),-bounds))
+        #A min-heap of (score,-row) holding the best k rows found so far. Its first item is the one to beat.
+        heap = []
+        for row in order.tolist():
+            maxLen = max(len(name),len(self.names[row]))
+            if len(heap) < k:
+                item = (self._Score(LV.distance(name,self.names[row]),maxLen),-row)
+                heapq.heappush(heap,item)
+                continue
+            if bounds[row] < heap[0][0]:
+                #Every remaining name has an even lower bound.
+                break
+            #Names farther than this distance can not enter the top k.
+            maxDistance = int(np.floor((1-heap[0][0])*maxLen+1e-9))
+            item = (self._Score(_BoundedDistance(name,self.names[row],maxDistance),maxLen),-row)
+            if item > heap[0]:
+                heapq.heapreplace(heap,item)
+        rows = np.array([-item[1] for item in heap],dtype=np.int64)
+        scores = np.array([item[0] for item in heap])
+        return TopRows(rows,scores,k)
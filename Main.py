@@ -1,102 +1,83 @@
-import Similarities as Sims
-import pandas as pd
-import Score
-from sklearn.utils import shuffle
-import os
-import Setup
-
-"""This file serves as a wrapper which will call functions from all other scripts to run through the entire process of 
-scraping, cleaning, evaluating, and scoring.
-"""
-
-def SplitData(df,trainRatio=.9):
-    """Takes a dataframe, shuffles its rows, and splits it randomly into a training dataframe and a testing dataframe. 
-    Inputs:
-        df: A pandas dataframe that is to be split.
-        trainRatio: The fraction of data to delegate to the training set
-    Outputs:
-        trainSet: A shuffled dataframe consisting of trainRatio of the rows of the original dataframe.
-        testSet:  A shuffled dataframe consisting of 1-trainRatio of the rows of the original dataframe.
-    """
-    #A shuffled version of the original dataframe.
-    ddf = shuffle(df)
-    #Define the length of the original frame, the training frame, and the testing frame.
-    length = len(ddf)
-    trainLength = int(trainRatio*length)
-    testLength = length-trainLength
-    #Take the top and bottom portions of the shuffled frame to create two new frames.
-    trainSet = ddf.head(trainLength)
-    testSet = ddf.tail(testLength)
-    
-    return trainSet,testSet
-
-#If a checkpoint file is found,ask the user to either re-crawl the USC course 
-    #site or to load data from a previous crawl.
-if os.path.exists(Setup.pickleJar):
-    reCrawl = int(input("Re Crawl Site? \n0) No\n1) Yes"))
-else:
-    reCrawl = 1
-    
-#Either crawl USC's course site or laod the checkpoint file.
-if reCrawl == 1:
-    import USCCrawler2 as USCC
-    #Run python script to crawl USC site.
-    List = USCC.USCCrawl()
-else:
-    import pickle
-    #Load a list of dictionaries from the pickle file.  Each dictionary will contain the following labels:
-        #'name','number',description','school',and 'preq'
-    with open(Setup.pickleJar,'rb') as f:
-        List = pickle.load(f)
-        
-#Ask the user to either rerun the data cleaning script or to load data from a json file generated the last time the data was 
-    #cleaned. Data will be in a dictionary that can be accessed by "Dictionary[number][label]"
-    #where the "number" is the course number (all lowercase with no colon) and the label is one of the following:
-    #'name','number',description','school',and 'preq'
-    
-if os.path.exists(Setup.jsonFile):
-    reClean = int(input("Re Clean Data? \n0) No\n1) Yes"))
-else:
-    reClean = 1
-    
-#Either call Cleaner functions or load checkpoint json file.
-if reClean == 1:
-    import Cleaner
-    #Run Cleaning script to generate dictionary
-    Dictionary = Cleaner.Clean(List)
-    #Convert dictionary into pandas dataframe.
-    df = pd.DataFrame.from_dict(Dictionary,orient='index')
-    print("Cleaned Data")
-else:
-    #Load a dataframe from a json file.
-    import Setup
-    jsonFile = Setup.jsonFile
-    df = pd.read_json(jsonFile,orient='index')    
-  
-#Create a dictionary of dictionaries to store the results from the cross validation
-    #The outer dictionary will contain each of the 5 methods tested.
-    #The inner dictionaries will contain the two performance metrics.
-ScoreDict = {"Jacard":{},"Lev":{},"WordSim":{},"DocSim":{},"GloveSim":{}}
-for sd in ScoreDict.keys():
-    ScoreDict[sd] = {"School":0,"Preq":0}
-    
-iterations = 1
-for i in range(iterations):
-    #Randomly split data into training and test dataset at each iteration.
-    trainSet,testSet = SplitData(df)
-    #Initialize all 5 methods to be tested (2 of the 5 methods will take) will 
-        #inititialize using the training data.
-    S = Sims.Similarities(trainSet)
-    #Score each method using the two performance metrics. ScoreDict will contain a score for 
-        #each method-metric pair where 1.0 represents 100% accuracy.
-    ScoreDict = Score.ScoreMethod(trainSet,testSet,S,ScoreDict,iterations,numberTest=30)
-    print("Finished Cross Validation",i+1)
-    
-#Convert resuls to a pandas dataframe that can be easily displayed or saved to a file.
-resultsFrame = pd.DataFrame.from_dict(ScoreDict,orient="index")
-print(resultsFrame)
-
-
-
-
-        
\ No newline at end of file
+import pandas as pd
+import CrossValidation
+import CatalogStore
+import Cleaner
+import os
+import Setup
+
+"""This file serves as a wrapper which will call functions from all other scripts to run through the entire process of 
+scraping, cleaning, evaluating, and scoring.
+The work is done in "main" so that worker processes started by the process pools (which import this file again when
+processes are spawned instead of forked, as on Windows) do not prompt the user or run the cross validation themselves.
+"""
+
+def main():
+    #If a checkpoint file is found,ask the user to either re-crawl the USC course 
+        #site or to load data from a previous crawl.
+    if os.path.exists(Setup.pickleJar):
+        reCrawl = int(input("Re Crawl Site? \n0) No\n1) Yes\n2) Only changed courses"))
+    else:
+        reCrawl = 1
+
+    #Either crawl USC's course site or laod the checkpoint file.
+    if reCrawl == 1:
+        import USCCrawler2 as USCC
+        #Run python script to crawl USC site.
+        List = USCC.USCCrawl()
+    elif reCrawl == 2:
+        import USCCrawler2 as USCC
+        #Only re-parse the pages that changed since the last crawl.
+        List, changes = USCC.USCRefresh()
+    else:
+        #The raw data is only loaded from the pickle file if it is cleaned again (see below).
+        List = None
+
+    #Ask the user to either rerun the data cleaning script or to load the data cleaned the last time. The cleaned
+        #courses are kept in a line delimited json file (see Cleaner.py) with one course per line. Each course has
+        #the number (all lowercase with no colon) and the labels 'name','description','preqName' and 'school'
+    cleaned = os.path.exists(Setup.jsonLines) or os.path.exists(Setup.jsonFile)
+    if reCrawl == 2 and cleaned:
+        #Only the changed courses need to be cleaned.
+        reClean = 2
+    elif cleaned:
+        reClean = int(input("Re Clean Data? \n0) No\n1) Yes"))
+    else:
+        reClean = 1
+
+    #Either call Cleaner functions or load the cleaned data. The courses are cleaned one at a time and streamed to the
+        #line delimited json file, and from there to the columnar catalog, so the cleaned catalog is never built up
+        #as a dictionary in memory.
+    if reClean == 2:
+        #Clean the changed courses and update the line delimited json file.
+        cleanChanges = Cleaner.CleanChanges(changes)
+        print("Cleaned",len(cleanChanges['changed']),"changed courses")
+    elif reClean == 1:
+        if List is None:
+            import pickle
+            #Load a list of dictionaries from the pickle file.  Each dictionary will contain the following labels:
+                #'name','number',description','school',and 'preq'
+            with open(Setup.pickleJar,'rb') as f:
+                List = pickle.load(f)
+        #Run Cleaning script to stream the cleaned courses to the line delimited json file.
+        Cleaner.CleanToLines(List)
+        List = None
+        print("Cleaned Data")
+    if reClean != 0 or not CatalogStore.Exists(Setup.uscCatalog):
+        #Save the cleaned data in the columnar catalog for the next start.
+        Cleaner.SaveCatalog()
+    #Load the dataframe from the columnar catalog (much faster than parsing the json file).
+    df = CatalogStore.Load(Setup.uscCatalog)
+
+    #Run the cross validation. The folds are trained in parallel and the scoring of each (method, course) pair is spread
+        #over all cores (see CrossValidation.py). The results are a dictionary of dictionaries:
+        #The outer dictionary will contain each of the 5 methods tested.
+        #The inner dictionaries will contain the two performance metrics (where 1.0 represents 100% accuracy).
+    iterations = 1
+    ScoreDict = CrossValidation.CrossValidate(df,iterations,numberTest=30)
+
+    #Convert resuls to a pandas dataframe that can be easily displayed or saved to a file.
+    resultsFrame = pd.DataFrame.from_dict(ScoreDict,orient="index")
+    print(resultsFrame)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import os
+import json
+import hashlib
+import shutil
+import numpy as np
+import Setup
+
+"""
+This file contains the on-disk store for the trained gensim models and the reference embeddings built by the
+"Similarities" class. Every artifact is saved in a folder named after a fingerprint of the data and settings that
+produced it, so the models are only retrained when the training descriptions or the hyperparameters change.
+"""
+#Bump this number whenever the layout of the stored artifacts changes. Artifacts saved with another version
+    #are ignored (and rebuilt).
+STORE_VERSION = 2
+
+def Fingerprint(component,ids,texts,params):
+    """Calculates the fingerprint of an artifact.
+    Inputs:
+        component - The name of the artifact (for example "Word" or "Doc")
+        ids - The course numbers of the training set (in order)
+        texts - The training descriptions as a list of lists of words.
+        params - A dictionary of the settings used to build the artifact.
+    Output:
+        A hex string that changes whenever any of the inputs change.
+    """
+    h = hashlib.sha1()
+    h.update(json.dumps({"version":STORE_VERSION,"component":component,"params":params},sort_keys=True).encode())
+    for index, words in zip(ids,texts):
+        h.update(str(index).encode())
+        h.update(b"\x00")
+        h.update(" ".join(words).encode())
+        h.update(b"\x01")
+    return component+"-"+h.hexdigest()[:20]
+
+def ParamsKey(params):
+    """A short hex string identifying a dictionary of settings (used to name artifacts built with different settings
+    from the same model)."""
+    return hashlib.sha1(json.dumps(params,sort_keys=True).encode()).hexdigest()[:8]
+
+class ModelStore:
+    """Saves and loads gensim models and reference embedding matrices.
+    Initialize this class with:
+        root - The folder in which the artifacts are saved. Defaults to "Setup.modelStore"
+    """
+    def __init__(self,root=None):
+        self.root = root if root is not None else Setup.modelStore
+
+    def _Folder(self,fingerprint):
+        return os.path.join(self.root,fingerprint)
+
+    def Has(self,fingerprint,name):
+        """Returns True if the artifact "name" was saved under this fingerprint with the current store version."""
+        meta = os.path.join(self._Folder(fingerprint),name+".json")
+        if not os.path.exists(meta):
+            return False
+        with open(meta,'r') as f:
+            return json.load(f).get("version") == STORE_VERSION
+
+    def _Commit(self,fingerprint,name,write,info):
+        """Writes an artifact to a temporary folder first and then moves it into place so that a half written
+        artifact is never loaded (for instance if two processes build the same model at the same time)."""
+        folder = self._Folder(fingerprint)
+        os.makedirs(folder,exist_ok=True)
+        tmp = os.path.join(folder,".tmp-%s-%d"%(name,os.getpid()))
+        os.makedirs(tmp,exist_ok=True)
+        try:
+            write(tmp)
+            for fileName in os.listdir(tmp):
+                os.replace(os.path.join(tmp,fileName),os.path.join(folder,fileName))
+            info = dict(info,version=STORE_VERSION)
+            #The meta file is written last. Its presence marks the artifact as complete.
+            with open(os.path.join(folder,name+".json"),'w') as f:
+                json.dump(info,f)
+        finally:
+            shutil.rmtree(tmp,ignore_errors=True)
+
+    def Remove(self,fingerprint):
+        """Deletes every artifact saved under a fingerprint (for example the models of a cross validation fold, which
+        are not used again)."""
+        shutil.rmtree(self._Folder(fingerprint),ignore_errors=True)
+
+    def SaveModel(self,fingerprint,name,model):
+        """Saves a gensim model with its own "save" method."""
+        self._Commit(fingerprint,name,lambda tmp: model.save(os.path.join(tmp,name+".model")),{"type":"model"})
+
+    def LoadModel(self,fingerprint,name,cls):
+        """Loads a gensim model that was saved with "SaveModel".
+        Inputs:
+            cls - The gensim class of the model (for example gensim.models.Word2Vec)
+        """
+        return cls.load(os.path.join(self._Folder(fingerprint),name+".model"))
+
+    def SaveMatrix(self,fingerprint,name,ids,matrix):
+        """Saves a reference embedding matrix. Row i of the matrix belongs to course ids[i]."""
+        def write(tmp):
+            np.save(os.path.join(tmp,name+".npy"),np.asarray(matrix))
+            with open(os.path.join(tmp,name+".ids.json"),'w') as f:
+                json.dump([str(index) for index in ids],f)
+        self._Commit(fingerprint,name,write,{"type":"matrix","rows":len(ids)})
+
+    def LoadMatrix(self,fingerprint,name):
+        """Loads a matrix saved with "SaveMatrix".
+        Output:
+            ids - A list of the course numbers (as strings)
+            matrix - The embedding matrix
+        """
+        folder = self._Folder(fingerprint)
+        with open(os.path.join(folder,name+".ids.json"),'r') as f:
+            ids = json.load(f)
+        return ids,np.load(os.path.join(folder,name+".npy"))
+
+    def SaveIndex(self,fingerprint,name,index):
+        """Saves a search index which has a "Save(path)" method (for example ANNIndex.IVFIndex)."""
+        self._Commit(fingerprint,name,lambda tmp: index.Save(os.path.join(tmp,name+".npz")),{"type":"index"})
+
+    def LoadIndex(self,fingerprint,name,cls,*args):
+        """Loads an index saved with "SaveIndex". cls is the class of the index (which must have a "Load" method). Any
+        other arguments are passed on to "Load" (for example the matrix an ANNIndex.IVFIndex searches)."""
+        return cls.Load(os.path.join(self._Folder(fingerprint),name+".npz"),*args)
@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import threading
+
+"""
+This file contains the profiling instrumentation used across the pipeline. Stages are timed with named spans and
+events are tallied with counters:
+    with Profiler.Span("Word2Vec.train"):
+        ...
+    @Profiler.Timed("CleanToLines")
+    def CleanToLines(...):
+    Profiler.Count("embed.Word.documents",len(rows))
+Spans opened inside other spans (on the same thread) are reported under their parent, for example
+"Similarities/Word2Vec.train". Worker processes return their profile with each result ("Collect") and the main process
+adds it to its own ("Merge"). Profiling is off by default and then a span or a counter costs one check of
+"Profiler.enabled". It is turned on with "Enable()" or with environment variables:
+    WORDSIM_PROFILE=1             Print a profile report when the program exits.
+    WORDSIM_PROFILE=report.json   Save the profile report to a json file when the program exits.
+    WORDSIM_PROFILE_LOG=run.jsonl Also write one json line per finished span ("-" writes to stderr).
+"""
+#True while profiling. Read by the instrumented code to skip any extra work needed only for the counters.
+enabled = False
+
+_lock = threading.Lock()
+_local = threading.local()
+#Each span path connected to [calls, total seconds, max seconds].
+_spans = {}
+_counters = {}
+_log = None
+_started = time.perf_counter()
+
+class _NullSpan:
+    #The span returned while profiling is off.
+    __slots__ = ()
+    def __enter__(self):
+        return self
+    def __exit__(self,*args):
+        return False
+
+_nullSpan = _NullSpan()
+
+def _Stack():
+    #The names of the spans open on this thread.
+    stack = getattr(_local,'stack',None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+class _Span:
+    __slots__ = ("path","start")
+    def __init__(self,name):
+        stack = _Stack()
+        stack.append(name)
+        self.path = "/".join(stack)
+        self.start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        seconds = time.perf_counter()-self.start
+        _Stack().pop()
+        Add(self.path,seconds)
+        return False
+
+def Span(name,detail=None):
+    """Returns a context manager which times the code inside it.
+    Inputs:
+        name - The name of the span.
+        detail - An optional suffix (for example a method name) appended as "name.detail". It is only joined to the
+            name while profiling, so callers can pass it without building strings.
+    """
+    if not enabled:
+        return _nullSpan
+    return _Span(name if detail is None else "%s.%s"%(name,detail))
+
+def Timed(name):
+    """A decorator which times every call of a function as a span."""
+    def decorate(function):
+        @functools.wraps(function)
+        def timed(*args,**kwargs):
+            if not enabled:
+                return function(*args,**kwargs)
+            with _Span(name):
+                return function(*args,**kwargs)
+        return timed
+    return decorate
+
+def Add(name,seconds):
+    """Records one timing under a name without opening a span (for work that is not nested on one thread, such as
+    the requests of the asynchronous crawler)."""
+    if not enabled:
+        return
+    with _lock:
+        entry = _spans.get(name)
+        if entry is None:
+            entry = _spans[name] = [0,0.0,0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2],seconds)
+    if _log is not None:
+        Event("span",name=name,ms=seconds*1000)
+
+def Count(name,n=1):
+    """Adds n to a counter (for example documents embedded, cache hits or pairs scored)."""
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name,0)+n
+
+def Event(event,**fields):
+    """Writes one structured log line (a json object with the time, the thread and the given fields) if a log is open."""
+    if _log is None:
+        return
+    line = json.dumps(dict({"time":round(time.time(),6),"event":event,"thread":threading.current_thread().name},**fields))
+    with _lock:
+        _log.write(line+"\n")
+        _log.flush()
+
+def Enable(log=None):
+    """Turns profiling on.
+    Inputs:
+        log - A file name (or "-" for stderr) to write one json line per finished span to, or None for no log.
+    """
+    global enabled, _log
+    if log is not None:
+        _log = sys.stderr if log == "-" else open(log,'a')
+    enabled = True
+
+def Disable():
+    """Turns profiling off and closes the structured log. The collected timings are kept until "Reset"."""
+    global enabled, _log
+    enabled = False
+    if _log is not None and _log is not sys.stderr:
+        _log.close()
+    _log = None
+
+def Reset():
+    """Forgets every timing and counter."""
+    global _started
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _started = time.perf_counter()
+
+def Collect():
+    """Returns the profile collected so far (see "Report") and forgets it. A worker process calls this after each task
+    and sends the result back to the parent process, which adds it to its own profile with "Merge"."""
+    report = Report()
+    Reset()
+    return report
+
+def Merge(report):
+    """Adds the spans and counters of a report (for example one collected in a worker process) to this profile."""
+    if report is None:
+        return
+    with _lock:
+        for name, span in report["spans"].items():
+            entry = _spans.get(name)
+            if entry is None:
+                entry = _spans[name] = [0,0.0,0.0]
+            entry[0] += span["calls"]
+            entry[1] += span["seconds"]
+            entry[2] = max(entry[2],span["maxMs"]/1000)
+        for name, value in report["counters"].items():
+            _counters[name] = _counters.get(name,0)+value
+
+def Report():
+    """Returns the profile collected so far.
+    Output:
+        A dictionary with:
+            'seconds' - The time since profiling was reset (or the module was loaded).
+            'spans' - Each span path connected to its number of calls, total seconds, mean and max milliseconds.
+            'counters' - Each counter connected to its value.
+            'rates' - Rates derived from pairs of counters: "<name>.hitRate" from "<name>.hits" and "<name>.misses",
+                and "<name>.oovRate" from "<name>.oov" and "<name>.tokens"
+    """
+    with _lock:
+        spans = {name:{"calls":calls,"seconds":total,"meanMs":1000*total/calls,"maxMs":1000*longest}
+                 for name, (calls, total, longest) in sorted(_spans.items())}
+        counters = dict(sorted(_counters.items()))
+    rates = {}
+    for name, value in counters.items():
+        if name.endswith((".hits",".misses")):
+            base = name.rsplit(".",1)[0]
+            hits = counters.get(base+".hits",0)
+            total = hits+counters.get(base+".misses",0)
+            rates[base+".hitRate"] = hits/total if total else 0.0
+        elif name.endswith(".tokens"):
+            base = name[:-len(".tokens")]
+            rates[base+".oovRate"] = counters.get(base+".oov",0)/value if value else 0.0
+    rates = dict(sorted(rates.items()))
+    return {"seconds":time.perf_counter()-_started,"spans":spans,"counters":counters,"rates":rates}
+
+def PrintReport(report=None,file=None):
+    """Prints a profile report as a table (spans are indented under their parents)."""
+    report = report if report is not None else Report()
+    file = file if file is not None else sys.stdout
+    print("Profile of %.2f s"%report["seconds"],file=file)
+    print("%-48s %8s %10s %10s %10s"%("span","calls","total s","mean ms","max ms"),file=file)
+    for name, span in report["spans"].items():
+        parts = name.split("/")
+        label = "  "*(len(parts)-1)+parts[-1]
+        print("%-48s %8d %10.3f %10.3f %10.3f"%(label,span["calls"],span["seconds"],span["meanMs"],span["maxMs"]),file=file)
+    for name, value in report["counters"].items():
+        print("%-48s %8s"%(name,value),file=file)
+    for name, value in report["rates"].items():
+        print("%-48s %8.3f"%(name,value),file=file)
+
+def Dump(path,report=None):
+    """Saves a profile report to a json file."""
+    with open(path,'w') as f:
+        json.dump(report if report is not None else Report(),f,indent=1)
+
+def _AtExit(setting):
+    #Reports the profile of a run started with the WORDSIM_PROFILE environment variable. Worker processes send their
+        #profile to the main process instead (see "Collect").
+    import multiprocessing
+    if multiprocessing.current_process().name != "MainProcess":
+        return
+    if setting.endswith(".json"):
+        Dump(setting)
+    else:
+        PrintReport(file=sys.stderr)
+    Disable()
+
+_setting = os.environ.get("WORDSIM_PROFILE","")
+if _setting not in ("","0"):
+    Enable(os.environ.get("WORDSIM_PROFILE_LOG"))
+    atexit.register(_AtExit,_setting)
@@ -0,0 +1,285 @@
+import json
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pandas as pd
+import Setup
+
+"""
+This file contains a resident similarity service. The catalog, the models, the reference embeddings and the search
+indexes are loaded once and queries are answered over a local HTTP/JSON API:
+    GET  /health                                   The number of courses and the available methods.
+    GET  /topk?method=WordSim&course=<number>&k=10 The top k courses of a course in the catalog.
+    POST /topk   {"method":..,"course":..,"k":..}  The same, or with "description" (and optionally "name") instead of
+                                                   "course" to query with free text.
+    POST /batch  {"queries":[{...},{...}]}         Several queries in one request. Free text queries of the embedding
+                                                   methods are scored together in blocks (see Batch.py).
+Each answer is {"method":..,"query":..,"matches":[{"course":..,"score":..},...]}. Answers are kept in a least recently
+used cache, so repeated queries are answered without scoring.
+Run "python Server.py" to serve the USC catalog (see "--help" for the options).
+"""
+
+class QueryError(Exception):
+    """A bad query. Answered with the given HTTP status and message."""
+    def __init__(self,status,message):
+        Exception.__init__(self,message)
+        self.status = status
+
+class SimilarityService:
+    """Answers top k queries against the training set of a "Similarities" instance.
+    Initialize this class with:
+        S - The "Similarities" instance.
+        maxConcurrent - The largest number of queries scored at once (each in its own request thread). Further
+            requests wait (up to "timeout" seconds) and are then refused with "503 Service Unavailable".
+        cacheSize - The number of answers kept in the result cache.
+        timeout - The number of seconds a request waits for a free slot.
+    """
+    def __init__(self,S,maxConcurrent=4,cacheSize=4096,timeout=10):
+        import Similarities as Sims
+        self.S = S
+        self.slots = threading.BoundedSemaphore(maxConcurrent)
+        self.timeout = timeout
+        #(The query cache is shared by the request threads. Each part of "S" is built under its own lock, see
+            #"Similarities._Require", so queries are scored concurrently.)
+        self.results = Sims.QueryCache(cacheSize)
+        #Methods are built on first use (or prewarmed by "Serve"). GloveSim is offered unless the GloVe vectors fail
+            #to load. They are only loaded here if "S" was prewarmed with GloveSim, otherwise on its first query.
+        self.methods = ["Jacard","Lev","WordSim","DocSim","GloveSim"]
+        prewarmed = S.Modes.get(S.mode,S.mode) if isinstance(S.mode,str) else (S.mode or [])
+        if "GloveSim" in prewarmed and S.GloveFail:
+            self.methods = self.methods[:-1]
+
+    def Health(self):
+        return {"courses":len(self.S.ids),"methods":self.methods,"cache":self.results.Stats()}
+
+    def _Parse(self,query):
+        #Checks a query and returns (method, k, course, name, description). course is None for free text queries.
+        if not isinstance(query,dict):
+            raise QueryError(400,"A query must be a json object")
+        method = query.get("method","WordSim")
+        if method not in self.methods:
+            raise QueryError(400,"Unknown method %r (available: %s)"%(method,", ".join(self.methods)))
+        if method == "GloveSim" and self.S.GloveFail:
+            self.methods = [name for name in self.methods if name != "GloveSim"]
+            raise QueryError(503,"The GloVe vectors could not be loaded")
+        try:
+            k = int(query.get("k",10))
+        except (TypeError,ValueError):
+            raise QueryError(400,"k must be an integer")
+        if k < 1:
+            raise QueryError(400,"k must be at least 1")
+        course = query.get("course")
+        if course is not None:
+            if not isinstance(course,str):
+                raise QueryError(400,"course must be a string")
+            if course not in self.S.catalog.rows:
+                raise QueryError(404,"Unknown course %r"%course)
+            return method,k,course,None,None
+        for field in ("description","name"):
+            if not isinstance(query.get(field) or "",str):
+                raise QueryError(400,"%s must be a string"%field)
+        if not query.get("description") and not query.get("name"):
+            raise QueryError(400,"A query needs a course or a description")
+        import Cleaner
+        #Free text is cleaned the same way as the catalog.
+        description = Cleaner.CleanDesc(query.get("description") or "")
+        name = query.get("name") or ""
+        name = Cleaner.CleanName(name) if name.strip() else ""
+        return method,k,None,name,description
+
+    def _CacheKey(self,method,k,course,name,description):
+        return (method,k,course) if course is not None else (method,k,None,name,description)
+
+    def _Answer(self,method,course,name,description,matches,scores):
+        query = {"course":course} if course is not None else {"name":name,"description":description}
+        return {"method":method,"query":query,
+                "matches":[{"course":match,"score":float(score)} for match, score in zip(matches,scores)]}
+
+    def _Cached(self,key):
+        return self.results.Get(key)
+
+    def _Store(self,key,answer):
+        self.results.Put(key,answer)
+
+    def _Acquire(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise QueryError(503,"Too many concurrent queries")
+
+    def TopK(self,query):
+        """Answers one query (a dictionary with "method", "k" and either "course" or "description"/"name")."""
+        method, k, course, name, description = self._Parse(query)
+        key = self._CacheKey(method,k,course,name,description)
+        answer = self._Cached(key)
+        if answer is not None:
+            return answer
+        self._Acquire()
+        try:
+            if course is not None:
+                Vec = self.S.TopK(method,self.S.trainDF,course,k)
+            else:
+                queryDF = pd.DataFrame({"name":[name],"description":[description]},index=["__query__"])
+                Vec = self.S.TopK(method,queryDF,"__query__",k)
+        finally:
+            self.slots.release()
+        answer = self._Answer(method,course,name,description,Vec.index.tolist(),Vec[0].tolist())
+        self._Store(key,answer)
+        return answer
+
+    def BatchTopK(self,queries):
+        """Answers a list of queries. Uncached free text queries of the same embedding method are scored together.
+        Output:
+            A list with the answer (or {"error":..,"status":..}) of each query, in order.
+        """
+        import Batch
+        if not isinstance(queries,list):
+            raise QueryError(400,"queries must be a list")
+        answers = [None]*len(queries)
+        #Free text queries waiting to be scored, grouped by (method, k).
+        groups = {}
+        for i, query in enumerate(queries):
+            try:
+                parsed = self._Parse(query)
+            except QueryError as e:
+                answers[i] = {"error":str(e),"status":e.status}
+                continue
+            method, k, course, name, description = parsed
+            cached = self._Cached(self._CacheKey(*parsed))
+            if cached is not None:
+                answers[i] = cached
+            elif course is None and method in Batch.EmbeddingKeys:
+                groups.setdefault((method,k),[]).append((i,parsed))
+            else:
+                try:
+                    answers[i] = self.TopK(query)
+                except QueryError as e:
+                    answers[i] = {"error":str(e),"status":e.status}
+        for (method, k), group in groups.items():
+            queryDF = pd.DataFrame({"name":[parsed[3] for _, parsed in group],
+                                    "description":[parsed[4] for _, parsed in group]},index=range(len(group)))
+            self._Acquire()
+            try:
+                results = list(Batch.Match(self.S,queryDF,method,k))
+            finally:
+                self.slots.release()
+            for (i, parsed), (_, matches, scores) in zip(group,results):
+                answers[i] = self._Answer(method,None,parsed[3],parsed[4],matches,scores)
+                self._Store(self._CacheKey(*parsed),answers[i])
+        return answers
+
+def _Handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        #Keep connections open between requests so a local client does not pay for a new connection each time.
+        protocol_version = "HTTP/1.1"
+        #Send each response in one piece without waiting (otherwise the delayed acknowledgement of the headers adds
+            #about 40 ms to every request).
+        disable_nagle_algorithm = True
+        wbufsize = 1<<16
+
+        def log_message(self,*args):
+            pass
+
+        def _Send(self,status,body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type","application/json")
+            self.send_header("Content-Length",str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _Run(self,function,*args):
+            try:
+                self._Send(200,function(*args))
+            except QueryError as e:
+                self._Send(e.status,{"error":str(e)})
+            except Exception as e:
+                self._Send(500,{"error":"%s: %s"%(type(e).__name__,e)})
+
+        def _Body(self):
+            length = int(self.headers.get("Content-Length",0))
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                raise QueryError(400,"The request body is not valid json")
+            if not isinstance(body,dict):
+                raise QueryError(400,"The request body must be a json object")
+            return body
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/health":
+                self._Run(service.Health)
+            elif url.path == "/topk":
+                self._Run(service.TopK,{key:values[-1] for key, values in parse_qs(url.query).items()})
+            else:
+                self._Send(404,{"error":"Unknown path"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            try:
+                body = self._Body()
+            except QueryError as e:
+                return self._Send(e.status,{"error":str(e)})
+            if url.path == "/topk":
+                self._Run(service.TopK,body)
+            elif url.path == "/batch":
+                self._Run(service.BatchTopK,body.get("queries",[]))
+            else:
+                self._Send(404,{"error":"Unknown path"})
+    return Handler
+
+class SimilarityServer:
+    """Serves a "SimilarityService" over HTTP on a background thread. Use as a context manager:
+        with SimilarityServer(service) as server:
+            requests.get(server.url+"/topk",params={"course":"csci 270"})
+    Initialize this class with:
+        service - The "SimilarityService"
+        host - The address to listen on.
+        port - The port to listen on (0 picks a free port).
+    """
+    def __init__(self,service,host='127.0.0.1',port=0):
+        self.server = ThreadingHTTPServer((host,port),_Handler(service))
+        self.server.daemon_threads = True
+        self.url = "http://%s:%d"%(host,self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever,daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self,*args):
+        self.server.shutdown()
+        self.server.server_close()
+
+def Serve(catalog=None,mode="All",host='127.0.0.1',port=8765,maxConcurrent=4):
+    """Loads a catalog (see CatalogStore.py), builds the "Similarities" instance once and serves it until interrupted.
+    Inputs:
+        catalog - The folder of the catalog. Defaults to "Setup.uscCatalog"
+        mode - The methods built before the first query is answered ("All" or "Word", see "Similarities"). The
+            others are built when they are first asked for.
+        host, port - The address to listen on.
+        maxConcurrent - See "SimilarityService"
+    """
+    import CatalogStore
+    import Similarities as Sims
+    df = CatalogStore.Load(catalog if catalog is not None else Setup.uscCatalog)
+    service = SimilarityService(Sims.Similarities(df,mode),maxConcurrent)
+    server = ThreadingHTTPServer((host,port),_Handler(service))
+    server.daemon_threads = True
+    print("Serving",len(df),"courses on http://%s:%d"%(host,server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serves top k similarity queries over HTTP/JSON.")
+    parser.add_argument("--catalog",help="The catalog folder (defaults to the USC catalog).")
+    parser.add_argument("--mode",default="All",choices=["All","Word"])
+    parser.add_argument("--host",default="127.0.0.1")
+    parser.add_argument("--port",type=int,default=8765)
+    parser.add_argument("--concurrency",type=int,default=4,help="The largest number of queries scored at once.")
+    args = parser.parse_args()
+    Serve(args.catalog,args.mode,args.host,args.port,args.concurrency)
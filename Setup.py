@@ -1,19 +1,40 @@
-"""
-This file contains all of the urls and filepathways used throughout this solution.
-"""
-import os
-#The URL to get to the UCS course catalog
-url = r'https://classes.usc.edu/term-20193/'
-
-#Preprocessing steps save data so that the entire code does not need to be run every time.
-#rootFolder = r'D:\Python Codes\Graph Theory\USCCourses'
-rootFolder = os.path.dirname(os.path.abspath(__file__))
-#The raw data saved after scraping the site
-pickleJar = os.path.join(rootFolder,"pickleFile.pkl")
-#A JSON file containing the clean data
-jsonFile = os.path.join(rootFolder,"jsonFile.json")
-#The pretrained word vectors downloaded from the glove dataset.
-gloveJar = os.path.join(rootFolder,"gloveJar.pkl")
-#Pickle file storing raw UCLA data
-UCLA = os.path.join(rootFolder,"UCLAJar.json")
-UCLAClean = os.path.join(rootFolder,"UCLAClean.json")
+"""
+This file contains all of the urls and filepathways used throughout this solution.
+"""
+import os
+#The URL to get to the UCS course catalog
+url = r'https://classes.usc.edu/term-20193/'
+
+#Politeness limits of the crawlers (see AsyncFetch.py): the average number of requests per second sent to each site,
+    #the number of requests that may be sent back to back, and the largest number of requests in flight at once.
+crawlRate = 0.5
+crawlBurst = 1
+crawlConcurrency = 4
+
+#Preprocessing steps save data so that the entire code does not need to be run every time.
+#rootFolder = r'D:\Python Codes\Graph Theory\USCCourses'
+rootFolder = os.path.dirname(os.path.abspath(__file__))
+#The raw data saved after scraping the site
+pickleJar = os.path.join(rootFolder,"pickleFile.pkl")
+#A JSON file containing the clean data
+jsonFile = os.path.join(rootFolder,"jsonFile.json")
+#The clean data streamed as line delimited JSON (one course per line, see Cleaner.py)
+jsonLines = os.path.join(rootFolder,"jsonFile.jsonl")
+#The pretrained word vectors downloaded from the glove dataset.
+gloveJar = os.path.join(rootFolder,"gloveJar.pkl")
+#The same word vectors as a raw float32 matrix (opened with a memory map) and the word for each row.
+gloveVectors = os.path.join(rootFolder,"gloveVectors.npy")
+gloveVocab = os.path.join(rootFolder,"gloveVocab.txt")
+#Pickle file storing raw UCLA data
+UCLA = os.path.join(rootFolder,"UCLAJar.json")
+#The raw UCLA data as line delimited JSON (one scraped course per line, read one course at a time by UCLACleaner.py)
+UCLARawLines = os.path.join(rootFolder,"UCLAJar.jsonl")
+UCLAClean = os.path.join(rootFolder,"UCLAClean.json")
+UCLALines = os.path.join(rootFolder,"UCLAClean.jsonl")
+#The cleaned USC and UCLA catalogs in the columnar format loaded at startup (see CatalogStore.py)
+uscCatalog = os.path.join(rootFolder,"catalogs","usc")
+uclaCatalog = os.path.join(rootFolder,"catalogs","ucla")
+#The crawl cache (validators, hashes and parsed records of every crawled page) used for incremental re-crawls
+crawlCache = os.path.join(rootFolder,"crawlCache.json")
+#Folder storing the trained word2vec/doc2vec models and the reference embeddings (see ModelStore.py)
+modelStore = os.path.join(rootFolder,"modelStore")
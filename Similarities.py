@@ -1,330 +1,817 @@
-import Levenshtein as LV
-import gensim
-import pandas as pd
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-"""This script contains a single class which in turn, contains all 5 of the methods to be tested (as well as their 
-initialization functions.)  The five methods are as follows:
-    1) Jacard Similarity between course descriptions 
-    2) Leveshtein Distance between course names
-    3) Similarity of the average Word2Vec encoding of course descriptions
-    4) Similarity of the Doc2Vec encodings of course descriptions.
-    5) Similarity of the "matrix" encoding using the pretrained GloVe encodings.
-        (The matrix encoding is a concatenation of 4 encoding vectors.
-        1) The average of all word vector encodings in the description.)
-        2) The average + 1 st dev of all vector encodings
-        3) A vector consisting of the max values of all vector encodings
-        4) A vector consisting of the min values of all vector encodings.
-    
-    The methods used to to call these are as follows:
-        Jacard
-        Lev
-        WordSim
-        DocSim
-        GloveSim
-"""
-
-class Similarities:
-    """This class takes in a training data frame that is used to train the word2vec and doc2vec embeddings.  
-    The 5 methods can the be called when passed the test data frame.
-    Initialize this class with:
-        trainDF - The dataframe used to train the embeddings.  This will also be the dataframe from which
-            the program will pull the course closest to the test course.
-        Mode - Either "All" for initializing all 5 methods or "Word" for only initializing "WordSim"
-    """
-    def __init__(self,trainDF,mode="All"):
-        self.GloveFail = False
-        self.mode = mode
-        #The input training data frame.
-
-        self.trainDF = trainDF
-        #Transforms the text strings from the descriptions into a list of list of words.
-        self._initText()
-        #Initializes and trains the word2vec embeddings.
-        self._initWordVec()
-        #Only initialize DocSim and GloveSim if required.
-        if mode == "All":
-            #Initializes and trains the doc2vec embeddigns.
-            self._initDocVec()
-            #Loads in the pretrained GloVe data.
-            self._initGloveVec()
-        #Build a dictionary containing the embeddings for each description. This make it so that the 
-            #the embedding functions only need to be called once for the test course which will then 
-            #be compared to the embeddings in this dictionary.
-        self.VDF = {"Word":{},"Doc":{},"Glove":{}}
-        self._BuildSims()
-        
-        
-    def _initText(self):
-        #Get text from descriptions. The variable is a nested list where the outer list represents
-        #each description and the inner list is each word in that description.
-        self.texts = []
-        for index, row in self.trainDF.iterrows():
-            self.texts.append(row['description'].split())
-        print("Text initialized")
-        
-    def _initWordVec(self):
-        #Load the list of list consisting of the course descriptions into the word2vec model. Train the model
-        self.WordVecModel = gensim.models.Word2Vec(self.texts,size=300,window=5,min_count=2,workers=4,iter=100)
-        print("Word2Vec Model initialized")
-    def _initDocVec(self):
-        #Initializes and trains the doc2vec embedding
-        from gensim.models.doc2vec import Doc2Vec, TaggedDocument
-        documents = []
-        #Iterate through each course description and store each as a tagged docuent. Create list of 
-            #tagged documents.
-        for i in range(len(self.texts)):
-            documents.append(TaggedDocument(self.texts[i],[i]))
-        #Train the doc2vec model with the tagged documents.
-        self.DocVecModel = Doc2Vec(documents, vector_size=300, window=5, min_count=2, workers=4,epochs=100)
-        print("Doc2Vec Model initialized")
-    def _initGloveVec(self):
-        #Initializes the pre-trained GloVe model.
-        import Setup
-        import pickle
-        import os
-        #If the model has already been saved, import it from the pickle file and store to the variabe "word_vectors"
-        if os.path.exists(Setup.gloveJar):
-            with open(Setup.gloveJar,'rb') as f:
-                glove = pickle.load(f)
-                self.gloveModel = glove
-
-        #If the model has not already been saved, call the api downloader to download the model.
-        else:
-            print("Downloading GloVe word embeddings with gensim...")
-            "Maybe add an option to switch off pickle mode?"
-            try:
-                import gensim.downloader as api
-                glove = api.load("glove-wiki-gigaword-100") 
-
-                #Once the model has been downloaded, save the word_vectors as a pickle file for later use.
-                with open(Setup.gloveJar,'wb') as f:
-                    pickle.dump(glove,f)
-                print("word vectors saved to .pkl file")
-                self.gloveModel = glove
-                print("Glove model initialized")
-            except:
-                print("Glove Sim model failed to download")
-                self.GloveFail = True
-        #Allow word vectors to be accessed by other methods in the class.
-
-            
-    def Jacard(self,testDf,listCourse,inCourse):
-        """Calculates the Jacard similarity between two course descriptions.
-        Inputs:
-            testDF - The test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
-                consisting of the course number indexes (all lowercase no colons.)
-            a,b - each of these is a string representing the course number.
-        Outputs:
-            The Jacard similarity score scaled between 0 and 1.
-        """
-        #Obtain the course descriptions for the two course indexes inputed into the function.
-        A = self.trainDF['description'][listCourse]
-        B = testDf['description'][inCourse]
-        #Create a set of words for each description.
-        setA = set(A.split())
-        setB = set(B.split())
-        
-        #Count the number of words in set a that are also in set b.
-        score = 0
-        for a in setA:
-            if a in setB:
-                score +=1
-        #Divide the number by the total length of both sets.
-        return score/(len(setA.union(setB)))
-
-    def Lev(self,testDf,listCourse,inCourse):
-        """Calculates the Levenshtein distance between two course names.
-        Inputs:
-            testDF - The test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
-                consisting of the course number indexes (all lowercase no colons.)
-            a,b - each of these is a string representing the course number.
-        Outputs:
-            The compliment of the normalized Levenshtein distance
-            (The compliment is calculated by 1-(L/D) where L is the Levenshtein distance and D is the length of the 
-            longer of the two strings)
-            This number is scaled between 0 and 1 where 1 represents a perfect match.
-        """
-        #Obtain the couse names for the two courses provided
-        A = self.trainDF['name'][listCourse]
-        B = testDf['name'][inCourse]
-        #Figure out the length of the longest course name.
-        maxLen = max(len(A),len(B))
-        #Calculate the compliment of the normalized Levenshtein distance.  
-        return 1-LV.distance(A,B)/maxLen  
-    
-    def _WordSimAveVec(self,df,a):
-        """Calculates the a document embedding vector by taking the average of all word vectors in the document. This is
-        a helper function to be used with the "WordSim" method.
-        Inputs:
-            testDF - A test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
-                consisting of the course number indexes (all lowercase no colons.) 
-            a - A string representing the course number
-        Output:
-            A vector embedding representing the entire document.
-        """
-        #Obtain the course description for the course provided and convert the string into a list of individual words.
-        Description = df['description'][a].split()
-        #Create a placeholder zero vector of the same size as the vector embedding.
-        Vector = np.zeros(self.WordVecModel.layer1_size)
-        wordCount = 0
-        #Iterate over each word in the description.
-        for word in Description:
-            #If the word is in the trained vocabulary, obtain the word vector. 
-            #Continue to add the word vectors to the placeholder vector to get the running sum.
-            if word in self.WordVecModel.wv.vocab:
-                vector = self.WordVecModel.wv.get_vector(word)
-                Vector +=vector
-                #Keep track of how many word vectors (which were included in the vocabulary) were added.
-                wordCount +=1
-        #Calculate the mean by dividing the sum by the number of vectors.
-        return Vector/wordCount
-    
-    def _BuildSims(self):
-        """Builds up the dictionary "self.VDF" to contain all of the document vector embeddings which are in 
-        the training dataset to act as a reference. This way, the references only need to be calculated once.
-        The method will build up the dictionary using 3 "columns" - one for each word embedding if "All" mode
-        was selected for initializing the class.  If "Word" mode was selected, it will only build the dictionary
-        for the "WordSim" method.
-        Dictionary will be in the form VDF[Method][courseName]
-        """
-        if self.mode == "All":
-            #Iterate through all rows of the training dataframe.
-            for index, _ in self.trainDF.iterrows():
-                #Obtain the document embeddings for each method.
-                wordVec = self._WordSimAveVec(self.trainDF,index)
-                docVec = self._DocSim(self.trainDF,index)
-                #Save the embeddings to a dictionary
-                self.VDF["Word"][index] = wordVec
-                self.VDF["Doc"][index] = docVec
-                if self.GloveFail == False:
-                    gloveVec = self._GloveSim(self.trainDF,index)
-                    self.VDF["Glove"][index] = gloveVec
-        if self.mode == "Word":
-            for index, _ in self.trainDF.iterrows():
-                wordVec = self._WordSimAveVec(self.trainDF,index)
-                self.VDF["Word"][index] = wordVec
-          
-    
-    def WordSim(self,testDF,listCourse,inCourse):
-        """Calculate the cosine similarity between two vectors where each vector represents a course
-        description. Each vector is made by taking the average of each word vector that makes up the description. Average
-        vectors are calculated by a helper method "_WordSimAveVec"
-        Inputs:
-            testDF - A test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
-                consisting of the course number indexes (all lowercase no colons.) 
-            listCourse - A string containing the course number of the reference course in the trainSet
-            inCourse - A string containing the course number of the input test course.
-        """
-        #Obtain a single vector embedding for each course description (calculated by taking an average of each word 
-            #embedding that makes up each description)
-            
-        #Get the embedding from the dictionary for the list (reference) course
-        aVec = self.VDF["Word"][listCourse]
-        #Calculate the embedding with the doc2Vec model.
-        bVec = self._WordSimAveVec(testDF,inCourse)
-        #Convert vectors to column vectors to be fed into the cosine_similarity function.
-        A = np.expand_dims(aVec,0)
-        B = np.expand_dims(bVec,0)
-        #Calculate the cosine similarity between the two vectors.
-        sim = cosine_similarity(A,B)
-        return float(sim)
-        
-    def _DocSim(self,df,a):
-        """Calculate the cosine similarity between two document vectors.
-        Inputs:
-            testDF - A test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
-                consisting of the course number indexes (all lowercase no colons.) 
-            a - A string representing the course number"""
-        #Obtain the descriptions of the two input courses.
-        textA = df['description'][a]
-        #Obtain the document embedding vector for each description.
-        vectorA = self.DocVecModel.infer_vector([textA], alpha=0.1, min_alpha=0.0001, steps=300)
-        return vectorA
-    
-    def DocSim(self,testDF,listCourse,inCourse):
-        """Calculates a vector embedding for a course description using the doc2vec method.
-        Inputs:
-            testDF  - A test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
-                consisting of the course number indexes (all lowercase no colons.) 
-            listCourse - A string containing the course number of the reference course in the trainSet
-            inCourse - A string containing the course number of the input test course.
-        """
-        #Reference the VDF dictionary to get the doc embedding for the listCourse
-        vectorA = self.VDF["Doc"][listCourse]
-        #Calculate the doc embedding for the input course
-        vectorB = self._DocSim(testDF,inCourse)
-        
-        #Convert vectors to column vectors to be fed into the cosine_similarity function. 
-        A = np.expand_dims(vectorA,0)
-        B = np.expand_dims(vectorB,0)
-        #Calculate the cosine similarity between the two vectors.
-        sim = cosine_similarity(A,B)
-        return float(sim)
-        
-
-    def _GloveSim(self,testDf,a):
-        """Uses the word vectors from the pre-trained GloVe model to generate an array representing the document. 
-        Inputs:
-            testDF - A test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
-                consisting of the course number indexes (all lowercase no colons.) 
-            a - A string representing the course number
-        Outputs:
-            An array consistingof the mean, standard deviation, min and maximum of all word vector embeddings which 
-            make up the course description."""
-        #Obtain the course description for the given course number.
-        doc = testDf['description'][a]
-        #Iterate over each word in the document. For each word in the GloVe vocab, append the word vector to a list
-        Vectors = []
-        for word in doc:
-            if word in self.gloveModel.vocab:
-                vector = self.gloveModel.get_vector(word)
-                Vectors.append(vector)
-        #Turn the list of vectors into an array.
-        Vectors = np.array(Vectors)
-        
-        #Calculate the mean, mean+1stdev, maximum, and minimum of this array (each operation reducing 
-            #the array to eliminate rows). Concatenate these 4 measures into one matrix to serve as an index for a 
-            #document.
-        sd = np.std(Vectors,axis=0)
-        a0 = np.average(Vectors,axis=0)
-        asd = a0+sd
-        amax = np.max(Vectors,axis=0)
-        amin = np.amin(Vectors,axis=0)
-        
-        return np.stack((a0,asd,amax,amin),1)
-    
-    def GloveSim(self,testDf,listCourse,inCourse):
-        """Calculate the cosine similarity between two document arrays.
-        Inputs:
-            testDF - A test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
-                consisting of the course number indexes (all lowercase no colons.) 
-            listCourse - A string containing the course number of the reference course in the trainSet
-            inCourse - A string containing the course number of the input test course.
-        Outputs
-            Cosine similarity"""
-        #Obtain the matrix representation of the document encoding for each description. Transpose the matricies
-        
-        #Obtain the embedding from the dictionary for the list course
-        A = self.VDF['Glove'][listCourse].T
-        #Calculate the embedding for the input course using the GloVe model.
-        B = self._GloveSim(testDf,inCourse).T
-        
-        #Take the cosine similarity of these two matricies. This creates a 4x4 matrix where each row represents
-            #one of the four categories (mean,stdev,max,min) of one course description and each column represents one of the four
-            #of the other course description.
-        sim = cosine_similarity(A,B)
-        #The diagonal of this 4x4 matrix is a comparision of like categories across the two different course descriptions.
-            #By taking the average of this diagonal, a similarity score can be obtained.
-        result = np.average(np.diag(sim))
-        return result
-    
-    
-
-#            School      Preq
-#Jacard    0.762222  0.497531
-#Lev       0.730000  0.475926
-#WordSim   0.820000  0.517284
-#DocSim    0.592222  0.444444
-#GloveSim  0.598889  0.503704
-    
+import threading
+import numpy as np
+import ModelStore
+import Indexes
+import Catalog
+import Profiler
+import Embeddings
+"""This script contains a single class which in turn, contains all 5 of the methods to be tested (as well as their 
+initialization functions.)  The five methods are as follows:
+    1) Jacard Similarity between course descriptions 
+    2) Leveshtein Distance between course names
+    3) Similarity of the average Word2Vec encoding of course descriptions
+    4) Similarity of the Doc2Vec encodings of course descriptions.
+    5) Similarity of the "matrix" encoding using the pretrained GloVe encodings.
+        (The matrix encoding is a concatenation of 4 encoding vectors.
+        1) The average of all word vector encodings in the description.)
+        2) The average + 1 st dev of all vector encodings
+        3) A vector consisting of the max values of all vector encodings
+        4) A vector consisting of the min values of all vector encodings.
+    
+    The methods used to to call these are as follows:
+        Jacard
+        Lev
+        WordSim
+        DocSim
+        GloveSim
+gensim, pandas and Levenshtein are imported by the methods which use them, so importing this file is fast.
+"""
+
+class QueryCache:
+    """A least recently used cache for the embeddings of test courses. Keys are in the form
+    (method, id of the test dataframe, course number, hash of the course description), so a course whose
+    description changes is embedded again. The cache can be shared by several threads (such as the server's request
+    threads).
+    Initialize this class with:
+        maxSize - The number of embeddings to keep before the least recently used one is evicted.
+    """
+    def __init__(self,maxSize=4096):
+        from collections import OrderedDict
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def Get(self,key):
+        """Returns the cached embedding for key (or None if it is not cached)."""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits +=1
+                return self.entries[key]
+            self.misses +=1
+            return None
+
+    def Put(self,key,value):
+        """Stores an embedding, evicting the least recently used entries if the cache is full."""
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+
+    def Clear(self):
+        """Removes every cached embedding. (The hit and miss counters are kept.)"""
+        with self.lock:
+            self.entries.clear()
+
+    def Evict(self,predicate):
+        """Removes every entry whose key matches predicate (called as predicate(key)). Returns the number removed."""
+        with self.lock:
+            stale = [key for key in self.entries if predicate(key)]
+            for key in stale:
+                del self.entries[key]
+        return len(stale)
+
+    def Stats(self):
+        """Returns a dictionary with the hit and miss counters and the current size of the cache."""
+        with self.lock:
+            total = self.hits+self.misses
+            return {"hits":self.hits,"misses":self.misses,"size":len(self.entries),
+                    "hitRate":self.hits/total if total > 0 else 0.0}
+
+class _Fingerprints(dict):
+    #A dictionary of the model store fingerprint of each embedding (see "Similarities._Fingerprint") which calculates
+        #a fingerprint the first time it is asked for.
+    def __init__(self,compute):
+        dict.__init__(self)
+        self.compute = compute
+
+    def __missing__(self,key):
+        self[key] = self.compute(key)
+        return self[key]
+
+class Similarities:
+    """This class takes in a training data frame that is used to train the word2vec and doc2vec embeddings.  
+    The 5 methods can the be called when passed the test data frame.
+    Initialize this class with:
+        trainDF - The dataframe used to train the embeddings.  This will also be the dataframe from which
+            the program will pull the course closest to the test course.
+        mode - The methods to build right away: "All" for all 5 methods, "Word" for only "WordSim", a list of method
+            names, or None. Every other method is built the first time it is used (see "Prewarm"), so a process only
+            pays for training and embedding the methods it calls.
+        cacheSize - The number of test course embeddings to keep in "self.queryCache"
+        store - If True, trained models and reference embeddings are loaded from (and saved to) the model store
+            in "Setup.modelStore" so that they are only rebuilt when the training data or settings change.
+        precision - The storage of the reference embeddings: "float32", or "float16" or "int8" to use 2 or 4 times less
+            memory with slightly less exact scores (see "Embeddings.EmbeddingMatrix.ErrorBound").
+    """
+    #The hyperparameters of the two trained models. (These are part of the fingerprint used by the model store.)
+    WordVecParams = {"size":300,"window":5,"min_count":2,"workers":4,"iter":100}
+    DocVecParams = {"vector_size":300,"window":5,"min_count":2,"workers":4,"epochs":100}
+    #The doc2vec inference settings. If "reuseTrained" is True, the reference embeddings of the training set are the
+        #document vectors learned during training instead of being inferred again.
+    DocInferParams = {"alpha":0.1,"min_alpha":0.0001,"steps":300,"seed":1,"reuseTrained":True}
+    #The parts each method needs, in the order they are built. "WordVec", "DocVec" and "GloveVec" are the models,
+        #"Word", "Doc" and "Glove" the reference embeddings of the training set and "Jacard" and "Lev" the search indexes.
+    MethodParts = {"Jacard":["Jacard"],"Lev":["Lev"],"WordSim":["WordVec","Word"],"DocSim":["DocVec","Doc"],
+                   "GloveSim":["GloveVec","Glove"]}
+    #The methods built right away in each mode.
+    Modes = {"All":["Jacard","Lev","WordSim","DocSim","GloveSim"],"Word":["WordSim"]}
+    #The model used by each embedding.
+    EmbeddingModels = {"Word":"WordVec","Doc":"DocVec","Glove":"GloveVec"}
+    @Profiler.Timed("Similarities")
+    def __init__(self,trainDF,mode=None,cacheSize=4096,store=True,precision="float32"):
+        self._gloveFail = False
+        #Embeddings of test courses. Each test course only needs to be embedded once no matter how many
+            #reference courses it is compared with.
+        self.queryCache = QueryCache(cacheSize)
+        self.mode = mode
+        #The input training data frame.
+
+        self.trainDF = trainDF
+        #Transforms the text strings from the descriptions into a list of list of words.
+        self._initText()
+        #The fingerprints under which each artifact is kept in the model store. Each one hashes every description, so
+            #it is only calculated the first time the model store needs it.
+        self.store = ModelStore.ModelStore() if store else None
+        self.fingerprints = _Fingerprints(self._Fingerprint)
+        #The embeddings of each description in the training set (filled in as each method is built). This make it so
+            #that the embedding functions only need to be called once for the test course which will then be compared
+            #to these embeddings. Each method keeps one normalized matrix (see Embeddings.py) whose row i is the course
+            #"self.ids[i]", so one test course is scored against the whole training set with a single dot product.
+        self.precision = precision
+        self.VM = {}
+        #The functions which build each part, the parts that are built, and one lock per part so that each part is
+            #built exactly once even if several threads ask for it at the same time.
+        self._builders = {"WordVec":self._initWordVec,"DocVec":self._initDocVec,"GloveVec":self._initGloveVec,
+                          "Word":lambda: self._BuildSim("Word"),"Doc":lambda: self._BuildSim("Doc"),
+                          "Glove":lambda: self._BuildSim("Glove"),"Jacard":self._initJacard,"Lev":self._initLev}
+        self._ready = set()
+        self._locks = {part:threading.RLock() for part in self._builders}
+        #A dictionary connecting the name of each pairwise method to its one-vs-all counterpart.
+        self.Batch = {"Jacard":self.JacardAll,"Lev":self.LevAll,"WordSim":self.WordSimAll,
+                      "DocSim":self.DocSimAll,"GloveSim":self.GloveSimAll}
+        #Methods with an index that can find the top k courses without scoring the whole training set.
+        self.Search = {"Jacard":self._JacardSearch,"Lev":self._LevSearch}
+        #The approximate nearest neighbor indexes built with "BuildANN" (kept up to date by "Update").
+        self.annIndexes = {}
+        if mode is not None:
+            self.Prewarm(mode)
+
+    def Prewarm(self,methods):
+        """Builds the models, reference embeddings and indexes of some methods now instead of on first use.
+        Inputs:
+            methods - A list of method names ("Jacard","Lev","WordSim","DocSim","GloveSim") or a mode ("All" or "Word")
+        """
+        for method in self.Modes.get(methods,methods) if isinstance(methods,str) else methods:
+            self._Require(method)
+
+    def _Require(self,name):
+        #Builds the parts of a method (or a single part) the first time they are needed.
+        for part in self.MethodParts.get(name,(name,)):
+            if part not in self._ready:
+                with self._locks[part]:
+                    #Another thread may have built the part while this one waited for the lock.
+                    if part not in self._ready:
+                        self._builders[part]()
+                        self._ready.add(part)
+
+    @property
+    def GloveFail(self):
+        """True if the GloVe vectors could not be loaded (they are loaded the first time this is asked)."""
+        self._Require("GloveVec")
+        return self._gloveFail
+
+    def _Fingerprint(self,key):
+        #The fingerprint of the artifacts of one embedding built from scratch for the current training set.
+        params = {"Word":self.WordVecParams,"Doc":self.DocVecParams,"Glove":{"glove":"glove-wiki-gigaword-100"}}[key]
+        return ModelStore.Fingerprint(key,list(self.catalog.ids),self.texts,params)
+
+        
+    @Profiler.Timed("Catalog")
+    def _initText(self):
+        #Get text from descriptions. The variable is a nested list where the outer list represents
+        #each description and the inner list is each word in that description.
+        #The dataframe is read once into a columnar catalog (see Catalog.py) which every method reads from.
+        self.catalog = Catalog.FromFrame(self.trainDF)
+        self.texts = self.catalog.Texts()
+        #The course numbers of the training set. Row i of every reference matrix belongs to course ids[i].
+        self.ids = list(self.catalog.ids)
+        print("Text initialized")
+        
+    def _initWordVec(self):
+        import gensim
+        #Load a previously trained model from the model store if one exists for this training data.
+        fingerprint = self.fingerprints["Word"] if self.store is not None else None
+        if self.store is not None and self.store.Has(fingerprint,"WordVec"):
+            with Profiler.Span("Word2Vec.load"):
+                self.WordVecModel = self.store.LoadModel(fingerprint,"WordVec",gensim.models.Word2Vec)
+            print("Word2Vec Model loaded")
+            return
+        #Load the list of list consisting of the course descriptions into the word2vec model. Train the model
+        with Profiler.Span("Word2Vec.train"):
+            self.WordVecModel = gensim.models.Word2Vec(self.texts,**self.WordVecParams)
+        if self.store is not None:
+            self.store.SaveModel(fingerprint,"WordVec",self.WordVecModel)
+        print("Word2Vec Model initialized")
+    def _initDocVec(self):
+        #Initializes and trains the doc2vec embedding
+        from gensim.models.doc2vec import Doc2Vec, TaggedDocument
+        #Load a previously trained model from the model store if one exists for this training data.
+        fingerprint = self.fingerprints["Doc"] if self.store is not None else None
+        if self.store is not None and self.store.Has(fingerprint,"DocVec"):
+            with Profiler.Span("Doc2Vec.load"):
+                self.DocVecModel = self.store.LoadModel(fingerprint,"DocVec",Doc2Vec)
+            print("Doc2Vec Model loaded")
+            return
+        documents = []
+        #Iterate through each course description and store each as a tagged docuent. Create list of 
+            #tagged documents.
+        for i in range(len(self.texts)):
+            documents.append(TaggedDocument(self.texts[i],[i]))
+        #Train the doc2vec model with the tagged documents.
+        with Profiler.Span("Doc2Vec.train"):
+            self.DocVecModel = Doc2Vec(documents,**self.DocVecParams)
+        if self.store is not None:
+            self.store.SaveModel(fingerprint,"DocVec",self.DocVecModel)
+        print("Doc2Vec Model initialized")
+    def _initGloveVec(self):
+        #Initializes the pre-trained GloVe model. The word vectors are opened as a memory mapped .npy file
+            #(converted from the old pickle file or downloaded the first time, see Glove.py)
+        import Glove
+        try:
+            self.gloveModel = Glove.Load()
+            print("Glove model initialized")
+        except Exception:
+            print("Glove Sim model failed to load")
+            self._gloveFail = True
+
+    def _initJacard(self):
+        #The inverted index of the descriptions used by the Jacard method.
+        self.jacardIndex = Indexes.JacardIndex(self.catalog.descriptions)
+
+    def _initLev(self):
+        #The index of the course names used by the Lev method.
+        self.levIndex = Indexes.LevIndex(self.catalog.names)
+
+            
+    def Jacard(self,testDf,listCourse,inCourse):
+        """Calculates the Jacard similarity between two course descriptions.
+        Inputs:
+            testDF - The test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
+                consisting of the course number indexes (all lowercase no colons.)
+            a,b - each of these is a string representing the course number.
+        Outputs:
+            The Jacard similarity score scaled between 0 and 1.
+        """
+        #Obtain the course descriptions for the two course indexes inputed into the function.
+        A = self.catalog.descriptions[self.catalog.Row(listCourse)]
+        B = testDf['description'][inCourse]
+        #Create a set of words for each description.
+        setA = set(A.split())
+        setB = set(B.split())
+        
+        #Count the number of words in set a that are also in set b.
+        score = 0
+        for a in setA:
+            if a in setB:
+                score +=1
+        #Divide the number by the total length of both sets.
+        return score/(len(setA.union(setB)))
+
+    def Lev(self,testDf,listCourse,inCourse):
+        """Calculates the Levenshtein distance between two course names.
+        Inputs:
+            testDF - The test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
+                consisting of the course number indexes (all lowercase no colons.)
+            a,b - each of these is a string representing the course number.
+        Outputs:
+            The compliment of the normalized Levenshtein distance
+            (The compliment is calculated by 1-(L/D) where L is the Levenshtein distance and D is the length of the 
+            longer of the two strings)
+            This number is scaled between 0 and 1 where 1 represents a perfect match.
+        """
+        import Levenshtein as LV
+        #Obtain the couse names for the two courses provided
+        A = self.catalog.names[self.catalog.Row(listCourse)]
+        B = testDf['name'][inCourse]
+        #Figure out the length of the longest course name.
+        maxLen = max(len(A),len(B))
+        #Calculate the compliment of the normalized Levenshtein distance.  
+        return 1-LV.distance(A,B)/maxLen  
+    
+    def _WordSimAveVec(self,df,a):
+        """Calculates the a document embedding vector by taking the average of all word vectors in the document. This is
+        a helper function to be used with the "WordSim" method.
+        Inputs:
+            testDF - A test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
+                consisting of the course number indexes (all lowercase no colons.) 
+            a - A string representing the course number
+        Output:
+            A vector embedding representing the entire document.
+        """
+        #Obtain the course description for the course provided and convert the string into a list of individual words.
+        Description = df['description'][a].split()
+        #Create a placeholder zero vector of the same size as the vector embedding.
+        Vector = np.zeros(self.WordVecModel.layer1_size)
+        wordCount = 0
+        #Iterate over each word in the description.
+        for word in Description:
+            #If the word is in the trained vocabulary, obtain the word vector. 
+            #Continue to add the word vectors to the placeholder vector to get the running sum.
+            if word in self.WordVecModel.wv.vocab:
+                vector = self.WordVecModel.wv.get_vector(word)
+                Vector +=vector
+                #Keep track of how many word vectors (which were included in the vocabulary) were added.
+                wordCount +=1
+        #Calculate the mean by dividing the sum by the number of vectors.
+        return Vector/wordCount
+    
+    def _BuildSim(self,key):
+        """Builds "self.VM[key]" to contain the document vector embeddings of one method ("Word","Doc" or "Glove") for
+        every course in the training dataset to act as a reference. This way, the references only need to be
+        calculated once. The model of the method must already be initialized (see "_Require").
+        Matrices will be in the form VM[Method].Row(self.catalog.Row(courseName))
+        If the model store is enabled, the embeddings are loaded from the store when they have already been built
+        for this training data and saved to the store otherwise.
+        """
+        if key == "Glove" and self._gloveFail:
+            return
+        #The functions used to obtain the document embeddings of the whole training set for each method.
+        embed = {"Word":self._WordSimMatrix,"Doc":self._DocSimMatrix,"Glove":self._GloveSimMatrix}
+        ids = self.catalog.ids
+        #The doc2vec reference embeddings also depend on the inference settings. ("seeded" marks the matrices inferred
+            #with the seeded starting vectors of DocInference.py. Matrices saved before then differ between processes.)
+        names = {"Word":"VDF","Doc":"VDF-seeded-"+ModelStore.ParamsKey(self.DocInferParams),"Glove":"VDF"}
+        fingerprint = self.fingerprints[key] if self.store is not None else None
+        if self.store is not None and self.store.Has(fingerprint,names[key]):
+            #Rows of the stored matrix are in the same order as the training dataframe.
+            with Profiler.Span("BuildSims.load",key):
+                _, matrix = self.store.LoadMatrix(fingerprint,names[key])
+        else:
+            with Profiler.Span("BuildSims.embed",key):
+                matrix = embed[key]()
+            if self.store is not None:
+                self.store.SaveMatrix(fingerprint,names[key],ids,matrix)
+        #Normalize the embeddings and store them in the chosen precision.
+        self.VM[key] = self._StoreMatrix(matrix)
+
+    def _WordSimMatrix(self,rows=None,catalog=None):
+        """Calculates the "WordSim" embedding (the average word vector) of every description in the training set.
+        Input:
+            rows - The catalog rows to embed (defaults to every row).
+            catalog - The catalog to embed (defaults to the training set).
+        Output:
+            An (N x size) matrix with one row per entry of rows. Descriptions with no words in the vocabulary are NaN.
+        """
+        catalog = catalog if catalog is not None else self.catalog
+        rows = range(len(catalog)) if rows is None else rows
+        wv = self.WordVecModel.wv
+        words = catalog.words
+        #The word vector of every word id in the catalog (zero for words outside the trained vocabulary).
+        table = np.zeros((len(words),self.WordVecModel.layer1_size))
+        known = np.zeros(len(words),dtype=bool)
+        for i, word in enumerate(words):
+            if word in wv.vocab:
+                table[i] = wv.get_vector(word)
+                known[i] = True
+        out = np.empty((len(rows),table.shape[1]))
+        #The number of words and of words in the vocabulary (for the out of vocabulary rate reported by the profiler).
+        tokens = inVocab = 0
+        with np.errstate(divide='ignore',invalid='ignore'):
+            for i, row in enumerate(rows):
+                tokenIds = catalog.TokenIds(row)
+                tokens += len(tokenIds)
+                tokenIds = tokenIds[known[tokenIds]]
+                inVocab += len(tokenIds)
+                out[i] = table[tokenIds].sum(axis=0)/len(tokenIds)
+        Profiler.Count("embed.Word.documents",len(rows))
+        Profiler.Count("embed.Word.tokens",tokens)
+        Profiler.Count("embed.Word.oov",tokens-inVocab)
+        return out
+
+    def _DocSimMatrix(self):
+        """Calculates the doc2vec embedding of every description in the training set (rows in catalog order).
+        The training descriptions were tagged with their row number, so the learned document vectors can be used
+        directly. Otherwise all descriptions are inferred in one batch on a pool of workers (see DocInference.py)."""
+        if self.DocInferParams["reuseTrained"]:
+            Profiler.Count("embed.Doc.documents",len(self.catalog))
+            return np.array([self.DocVecModel.docvecs[row] for row in range(len(self.catalog))],dtype=np.float64)
+        return self._DocVectors(self.texts)
+
+    def _DocVectors(self,texts):
+        """Infers the doc2vec embeddings of a list of descriptions (each a list of words) in one batch."""
+        import DocInference
+        settings = {key:value for key, value in self.DocInferParams.items() if key != "reuseTrained"}
+        return DocInference.InferVectors(self.DocVecModel,texts,**settings)
+
+    def _GloveSimMatrix(self,rows=None,catalog=None):
+        """Calculates the GloVe encoding of every description in the training set (or of the catalog rows in rows) in
+        one batch (see Glove.py)."""
+        import Glove
+        descriptions = (catalog if catalog is not None else self.catalog).descriptions
+        if rows is not None:
+            descriptions = [descriptions[row] for row in rows]
+        return Glove.DocumentMatrices(self.gloveModel,descriptions)
+
+    def Embed(self,key,df):
+        """Calculates the embeddings of every course in a dataframe in one batch (the same embeddings the pairwise
+        methods calculate one course at a time).
+        Inputs:
+            key - The name of the embedding ("Word","Doc" or "Glove")
+            df - A dataframe with a 'description' column.
+        Output:
+            A matrix with one row per row of df: (N x size) for "Word" and "Doc" and (N x 4 x dim) for "Glove".
+        """
+        self._Require(self.EmbeddingModels[key])
+        catalog = Catalog.Catalog(df.index,[""]*len(df),df['description'].tolist())
+        if key == "Word":
+            return self._WordSimMatrix(catalog=catalog)
+        if key == "Doc":
+            return self._DocVectors(catalog.Texts())
+        return self._GloveSimMatrix(catalog=catalog)
+
+    @Profiler.Timed("StoreMatrix")
+    def _StoreMatrix(self,matrix):
+        """Stores a matrix of reference embeddings (rows ordered as in "self.ids") as an "Embeddings.EmbeddingMatrix"."""
+        return Embeddings.EmbeddingMatrix(matrix,self.precision)
+
+    def _QueryVec(self,key,embed,df,a):
+        """Returns the embedding of a test course, only calling the embedding function if the course is not 
+        already in the query cache.
+        Inputs:
+            key - The name of the embedding ("Word","Doc" or "Glove")
+            embed - The function which calculates the embedding (called as embed(df,a))
+            df - The test dataframe
+            a - A string representing the course number
+        Output:
+            The (read only) normalized float32 embedding of the course (see "Embeddings.Normalize").
+        """
+        cacheKey = (key,id(df),a,hash(df['description'][a]))
+        vector = self.queryCache.Get(cacheKey)
+        if vector is None:
+            Profiler.Count("queryCache.misses")
+            with Profiler.Span("embed.query",key):
+                vector = Embeddings.Normalize(embed(df,a))
+            vector.setflags(write=False)
+            self.queryCache.Put(cacheKey,vector)
+        else:
+            Profiler.Count("queryCache.hits")
+        return vector
+
+    def _CosineAll(self,key,vector):
+        """Calculates the cosine similarity between one embedding vector and every row of the reference matrix.
+        Inputs:
+            key - The "self.VM" key of the reference matrix ("Word","Doc" or "Glove")
+            vector - The normalized embedding of the test course (see "_QueryVec").
+        Outputs:
+            An array of similarity scores aligned with "self.ids". Scores that can not be calculated (for instance
+            if a description has no words in the vocabulary) are 0.
+        """
+        return self.VM[key].Scores(vector[None])[0]
+
+    def JacardAll(self,testDf,inCourse):
+        """The one-vs-all version of "Jacard". Calculates the Jacard similarity between the description of inCourse
+        and every description in the training set.
+        Inputs:
+            testDF - The test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
+                consisting of the course number indexes (all lowercase no colons.)
+            inCourse - A string containing the course number of the input test course.
+        Outputs:
+            An array of Jacard similarity scores aligned with "self.ids"
+        """
+        #Only descriptions sharing a word with inCourse are visited (through the inverted index). All others score 0.
+        self._Require("Jacard")
+        return self.jacardIndex.Scores(testDf['description'][inCourse])
+
+    def EnableMinHash(self,numPerm=128,bands=32,seed=1):
+        """Switches the top k search of the Jacard method to the approximate MinHash/LSH index (see Indexes.py).
+        Candidates are re-ranked with the exact Jacard similarity, but courses which never share a bucket with the
+        test course are missed. "JacardAll" and "Jacard" are not affected.
+        Inputs:
+            numPerm - The number of hash functions in each signature.
+            bands - The number of LSH bands (more bands give a higher recall and slower queries).
+            seed - The seed used to draw the hash functions.
+        """
+        self.minHash = Indexes.MinHashLSH(self.catalog.descriptions,numPerm,bands,seed)
+        self.Search["Jacard"] = lambda testDf,inCourse,k: self.minHash.TopK(testDf['description'][inCourse],k)
+        print("MinHash index built (threshold %.2f)"%self.minHash.Threshold())
+
+    def BuildANN(self,methodName="WordSim",nlist=None,nprobe=8,iterations=20,seed=1):
+        """Builds an approximate nearest neighbor index (see ANNIndex.py) over the reference embeddings of "WordSim" or
+        "DocSim" and uses it for the top k search of that method. The index is kept in the model store (if enabled) so
+        it is only built once for each training set.
+        Inputs:
+            methodName - "WordSim" or "DocSim"
+            nlist - The number of clusters (defaults to the square root of the training set size)
+            nprobe - The number of clusters searched for each query.
+            iterations, seed - The number of k-means iterations and the seed of the initial centroids.
+        Output:
+            The index (its "Recall" method measures the fraction of the exact top k that is found).
+        """
+        import ANNIndex
+        key = {"WordSim":"Word","DocSim":"Doc"}[methodName]
+        self._Require(methodName)
+        #The clusters depend on the settings and on the precision of the indexed embeddings.
+        name = "IVF-%s-%s-%d-%d"%(nlist if nlist is not None else "auto",self.precision,iterations,seed)
+        fingerprint = self.fingerprints[key] if self.store is not None else None
+        if self.store is not None and self.store.Has(fingerprint,name):
+            index = self.store.LoadIndex(fingerprint,name,ANNIndex.IVFIndex,self.VM[key])
+            index.nprobe = nprobe
+        else:
+            index = ANNIndex.IVFIndex(nlist,nprobe,iterations,seed).Build(self.VM[key])
+            if self.store is not None:
+                self.store.SaveIndex(fingerprint,name,index)
+        self.annIndexes[methodName] = index
+        embed = {"Word":self._WordSimAveVec,"Doc":self._DocSim}[key]
+        self.Search[methodName] = lambda testDF,inCourse,k: index.Search(self._QueryVec(key,embed,testDF,inCourse),k)
+        print("ANN index built for",methodName)
+        return index
+
+    @Profiler.Timed("Similarities.Update")
+    def Update(self,changedDF=None,removed=(),continueTraining=False):
+        """Applies a diff of the training set (courses added, changed or removed, such as the output of
+        "Cleaner.CleanChanges") without rebuilding everything. Only the reference embeddings of new and changed courses
+        are calculated, the search indexes are updated, and cached test course embeddings which may be stale are evicted.
+        New and changed courses are moved to the end of the training set (the last rows of "self.ids").
+        Inputs:
+            changedDF - A dataframe of new and changed courses with the same columns as the training dataframe.
+            removed - A list of the course numbers to remove.
+            continueTraining - If True, the word2vec model continues training on the new and changed descriptions
+                (its vocabulary is extended with their new words) and every "WordSim" reference embedding is
+                calculated again. Otherwise the trained models are used as they are. The doc2vec model is never
+                trained further (the embeddings of new descriptions are inferred).
+                Methods which have not been built yet are built later from the updated training set as usual.
+        Output:
+            A dictionary with the number of courses "added", "changed" and "removed".
+        """
+        import pandas as pd
+        if changedDF is None:
+            changedDF = self.trainDF.iloc[:0]
+        changed = [index for index in changedDF.index if index in self.catalog.rows]
+        removed = [index for index in removed if index in self.catalog.rows and index not in changedDF.index]
+        #The trained doc2vec document vectors are tagged with the rows of the old training set. If the model is built
+            #but the reference embeddings are not (for instance after "Embed"), they are built now, before the rows move.
+        if "DocVec" in self._ready and self.DocInferParams["reuseTrained"]:
+            self._Require("Doc")
+        #The rows of the old training set which are kept as they are (in the same order, with the same embeddings).
+        keep = ~self.trainDF.index.isin(changed+removed)
+        start = int(keep.sum())
+        changedDF = changedDF.reindex(columns=self.trainDF.columns)
+        self.trainDF = pd.concat([self.trainDF[keep],changedDF])
+        #Only the new and changed descriptions are split into words.
+        self.catalog = self.catalog.Update(keep,changedDF.index,changedDF['name'].tolist(),
+                                           changedDF['description'].tolist())
+        self.texts = [words for words, kept in zip(self.texts,keep) if kept]+self.catalog.Texts(start)
+        self.ids = list(self.catalog.ids)
+        newRows = np.arange(start,len(self.catalog))
+        retrained = continueTraining and len(newRows) > 0 and "WordVec" in self._ready
+        if retrained:
+            newTexts = self.texts[start:]
+            with Profiler.Span("Word2Vec.train"):
+                self.WordVecModel.build_vocab(newTexts,update=True)
+                self.WordVecModel.train(newTexts,total_examples=len(newTexts),epochs=self.WordVecModel.epochs)
+            print("Word2Vec Model trained on",len(newTexts),"descriptions")
+        #The updated artifacts are not the same as the ones built from scratch for this training set, so they get
+            #fingerprints of their own (derived from the old fingerprints) in the model store. Models which were never
+            #built will be built from scratch. (Without a model store the fingerprints are never used.)
+        ids = list(self.catalog.ids)
+        for key, model in self.EmbeddingModels.items():
+            if model in self._ready and self.store is not None:
+                self.fingerprints[key] = ModelStore.Fingerprint(key,ids,self.texts,
+                                                                {"base":self.fingerprints[key],"continueTraining":retrained})
+            else:
+                self.fingerprints.pop(key,None)
+        #Embed the new and changed rows only.
+        embed = {"Word":self._WordSimMatrix,"Glove":self._GloveSimMatrix,
+                 "Doc":lambda rows: self._DocVectors([self.texts[row] for row in rows])}
+        for key in list(self.VM):
+            if key == "Word" and retrained:
+                self.VM[key] = self._StoreMatrix(self._WordSimMatrix())
+            else:
+                fresh = embed[key](newRows) if len(newRows) > 0 else self.VM[key].Rows(0,0)
+                self.VM[key] = self.VM[key].Select(keep).Append(self._StoreMatrix(fresh))
+        #Update the Jacard and Lev indexes (if they were built) and the optional search indexes.
+        if "Jacard" in self._ready:
+            self.jacardIndex.Update(keep,self.catalog.descriptions[start:])
+        if "Lev" in self._ready:
+            self.levIndex.Update(keep,self.catalog.names[start:])
+        if hasattr(self,'minHash'):
+            self.minHash.Update(keep,self.catalog.descriptions[start:])
+        for methodName, index in self.annIndexes.items():
+            key = {"WordSim":"Word","DocSim":"Doc"}[methodName]
+            #Every WordSim embedding moved if the model was trained further.
+            index.Update(self.VM[key],keep if not (key == "Word" and retrained) else np.zeros(len(keep),dtype=bool))
+        #Cached embeddings of courses that changed or were removed will not be asked for again. If the word2vec
+            #model was trained further, every cached WordSim embedding is stale.
+        stale = set(changed+removed)
+        evicted = self.queryCache.Evict(lambda cacheKey: cacheKey[2] in stale or (retrained and cacheKey[0] == "Word"))
+        counts = {"added":len(newRows)-len(changed),"changed":len(changed),"removed":len(removed)}
+        print("Updated training set:",counts,"(%d cached embeddings evicted)"%evicted)
+        return counts
+
+    def _JacardSearch(self,testDf,inCourse,k):
+        """Finds the k training rows with the highest Jacard similarity to inCourse with the inverted index.
+        Outputs:
+            rows, scores - Arrays of training set rows and their scores (sorted from most to least similar)
+        """
+        self._Require("Jacard")
+        return self.jacardIndex.TopK(testDf['description'][inCourse],k)
+
+    def LevAll(self,testDf,inCourse):
+        """The one-vs-all version of "Lev". Calculates the compliment of the normalized Levenshtein distance between
+        the name of inCourse and every course name in the training set.
+        Outputs:
+            An array of scores between 0 and 1 aligned with "self.ids"
+        """
+        self._Require("Lev")
+        return self.levIndex.Scores(testDf['name'][inCourse])
+
+    def _LevSearch(self,testDf,inCourse,k):
+        """Finds the k training rows with the highest Lev score to inCourse with the name index (see Indexes.py).
+        Outputs:
+            rows, scores - Arrays of training set rows and their scores (sorted from most to least similar)
+        """
+        self._Require("Lev")
+        return self.levIndex.TopK(testDf['name'][inCourse],k)
+
+    def WordSimAll(self,testDF,inCourse):
+        """The one-vs-all version of "WordSim". The average word vector of inCourse is compared with every
+        reference vector in a single matrix-vector product.
+        Outputs:
+            An array of cosine similarity scores aligned with "self.ids"
+        """
+        self._Require("WordSim")
+        return self._CosineAll("Word",self._QueryVec("Word",self._WordSimAveVec,testDF,inCourse))
+
+    def DocSimAll(self,testDF,inCourse):
+        """The one-vs-all version of "DocSim".
+        Outputs:
+            An array of cosine similarity scores aligned with "self.ids"
+        """
+        self._Require("DocSim")
+        return self._CosineAll("Doc",self._QueryVec("Doc",self._DocSim,testDF,inCourse))
+
+    def GloveSimAll(self,testDf,inCourse):
+        """The one-vs-all version of "GloveSim". Each of the 4 categories (mean,stdev,max,min) of inCourse is
+        compared with the same category of every reference course. The 4 cosine similarities are then averaged.
+        Outputs:
+            An array of similarity scores aligned with "self.ids"
+        """
+        self._Require("GloveSim")
+        #Each category is normalized separately, so the dot product of like categories is their cosine similarity.
+            #"Scores" averages the 4 similarities of every reference course.
+        return self._CosineAll("Glove",self._QueryVec("Glove",self._GloveSim,testDf,inCourse))
+
+    def _SearchTopK(self,methodName,testDF,inCourse,k,ids):
+        """Ranks the top k courses with the search index of a method (see "TopK"). Approximate indexes (the ANN and
+        MinHash indexes) only score the courses they find, so fewer than k courses may be returned."""
+        #Ask for one extra row in case inCourse is part of the training set.
+        import pandas as pd
+        rows, scores = self.Search[methodName](testDF,inCourse,k+1)
+        keep = ids[rows] != inCourse
+        rows = rows[keep][:k]
+        scores = scores[keep][:k]
+        return pd.DataFrame({0:scores},index=ids[rows])
+
+    def TopK(self,methodName,testDF,inCourse,k=None):
+        """Scores inCourse against every course in the training set with the one-vs-all version of a method and
+        ranks the results.
+        Inputs:
+            methodName - The name of the method ("Jacard","Lev","WordSim","DocSim" or "GloveSim")
+            testDF - A test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
+                consisting of the course number indexes (all lowercase no colons.)
+            inCourse - A string containing the course number of the input test course.
+            k - The number of courses to return. If None, every training course is returned. (If the method searches
+                with an approximate index, see "BuildANN" and "EnableMinHash", fewer courses may be returned.)
+        Output:
+            A sorted dataframe in the same format as "Score.SimScore" (one column labeled 0, indexed by course number,
+            sorted from most similar to least similar). inCourse is left out if it is part of the training set.
+        """
+        with Profiler.Span("TopK",methodName):
+            return self._TopK(methodName,testDF,inCourse,k)
+
+    def _TopK(self,methodName,testDF,inCourse,k):
+        #Ranks the courses for "TopK" (which times each call under the name of the method).
+        import pandas as pd
+        ids = np.array(self.ids,dtype=object)
+        if k is not None and methodName in self.Search:
+            return self._SearchTopK(methodName,testDF,inCourse,k,ids)
+        scores = self.Batch[methodName](testDF,inCourse)
+        Profiler.Count("pairs scored",len(scores))
+        #Do not match a course with itself.
+        keep = ids != inCourse
+        scores = scores[keep]
+        ids = ids[keep]
+        #Sort from most similar to least similar. Only the top k need to be fully sorted.
+        if k is not None and 0 < k < len(scores):
+            top = np.argpartition(-scores,k-1)[:k]
+            order = top[np.argsort(-scores[top],kind='stable')]
+        else:
+            order = np.argsort(-scores,kind='stable')[:k]
+        return pd.DataFrame({0:scores[order]},index=ids[order])
+
+
+    def WordSim(self,testDF,listCourse,inCourse):
+        """Calculate the cosine similarity between two vectors where each vector represents a course
+        description. Each vector is made by taking the average of each word vector that makes up the description. Average
+        vectors are calculated by a helper method "_WordSimAveVec"
+        Inputs:
+            testDF - A test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
+                consisting of the course number indexes (all lowercase no colons.) 
+            listCourse - A string containing the course number of the reference course in the trainSet
+            inCourse - A string containing the course number of the input test course.
+        """
+        #Obtain a single vector embedding for each course description (calculated by taking an average of each word 
+            #embedding that makes up each description)
+            
+        self._Require("WordSim")
+        #Get the normalized embedding of the list (reference) course from its row of the matrix
+        aVec = self.VM["Word"].Row(self.catalog.Row(listCourse))
+        #Calculate the embedding with the doc2Vec model.
+        bVec = self._QueryVec("Word",self._WordSimAveVec,testDF,inCourse)
+        #Both vectors have unit length, so their cosine similarity is their dot product.
+        return float(aVec.dot(bVec))
+        
+    def _DocSim(self,df,a):
+        """Calculate the cosine similarity between two document vectors.
+        Inputs:
+            testDF - A test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
+                consisting of the course number indexes (all lowercase no colons.) 
+            a - A string representing the course number"""
+        #Obtain the description of the input course and its document embedding vector.
+        return self._DocVector(df['description'][a])
+
+    def _DocVector(self,textA):
+        """Infers the doc2vec embedding vector of a description string (with a fixed seed, see DocInference.py)."""
+        import DocInference
+        settings = {key:value for key, value in self.DocInferParams.items() if key != "reuseTrained"}
+        return DocInference.InferVector(self.DocVecModel,textA.split(),**settings)
+    
+    def DocSim(self,testDF,listCourse,inCourse):
+        """Calculates a vector embedding for a course description using the doc2vec method.
+        Inputs:
+            testDF  - A test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
+                consisting of the course number indexes (all lowercase no colons.) 
+            listCourse - A string containing the course number of the reference course in the trainSet
+            inCourse - A string containing the course number of the input test course.
+        """
+        self._Require("DocSim")
+        #Reference the matrix row of the listCourse to get its (normalized) doc embedding
+        vectorA = self.VM["Doc"].Row(self.catalog.Row(listCourse))
+        #Calculate the doc embedding for the input course
+        vectorB = self._QueryVec("Doc",self._DocSim,testDF,inCourse)
+        
+        #Both vectors have unit length, so their cosine similarity is their dot product.
+        return float(vectorA.dot(vectorB))
+        
+
+    def _GloveSim(self,testDf,a):
+        """Uses the word vectors from the pre-trained GloVe model to generate an array representing the document. 
+        Inputs:
+            testDF - A test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
+                consisting of the course number indexes (all lowercase no colons.) 
+            a - A string representing the course number
+        Outputs:
+            An array consistingof the mean, standard deviation, min and maximum of all word vector embeddings which 
+            make up the course description."""
+        #The batch builder in Glove.py splits the description into words and calculates the mean, mean+1stdev,
+            #maximum, and minimum of the word vectors. These 4 measures make up one matrix (4 x dim) which serves
+            #as an index for the document.
+        import Glove
+        return Glove.DocumentMatrices(self.gloveModel,[testDf['description'][a]])[0]
+    
+    def GloveSim(self,testDf,listCourse,inCourse):
+        """Calculate the cosine similarity between two document arrays.
+        Inputs:
+            testDF - A test dataframe consisting of columns ('index','description','preqNames',and 'school') with rows
+                consisting of the course number indexes (all lowercase no colons.) 
+            listCourse - A string containing the course number of the reference course in the trainSet
+            inCourse - A string containing the course number of the input test course.
+        Outputs
+            Cosine similarity"""
+        #Obtain the matrix representation of the document encoding for each description. (Each row is one category.)
+        
+        self._Require("GloveSim")
+        #Obtain the (normalized) embedding of the list course from its row of the matrix
+        A = self.VM['Glove'].Row(self.catalog.Row(listCourse))
+        #Calculate the embedding for the input course using the GloVe model.
+        B = self._QueryVec("Glove",self._GloveSim,testDf,inCourse)
+        
+        #Each row of A and B is one of the four categories (mean,stdev,max,min) scaled to unit length, so the dot
+            #product of like categories across the two course descriptions is their cosine similarity.
+            #By taking the average of these 4 similarities, a similarity score can be obtained.
+        result = np.average(np.sum(A*B,axis=1))
+        return float(result)
+    
+    
+
+#            School      Preq
+#Jacard    0.762222  0.497531
+#Lev       0.730000  0.475926
+#WordSim   0.820000  0.517284
+#DocSim    0.592222  0.444444
+#GloveSim  0.598889  0.503704
+    
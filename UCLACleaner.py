@@ -1,80 +1,134 @@
-import Setup
-#Save dictionary to json file.
-def UCLAClean():
-    """Cleans the scraped data from the UCLAScraper. returns the results in a dictionary containing the "columns"
-    'name','description' and 'preqName' and the "rows" with the course number labels.  The function returns the
-    dictionary and saves a copy of it to a json file.
-    """
-    import json
-    #Open the json file containing the raw scraped data.
-    jsonFile = Setup.UCLA
-    with open(jsonFile, 'r') as inFile:
-        myDictionary = json.load(inFile)
-    print("Load dictionary as Json")
-    
-    #The UCLA course data usually has a sentence at the beginning of the course description describing how long
-        #the course is and a sentence at the end describing grading. This is irrelevant to the true course description
-        #and must be removed.
-    stopPhrases = ["hour","grading"]
-    
-    outDict = {}
-    #Common words and characters to remove.
-    removals = [".",";",":","/",' a ',' of ',' the '," or "," at "," to "," will "," are "," be ","(",")"]
-    
-    for i in range(len(myDictionary['description'])):
-        #convert course descriptions to lowercase
-        item = myDictionary['description'][i]
-        item = item.lower()
-        #Split the sentences
-        sentences = item.split(".")
-        preqs = ''
-        cleanDes = ''
-        #Go through each sentence. Only consider sentences that do not contain "stopPhrases"
-        for sentence in sentences:
-            if stopPhrases[0] not in sentence and stopPhrases[1] not in sentence:
-                #Append the sentences to the proper string.
-                cleanDes += sentence
-                preqs += sentence
-        #Remove unwanted characters/words from description.
-        for removal in removals:
-            cleanDes = cleanDes.replace(removal,'')
-        #Convert the name to lower case
-        tag = myDictionary['name'][i].lower()
-        #The course names are actually the course number and course name separated by a period. Split these by 
-            #the period.
-        tags = tag.split(".")
-        number = tags[0]
-        #Start with a blank name and build up the string.
-        name = ''
-        
-        #If the course name has periods in it, the name will split. Append everything from here onwards to a single
-            #string.
-        for i in range(len(tags)-1):
-            name+=tags[i+1]
-        #If a space is the first or last character, remove the space.
-        if name[0] == ' ':
-            name =  name[1:]
-        if name[-1] == ' ':
-            name = name[:-1]       
-        
-        if len(cleanDes) >1:
-            if cleanDes[0] == ' ':
-                cleanDes =  cleanDes[1:]
-            if cleanDes[-1] == ' ':
-                cleanDes = cleanDes[:-1]  
-        
-
-        #Save the dictionary portion.
-        outDict[number] = {'name':name,'description':cleanDes,'preqName':preqs}
-
-    #Save dictionary to json file.
-    import json
-    jsonFile = Setup.UCLAClean
-    with open(jsonFile, 'w') as outfile:
-        json.dump(outDict, outfile)
-    print("Save dictionary as Json")
-    return outDict
-
-#UCLAClean()
-        
-                
\ No newline at end of file
+import Setup
+import Profiler
+
+"""
+This file contains the functions used to clean the raw UCLA data from the UCLAScraper. "UCLACleanStream" cleans the
+courses one at a time and "UCLACleanToLines" streams them to a line delimited json file (see Cleaner.py), which
+"UCLASaveCatalog" streams into the columnar catalog.
+"""
+#The UCLA course data usually has a sentence at the beginning of the course description describing how long
+    #the course is and a sentence at the end describing grading. This is irrelevant to the true course description
+    #and must be removed.
+stopPhrases = ["hour","grading"]
+#Common words and characters to remove.
+removals = [".",";",":","/",' a ',' of ',' the '," or "," at "," to "," will "," are "," be ","(",")"]
+
+def CleanUCLARecord(name,description):
+    """Cleans one scraped UCLA course.
+    Inputs:
+        name - The scraped course name (the course number and course name separated by a period)
+        description - The scraped course description
+    Outputs:
+        number - The course number
+        entry - A dictionary with the cleaned 'name','description' and 'preqName'
+    """
+    #convert course descriptions to lowercase
+    item = description.lower()
+    #Split the sentences. Only keep sentences that do not contain "stopPhrases"
+    preqs = ''.join(sentence for sentence in item.split(".")
+                    if stopPhrases[0] not in sentence and stopPhrases[1] not in sentence)
+    cleanDes = preqs
+    #Remove unwanted characters/words from description.
+    for removal in removals:
+        cleanDes = cleanDes.replace(removal,'')
+    #Convert the name to lower case
+    tag = name.lower()
+    #The course names are actually the course number and course name separated by a period. Split these by
+        #the period.
+    tags = tag.split(".")
+    number = tags[0]
+    #If the course name has periods in it, the name will split. Append everything from here onwards to a single
+        #string.
+    name = ''.join(tags[1:])
+    #If a space is the first or last character, remove the space.
+    if name[0] == ' ':
+        name =  name[1:]
+    if name[-1] == ' ':
+        name = name[:-1]
+
+    if len(cleanDes) >1:
+        if cleanDes[0] == ' ':
+            cleanDes =  cleanDes[1:]
+        if cleanDes[-1] == ' ':
+            cleanDes = cleanDes[:-1]
+    return number,{'name':name,'description':cleanDes,'preqName':preqs}
+
+def UCLARecords(path=None):
+    """Reads the raw scraped data (saved by the UCLAScraper in "Setup.UCLARawLines") one course at a time as a
+    generator of (name, description) tuples. If only the single json file saved by older scrapes ("Setup.UCLA") exists,
+    it is loaded instead."""
+    import os
+    import json
+    path = path if path is not None else Setup.UCLARawLines
+    if not os.path.exists(path) and os.path.exists(Setup.UCLA):
+        with open(Setup.UCLA, 'r') as inFile:
+            myDictionary = json.load(inFile)
+        print("Load dictionary as Json")
+        yield from zip(myDictionary['name'],myDictionary['description'])
+        return
+    with open(path, 'r') as inFile:
+        for line in inFile:
+            if line.strip():
+                course = json.loads(line)
+                yield course['name'],course['description']
+
+def UCLACleanStream(records):
+    """Cleans an iterable of (name, description) tuples one course at a time. Returns a generator of
+    (number, entry) tuples (see "CleanUCLARecord")."""
+    for name, description in records:
+        Profiler.Count("clean.ucla.courses")
+        yield CleanUCLARecord(name,description)
+
+@Profiler.Timed("UCLACleanToLines")
+def UCLACleanToLines(records=None,path=None):
+    """Cleans the scraped UCLA courses and streams them to a line delimited json file.
+    Inputs:
+        records - An iterable of (name, description) tuples. Defaults to the raw data in "Setup.UCLARawLines" (read
+            with "UCLARecords", which falls back to "Setup.UCLA" for older scrapes)
+        path - The file to write. Defaults to "Setup.UCLALines"
+    Outputs: The number of courses written.
+    """
+    import Cleaner
+    records = records if records is not None else UCLARecords()
+    path = path if path is not None else Setup.UCLALines
+    count = Cleaner.WriteLines(UCLACleanStream(records),path)
+    print("Streamed",count,"cleaned courses to",path)
+    return count
+
+def UCLASaveCatalog(path=None,linesPath=None):
+    """Streams the cleaned UCLA courses into the columnar catalog (see CatalogStore.py).
+    Inputs:
+        path - The catalog folder. Defaults to "Setup.uclaCatalog"
+        linesPath - The file written by "UCLACleanToLines". Defaults to "Setup.UCLALines" (or to the json file
+            "Setup.UCLAClean" saved by older runs if it does not exist).
+    Outputs: The number of courses written.
+    """
+    import os
+    import Cleaner
+    import CatalogStore
+    path = path if path is not None else Setup.uclaCatalog
+    linesPath = linesPath if linesPath is not None else Setup.UCLALines
+    if os.path.exists(linesPath) or not os.path.exists(Setup.UCLAClean):
+        return CatalogStore.Write(path,Cleaner.ReadLines(linesPath))
+    import json
+    with open(Setup.UCLAClean, 'r') as inFile:
+        return CatalogStore.Write(path,json.load(inFile).items())
+
+#Save dictionary to json file.
+@Profiler.Timed("UCLAClean")
+def UCLAClean():
+    """Cleans the scraped data from the UCLAScraper. returns the results in a dictionary containing the "columns"
+    'name','description' and 'preqName' and the "rows" with the course number labels.  The function returns the
+    dictionary and saves a copy of it to a json file.
+    """
+    outDict = dict(UCLACleanStream(UCLARecords()))
+
+    #Save dictionary to json file.
+    import json
+    jsonFile = Setup.UCLAClean
+    with open(jsonFile, 'w') as outfile:
+        json.dump(outDict, outfile)
+    print("Save dictionary as Json")
+    return outDict
+
+#UCLAClean()
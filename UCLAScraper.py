@@ -1,74 +1,93 @@
-from lxml import html
-import requests
-import random as rand
-import time
-import Setup
-
-"""
-This script contains the scraper which pulls the relevant data from USC's course catalog.
-"""
-
-def GetPage(url):
-    """Pulls the html from the webpage. Adds a random delay between web page calls.
-    Input:
-        url - A string representing the desired url to visit
-    Output
-        An html tree
-    """
-    #Adds random delay (to avoid overworking the server)
-    time.sleep(rand.uniform(.7,4.0))
-    page = requests.get(url)
-    tree = html.fromstring(page.content)
-    print(url)
-    return tree
-
-def UCLAScrape():
-    """Scrapes course data from the UCLA course catalog and returns a dictionary
-    containing {'name':[],'description':[]}
-    A copy of this dictionary is saved as a json file.
-    """
-    
-    #Scrape the page containing all schools.
-    url = r'https://www.registrar.ucla.edu/Academics/Course-Descriptions'
-    baseUrl = r'https://www.registrar.ucla.edu/'
-    page = GetPage(url)
-    things = page.xpath('//td[contains(@style,"width:50%;")]')
-    Schools = {'school':[],'href':[]}
-    #Iterate through all schools and save their paths to a list.
-    for thing in things:
-        name = thing.xpath('.//li/a/text()')[0].title()
-        _href = name = thing.xpath('.//li/a')[0].values()[0]
-        href = baseUrl+_href
-        
-        Schools['school'].append(name)
-        Schools['href'].append(href)
-        
-        print(name)
-    
-    i = 0
-    myDictionary = {'name':[],'description':[]}
-    #Go through each path from the first page
-    for url in Schools['href']:
-        print(url)
-        print(i,"/",len(Schools['href']))
-        i +=1
-        #Get the page from the given path.
-        page = GetPage(url)
-        
-        #Go through each course, save the name and description to a dictionary.
-        courses = page.xpath('//li[contains(@class,"media category-list-item")]')
-        for course in courses:
-            try:
-                name = course.xpath('.//div/h3/text()')[0].title()
-                descripton = course.xpath('.//p[2]/text()')[0].title()
-                myDictionary['name'].append(name)
-                myDictionary['description'].append(descripton)
-            except IndexError:
-                pass
-    
-    #Save dictionary to json file.
-    import json
-    jsonFile = Setup.UCLA
-    with open(jsonFile, 'w') as outfile:
-        json.dump(myDictionary, outfile)
-    print("Save dictionary as Json")
+from lxml import html
+import requests
+import random as rand
+import time
+import Setup
+import AsyncFetch
+import Profiler
+
+"""
+This script contains the scraper which pulls the relevant data from USC's course catalog.
+"""
+
+def GetPage(url):
+    """Pulls the html from the webpage. Adds a random delay between web page calls. (The scraper itself fetches pages
+    concurrently with AsyncFetch. This function is kept for fetching single pages.)
+    Input:
+        url - A string representing the desired url to visit
+    Output
+        An html tree
+    """
+    #Adds random delay (to avoid overworking the server)
+    time.sleep(rand.uniform(.7,4.0))
+    page = requests.get(url)
+    tree = html.fromstring(page.content)
+    print(url)
+    return tree
+
+def ParseSchoolPage(tree):
+    """Pulls the name and description of every course on the page of one school.
+    Output:
+        A dictionary containing {'name':[],'description':[]}
+    """
+    page = {'name':[],'description':[]}
+    #Go through each course, save the name and description to a dictionary.
+    courses = tree.xpath('//li[contains(@class,"media category-list-item")]')
+    for course in courses:
+        try:
+            name = course.xpath('.//div/h3/text()')[0].title()
+            descripton = course.xpath('.//p[2]/text()')[0].title()
+            page['name'].append(name)
+            page['description'].append(descripton)
+        except IndexError:
+            pass
+    return page
+
+@Profiler.Timed("UCLAScrape")
+def UCLAScrape(url=r'https://www.registrar.ucla.edu/Academics/Course-Descriptions',baseUrl=r'https://www.registrar.ucla.edu/',incremental=False):
+    """Scrapes course data from the UCLA course catalog. The courses are saved to a line delimited json file
+    ("Setup.UCLARawLines") with one {'name':...,'description':...} object per line, so the cleaner can read them one
+    course at a time.
+    The pages of the schools are fetched concurrently within the rate limits set in Setup (see AsyncFetch.py), and
+    each page is parsed as soon as it arrives.
+    Inputs:
+        url - The page listing all schools.
+        baseUrl - The url that the links to each school are relative to.
+        incremental - If True, pages are requested conditionally (with the validators saved in the crawl cache by the
+            last scrape) and pages which did not change are not parsed again.
+    """
+    cache = AsyncFetch.PageCache()
+    
+    async def scrape(fetcher):
+        #Scrape the page containing all schools.
+        page = html.fromstring((await fetcher.Fetch(url)).content)
+        things = page.xpath('//td[contains(@style,"width:50%;")]')
+        Schools = {'school':[],'href':[]}
+        #Iterate through all schools and save their paths to a list.
+        for thing in things:
+            name = thing.xpath('.//li/a/text()')[0].title()
+            _href = thing.xpath('.//li/a')[0].values()[0]
+            href = baseUrl+_href
+            
+            Schools['school'].append(name)
+            Schools['href'].append(href)
+            
+            print(name)
+        #Go through each path from the first page. Each page is parsed as soon as it has been fetched.
+        return await fetcher.FetchAllCached(Schools['href'],lambda href, content: ParseSchoolPage(html.fromstring(content)),
+                                            cache,incremental)
+    
+    pages = AsyncFetch.Run(scrape)
+    cache.Save()
+    print(sum(1 for _, changed in pages if changed),"/",len(pages),"pages changed")
+    #Write the courses one per line (in the order of the links on the first page). The file is written under a
+        #temporary name first so that a partly written file is never read.
+    import os
+    import json
+    jsonFile = Setup.UCLARawLines
+    with open(jsonFile+".tmp", 'w') as outfile:
+        for page, _ in pages:
+            for name, description in zip(page['name'],page['description']):
+                outfile.write(json.dumps({'name':name,'description':description})+"\n")
+    os.replace(jsonFile+".tmp",jsonFile)
+    print("Saved courses as line delimited Json")
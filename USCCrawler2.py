@@ -1,86 +1,156 @@
-from lxml import html
-import requests
-import random as rand
-import time
-import Setup
-
-"""
-This script contains the scraper which pulls the relevant data from USC's course catalog.
-"""
-
-def GetPage(url):
-    """Pulls the html from the webpage. Adds a random delay between web page calls.
-    Input:
-        url - A string representing the desired url to visit
-    Output
-        An html tree
-    """
-    #Adds random delay (to avoid overworking the server)
-    time.sleep(rand.uniform(.7,4.0))
-    page = requests.get(url)
-    tree = html.fromstring(page.content)
-    print(url)
-    return tree
-
-def USCCrawl():
-    """Crawls the USC course catalog to pull course names, course numbers, course descriptions, and 
-    prerequisite courses for all engineering and medicine courses. Stores each course as a dictionary of with the labels 'name','number',
-    'description','school',and 'preq'.  All course dictionaries are stored in one list.  The list is then
-    saved (using python's pickle library) to checkpoint the process.
-        
-    """
-    
-    
-    print("Crawling course catalog: \n\n")
-    url = Setup.url
-    tree = GetPage(url)
-    schools = ["Engineering","Medicine"]
-    List = []
-    
-    #The first page of the course catalog lists all of the schools. The crawler must first navigate 
-        #to the desired school.
-    for school in schools:
-        #Find the link to the desired school
-        A = tree.xpath('/html/body/div[3]/div/div[1]/ul[2]/li[contains(@data-school,"'+school+'")]')
-        for a in A:
-            #Follow the link to the desired school and get the page for the school.
-            link = a.xpath('.//a')[0].values()[0]
-            tree1 = GetPage(link)
-            #Store the information contained in the next page.
-            courses = tree1.xpath('//div[contains(@class,"course-info expandable")]')
-            
-            #For each course, get the name,number,description, and prerequisite list.
-            for course in courses:
-                courseName = course.xpath('.//h3/a/text()')[0].title()
-                courseNumber = course.xpath('.//a/strong/text()')[0].title()
-                courseDes = course.xpath('.//div[1]/text()')[0].title()
-                _coursePreqLink = course.xpath('.//div[2]/ul/li[contains(@class,"prereq")]/a[1]')
-                _coursePreqName = course.xpath('.//div[2]/ul/li[contains(@class,"prereq")]/a/text()')
-    
-                #Courses can have zero or many prerequisites.  Store these as a list.
-                coursePreqLink = []
-                coursePreqName = []
-                for c in _coursePreqLink:
-                    coursePreqLink.append(c.values()[0])
-                for n in _coursePreqName:
-                    coursePreqName.append(n.title())
-                    
-                #Organize data into a dictionary
-                dictionary = {'name':courseName,'number':courseNumber,'description':courseDes,'preqLink':coursePreqLink,'preqName':coursePreqName,'school':school}
-                #Append dictionary to a master list.
-                List.append(dictionary)
-     
-    #Save the raw list data as a pickle file.
-    pickleJar = Setup.pickleJar    
-    import pickle    
-    # open a file, where you ant to store the data
-    file = open(pickleJar, 'wb')
-    # dump information to that file
-    pickle.dump(List, file)
-    # close the file
-    file.close()
-    print("file pickled")
-    #Return the raw list.
-    return List
-    
-    
+from lxml import html
+import requests
+import random as rand
+import time
+import os
+import Setup
+import AsyncFetch
+import Profiler
+from urllib.parse import urljoin
+
+"""
+This script contains the scraper which pulls the relevant data from USC's course catalog.
+"""
+
+def GetPage(url):
+    """Pulls the html from the webpage. Adds a random delay between web page calls. (The crawler itself fetches pages
+    concurrently with AsyncFetch. This function is kept for fetching single pages.)
+    Input:
+        url - A string representing the desired url to visit
+    Output
+        An html tree
+    """
+    #Adds random delay (to avoid overworking the server)
+    time.sleep(rand.uniform(.7,4.0))
+    page = requests.get(url)
+    tree = html.fromstring(page.content)
+    print(url)
+    return tree
+
+def ParseSchool(tree,school):
+    """Pulls the course data from the page of one school.
+    Inputs:
+        tree - The html tree of the school's page
+        school - The name of the school ("Engineering" or "Medicine")
+    Output:
+        A list of course dictionaries with the labels 'name','number','description','preqLink','preqName' and 'school'
+    """
+    List = []
+    #Store the information contained in the page.
+    courses = tree.xpath('//div[contains(@class,"course-info expandable")]')
+    
+    #For each course, get the name,number,description, and prerequisite list.
+    for course in courses:
+        courseName = course.xpath('.//h3/a/text()')[0].title()
+        courseNumber = course.xpath('.//a/strong/text()')[0].title()
+        courseDes = course.xpath('.//div[1]/text()')[0].title()
+        _coursePreqLink = course.xpath('.//div[2]/ul/li[contains(@class,"prereq")]/a[1]')
+        _coursePreqName = course.xpath('.//div[2]/ul/li[contains(@class,"prereq")]/a/text()')
+
+        #Courses can have zero or many prerequisites.  Store these as a list.
+        coursePreqLink = []
+        coursePreqName = []
+        for c in _coursePreqLink:
+            coursePreqLink.append(c.values()[0])
+        for n in _coursePreqName:
+            coursePreqName.append(n.title())
+            
+        #Organize data into a dictionary
+        dictionary = {'name':courseName,'number':courseNumber,'description':courseDes,'preqLink':coursePreqLink,'preqName':coursePreqName,'school':school}
+        #Append dictionary to a master list.
+        List.append(dictionary)
+    return List
+
+def SchoolLinks(tree,url,schools=("Engineering","Medicine")):
+    """Finds the links to the pages of the desired schools on the first page of the course catalog.
+    Output:
+        A list of (link, school) tuples.
+    """
+    links = []
+    for school in schools:
+        #Find the link to the desired school
+        A = tree.xpath('/html/body/div[3]/div/div[1]/ul[2]/li[contains(@data-school,"'+school+'")]')
+        for a in A:
+            links.append((urljoin(url,a.xpath('.//a')[0].values()[0]),school))
+    return links
+
+def _Crawl(url,incremental):
+    #Crawls the catalog through the page cache. Returns the list of courses and the courses found on pages that changed.
+    cache = AsyncFetch.PageCache()
+
+    async def crawl(fetcher):
+        #The first page of the course catalog lists all of the schools. The crawler must first navigate 
+            #to the desired school.
+        links, _ = await fetcher.FetchCached(url,lambda url, content: SchoolLinks(html.fromstring(content),url),
+                                             cache,incremental)
+        schools = {link:school for link, school in links}
+        #Follow the link to each desired school and parse each page as it arrives. (Unchanged pages are not parsed.)
+        return await fetcher.FetchAllCached(list(schools),
+                                            lambda link, content: ParseSchool(html.fromstring(content),schools[link]),
+                                            cache,incremental)
+    pages = AsyncFetch.Run(crawl)
+    cache.Save()
+    #Join the courses of every school page into one list (in the order of the links).
+    List = [course for records, _ in pages for course in records]
+    changed = [course for records, isChanged in pages if isChanged for course in records]
+    return List,changed
+
+def _SaveList(List):
+    #Save the raw list data as a pickle file.
+    pickleJar = Setup.pickleJar    
+    import pickle    
+    # open a file, where you ant to store the data
+    file = open(pickleJar, 'wb')
+    # dump information to that file
+    pickle.dump(List, file)
+    # close the file
+    file.close()
+    print("file pickled")
+
+@Profiler.Timed("USCCrawl")
+def USCCrawl(url=None):
+    """Crawls the USC course catalog to pull course names, course numbers, course descriptions, and 
+    prerequisite courses for all engineering and medicine courses. Stores each course as a dictionary of with the labels 'name','number',
+    'description','school',and 'preq'.  All course dictionaries are stored in one list.  The list is then
+    saved (using python's pickle library) to checkpoint the process.
+    The school pages are fetched concurrently within the rate limits set in Setup (see AsyncFetch.py), and each
+    page is parsed as soon as it arrives. The validators of every page are saved to the crawl cache for "USCRefresh".
+    Input:
+        url - The first page of the course catalog. Defaults to "Setup.url"
+    """
+    print("Crawling course catalog: \n\n")
+    url = url if url is not None else Setup.url
+    List, _ = _Crawl(url,False)
+    _SaveList(List)
+    #Return the raw list.
+    return List
+
+@Profiler.Timed("USCRefresh")
+def USCRefresh(url=None):
+    """Re-crawls the USC course catalog incrementally. Each page is requested conditionally (with the ETag and
+    Last-Modified date saved by the last crawl), and only pages that changed are parsed again. The list of courses
+    in the pickle file is updated.
+    Input:
+        url - The first page of the course catalog. Defaults to "Setup.url"
+    Outputs:
+        List - The raw list of all courses (as returned by "USCCrawl")
+        changes - A dictionary describing what changed since the last crawl:
+            'changed' - The raw course dictionaries which are new or different
+            'removed' - The course numbers which are no longer in the catalog
+    """
+    print("Refreshing course catalog: \n\n")
+    url = url if url is not None else Setup.url
+    #The courses from the last crawl.
+    old = []
+    if os.path.exists(Setup.pickleJar):
+        import pickle
+        with open(Setup.pickleJar,'rb') as f:
+            old = pickle.load(f)
+    List, changedPages = _Crawl(url,True)
+    oldCourses = {course['number']:course for course in old}
+    numbers = set(course['number'] for course in List)
+    changes = {'changed':[course for course in changedPages if oldCourses.get(course['number']) != course],
+               'removed':sorted(number for number in oldCourses if number not in numbers)}
+    print(len(changes['changed']),"courses changed,",len(changes['removed']),"courses removed")
+    _SaveList(List)
+    return List,changes
@@ -1,81 +1,95 @@
-import Similarities as Sims
-import pandas as pd
-import Score
-from sklearn.utils import shuffle
-import os
-import Setup
-
-
-
-#Either launch the USC Crawler or load a checkpoint file if one exists.
-if os.path.exists(Setup.pickleJar):
-    import pickle
-    with open(Setup.pickleJar,'rb') as f:
-        List = pickle.load(f)
-else:
-    import USCCrawler2 as USCC
-    List = USCC.USCCrawl()
-    
-#Either launch the USC cleaner or load a checkpoint file if one exists.
-
-if os.path.exists(Setup.jsonFile):
-    #Load a dataframe from a json file.
-    import Setup
-    jsonFile = Setup.jsonFile
-    uscDF = pd.read_json(jsonFile,orient='index') 
-else:
-    
-    import Cleaner
-    #Run Cleaning script to generate dictionary
-    Dictionary = Cleaner.Clean(List)
-    #Convert dictionary into pandas dataframe.
-    uscDF = pd.DataFrame.from_dict(Dictionary,orient='index')
-    print("Cleaned Data")
-   
-    
-#Either launch the UCLA Crawler and cleaner or load a checkpoint file if one exists.
-
-if os.path.exists(Setup.UCLAClean):
-    import json
-    jsonFile = Setup.UCLAClean
-    with open(jsonFile, 'r') as inFile:
-        UCLADict = json.load(inFile)
-else:
-    import UCLACleaner
-    import UCLAScraper
-    
-    UCLAScraper.UCLAScrape()
-    UCLADict = UCLACleaner.UCLAClean()
-  
-#Convert the UCLADict to a dataframe
-uclaDF = pd.DataFrame.from_dict(UCLADict,orient='index')
-
-#Shuffle the usc data and only take the top 10
-uscDF = shuffle(uscDF).head(10)
-#Initialize and train the WordSim method using the UCLA data
-S = Sims.Similarities(uclaDF,"Word")
-
-import Score
-#Go through 10 random USC courses
-for course in uscDF.index:
-    #Prompt user to navigate through loop.
-    a = input("Press any key to randomly load a usc course:\nPress 'q' to quit")
-    if a == 'a':
-        break    
-    #Obtain a list of scored ucla courses which are most similar to usc course.
-    Vec = Score.SimScore(uclaDF,uscDF,course,S.WordSim)
-    #print the data from the input usc course and the most relevant ucla course.
-    print("\n")
-    print("USC Course:\n")
-    print(uscDF['name'][course],":\n")
-    print(uscDF['description'][course])
-    print("\n")
-    print("Closest USC Course:\n")
-    print(uclaDF["name"][Vec.head(1).index[0]],":\n")
-    print(uclaDF['description'][Vec.head(1).index[0]])
-    print("\n\n")
-
-print("Done")
-    
-
+import Similarities as Sims
+import Score
+import os
+import Setup
+import CatalogStore
+import argparse
+
+#Run with "--batch matches.csv" to match every USC course without prompting (see Batch.py).
+parser = argparse.ArgumentParser(description="Finds the UCLA courses most similar to USC courses.")
+parser.add_argument("--batch",metavar="OUTFILE",help="Match every USC course and write the top k UCLA matches of each to "
+                    "a .csv or .jsonl file.")
+parser.add_argument("--method",default="WordSim",choices=["Jacard","Lev","WordSim","DocSim","GloveSim"],
+                    help="The similarity method used in batch mode.")
+parser.add_argument("-k",type=int,default=10,help="The number of matches of each course in batch mode.")
+args = parser.parse_args()
+
+#Only the course names and descriptions are used to match courses.
+columns = ['name','description']
+
+#Either launch the USC crawler and cleaner or load a checkpoint file if one exists. The cleaned courses are streamed
+    #one at a time to a line delimited json file and from there to the columnar catalog (see Cleaner.py).
+
+if not CatalogStore.Exists(Setup.uscCatalog):
+    import Cleaner
+    if not os.path.exists(Setup.jsonLines) and not os.path.exists(Setup.jsonFile):
+        #Either launch the USC Crawler or load a checkpoint file if one exists.
+        if os.path.exists(Setup.pickleJar):
+            import pickle
+            with open(Setup.pickleJar,'rb') as f:
+                List = pickle.load(f)
+        else:
+            import USCCrawler2 as USCC
+            List = USCC.USCCrawl()
+        #Run Cleaning script to stream the cleaned courses to the line delimited json file.
+        Cleaner.CleanToLines(List)
+        del List
+        print("Cleaned Data")
+    #Save the columnar catalog for the next start.
+    Cleaner.SaveCatalog()
+#Only the needed columns of the columnar catalog are read.
+uscDF = CatalogStore.Load(Setup.uscCatalog,columns)
+    
+#Either launch the UCLA Crawler and cleaner or load a checkpoint file if one exists.
+
+if not CatalogStore.Exists(Setup.uclaCatalog):
+    import UCLACleaner
+    if not os.path.exists(Setup.UCLALines) and not os.path.exists(Setup.UCLAClean):
+        #Only scrape the site if the raw data from an earlier scrape is not saved.
+        if not os.path.exists(Setup.UCLARawLines) and not os.path.exists(Setup.UCLA):
+            import UCLAScraper
+            UCLAScraper.UCLAScrape()
+        #The scraped courses are read and cleaned one at a time.
+        UCLACleaner.UCLACleanToLines()
+    #Save the columnar catalog for the next start.
+    UCLACleaner.UCLASaveCatalog()
+uclaDF = CatalogStore.Load(Setup.uclaCatalog,columns)
+
+if args.batch:
+    import sys
+    import Batch
+    #Only the model and embeddings of the chosen method are built.
+    S = Sims.Similarities(uclaDF,[args.method])
+    Batch.MatchAll(S,uscDF,args.method,args.k,args.batch)
+    sys.exit()
+
+#Shuffle the usc data and only take the top 10
+uscDF = uscDF.sample(frac=1).head(10)
+#Initialize and train the WordSim method using the UCLA data
+S = Sims.Similarities(uclaDF,"Word")
+
+import Score
+#Go through 10 random USC courses
+for course in uscDF.index:
+    #Prompt user to navigate through loop.
+    a = input("Press any key to randomly load a usc course:\nPress 'q' to quit")
+    if a == 'a':
+        break    
+    #Obtain a list of scored ucla courses which are most similar to usc course.
+    Vec = Score.SimScore(uclaDF,uscDF,course,S.WordSim)
+    #print the data from the input usc course and the most relevant ucla course.
+    print("\n")
+    print("USC Course:\n")
+    print(uscDF['name'][course],":\n")
+    print(uscDF['description'][course])
+    print("\n")
+    print("Closest USC Course:\n")
+    print(uclaDF["name"][Vec.head(1).index[0]],":\n")
+    print(uclaDF['description'][Vec.head(1).index[0]])
+    print("\n\n")
+
+print("Query cache:",S.queryCache.Stats())
+print("Done")
+    
+
         
\ No newline at end of file
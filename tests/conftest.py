@@ -0,0 +1,5 @@
+import os
+import sys
+
+#The modules of this solution are at the top of the repository. Make them importable from the tests.
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
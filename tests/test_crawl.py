@@ -0,0 +1,115 @@
+"""
+Runs the crawlers offline against the saved catalog pages in "fixtures" (served by AsyncFetch.LocalCatalogServer).
+The fixtures folder holds a copy of the first page and the school pages of both catalogs:
+    usc/index.html lists the Engineering, Medicine and Law schools (only the first two are crawled).
+    ucla/index.html lists the Computer Science and Neuroscience pages.
+"""
+import os
+import shutil
+import pytest
+import Setup
+import AsyncFetch
+import Profiler
+import USCCrawler2
+import UCLAScraper
+import UCLACleaner
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)),"fixtures")
+
+@pytest.fixture
+def site(tmp_path,monkeypatch):
+    #Serve a copy of the fixtures (so a test can edit pages) and keep every checkpoint in the temporary folder.
+    folder = tmp_path/"site"
+    shutil.copytree(fixtures,folder)
+    monkeypatch.setattr(Setup,"pickleJar",str(tmp_path/"pickleFile.pkl"))
+    monkeypatch.setattr(Setup,"crawlCache",str(tmp_path/"crawlCache.json"))
+    monkeypatch.setattr(Setup,"UCLA",str(tmp_path/"UCLAJar.json"))
+    monkeypatch.setattr(Setup,"UCLARawLines",str(tmp_path/"UCLAJar.jsonl"))
+    monkeypatch.setattr(Setup,"crawlRate",100)
+    monkeypatch.setattr(Setup,"crawlBurst",10)
+    #Count the conditional requests (see AsyncFetch.FetchCached).
+    wasEnabled = Profiler.enabled
+    Profiler.Enable()
+    Profiler.Reset()
+    with AsyncFetch.LocalCatalogServer(folder) as server:
+        yield server,folder
+    if not wasEnabled:
+        Profiler.Disable()
+    Profiler.Reset()
+
+def Touch(path,seconds=10):
+    #Moves the modification time of a page forward, so the server no longer answers 304 to the last crawl's validators.
+    stat = os.stat(path)
+    os.utime(path,(stat.st_atime,stat.st_mtime+seconds))
+
+def Counters():
+    return Profiler.Report()['counters']
+
+def test_usc_crawl(site):
+    server, _ = site
+    List = USCCrawler2.USCCrawl(server.url+"/usc/index.html")
+    assert [course['number'] for course in List] == ["Csci 103:","Csci 104:","Csci 270:","Intd 500:","Intd 531:"]
+    assert set(course['school'] for course in List) == {"Engineering","Medicine"}
+    course = List[2]
+    assert course['name'] == " Introduction To Algorithms And Theory Of Computing"
+    assert course['description'].startswith("Analysis Of Algorithms")
+    assert course['preqName'] == ["Csci 104","Math 225"]
+    assert os.path.exists(Setup.pickleJar) and os.path.exists(Setup.crawlCache)
+
+def test_usc_refresh_not_modified(site):
+    server, _ = site
+    List = USCCrawler2.USCCrawl(server.url+"/usc/index.html")
+    Profiler.Reset()
+    refreshed, changes = USCCrawler2.USCRefresh(server.url+"/usc/index.html")
+    assert refreshed == List
+    assert changes == {'changed':[],'removed':[]}
+    #The first page and both school pages were answered with 304 Not Modified.
+    assert Counters().get("fetch.notModified") == 3
+
+def test_usc_refresh_unchanged_content(site):
+    server, folder = site
+    USCCrawler2.USCCrawl(server.url+"/usc/index.html")
+    #The page is sent again (it looks newer) but its content is the same, so it is not parsed again.
+    Touch(folder/"usc"/"Medicine.html")
+    Profiler.Reset()
+    _, changes = USCCrawler2.USCRefresh(server.url+"/usc/index.html")
+    assert changes == {'changed':[],'removed':[]}
+    assert Counters().get("fetch.unchanged") == 1
+    assert Counters().get("fetch.notModified") == 2
+
+def test_usc_refresh_changed(site):
+    server, folder = site
+    USCCrawler2.USCCrawl(server.url+"/usc/index.html")
+    #Edit one course description and replace another course on the medicine page.
+    page = folder/"usc"/"Medicine.html"
+    text = page.read_text()
+    text = text.replace("Structure of the human body","Structure and function of the human body")
+    text = text.replace("INTD 531","INTD 532")
+    page.write_text(text)
+    Touch(page)
+    List, changes = USCCrawler2.USCRefresh(server.url+"/usc/index.html")
+    assert sorted(course['number'] for course in changes['changed']) == ["Intd 500:","Intd 532:"]
+    assert changes['removed'] == ["Intd 531:"]
+    assert len(List) == 5
+    #The engineering page was not modified, so its courses came from the crawl cache.
+    assert Counters().get("fetch.notModified") == 2
+
+def test_ucla_scrape(site):
+    server, _ = site
+    UCLAScraper.UCLAScrape(server.url+"/ucla/index.html",server.url+"/")
+    records = list(UCLACleaner.UCLARecords())
+    assert [name for name, _ in records] == ["31. Introduction To Computer Science I",
+                                             "32. Introduction To Computer Science Ii",
+                                             "M101A. Cellular Neurophysiology"]
+    number, entry = UCLACleaner.CleanUCLARecord(*records[0])
+    assert number == "31"
+    assert entry['name'] == "introduction to computer science i"
+
+def test_ucla_scrape_incremental(site):
+    server, folder = site
+    UCLAScraper.UCLAScrape(server.url+"/ucla/index.html",server.url+"/")
+    before = list(UCLACleaner.UCLARecords())
+    Profiler.Reset()
+    UCLAScraper.UCLAScrape(server.url+"/ucla/index.html",server.url+"/",incremental=True)
+    assert list(UCLACleaner.UCLARecords()) == before
+    assert Counters().get("fetch.notModified") == 2
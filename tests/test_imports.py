@@ -0,0 +1,15 @@
+"""
+Guards the start up time (see Benchmark.CheckImports): every module in "Benchmark.LightModules" must import in a fresh
+interpreter within the budget and without loading any of the "Benchmark.HeavyModules".
+"""
+import pytest
+import Benchmark
+
+#The same budget as "python Benchmark.py --import-budget 0.5"
+budget = 0.5
+
+@pytest.mark.parametrize("module",Benchmark.LightModules)
+def test_import_budget(module):
+    results, failures = Benchmark.CheckImports(budget,[module])
+    assert failures == []
+    assert results["import/%s"%module]["seconds"] <= budget